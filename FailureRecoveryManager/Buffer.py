@@ -1,8 +1,45 @@
 import copy
-from threading import Lock
-from typing import Union
+import sys
+from queue import Queue
+from threading import Lock, Thread
+from typing import Callable, Union
 
-from .LRUCache import LRUCache
+from .LRUCache import DoublyNode, LRUCache
+from .TwoQueueCache import TwoQueueCache
+
+
+class BufferShard:
+    """
+    BUFFER SHARD
+    One partition of the buffer: a cache with its own mutex, and the blocks it evicted that wait for their write back.
+    """
+
+    def __init__(
+        self,
+        cache_class: type,
+        capacity: int,
+        max_size: Union[int, None],
+        on_evict: Callable[["BufferShard", DoublyNode], None],
+    ):
+        """
+        Parameters
+        ----------
+        cache_class : type
+            The cache class of the replacement policy, LRUCache or a subclass
+        capacity : int
+            The number of blocks the shard can store
+        max_size : int, optional
+            The approximate memory the blocks of the shard may use
+        on_evict : Callable[[BufferShard, DoublyNode], None]
+            Called with the shard and every node its cache evicts
+        """
+        self.cache = cache_class(capacity, on_evict=lambda node: on_evict(self, node), max_size=max_size)
+
+        # Shard mutex
+        self.lock = Lock()
+
+        # Evicted dirty blocks not written to disk yet, {cache_key: evicted node}
+        self.pending = {}
 
 
 class Buffer:
@@ -10,23 +47,58 @@ class Buffer:
     BUFFER
     Stores a LRU Cache using a dictionary with a key as `<table_name>:<block_id>` and value as the block data.
     Easily implemented using doubly linked list and dictionary.
+    Dirty blocks evicted from the cache are kept aside until they are written back to disk,
+    by a background writer thread once set_write_back is called, or by the next checkpoint.
+    Clean blocks are simply dropped.
+    The keys are hashed into shards with their own cache and mutex, so threads using different blocks do not wait for each other.
+    Each shard gets an equal part of the capacity and evicts on its own.
     """
 
-    def __init__(self, capacity: int):
+    # Replacement policies. "2q" is scan resistant: blocks put once, e.g. by an update of a whole table,
+    # are evicted before the blocks used again, e.g. hash bucket pages
+    POLICIES = {"lru": LRUCache, "2q": TwoQueueCache}
+
+    def __init__(self, capacity: int, policy: str = "lru", max_bytes: Union[int, None] = None, shards: int = 1):
         """
         Parameters
         ----------
         capacity : int
             The number of blocks can be stored in the cache.
+        policy : str
+            The replacement policy, one of POLICIES. Defaults to "lru".
+        max_bytes : int, optional
+            The approximate memory the cached blocks may use, see _sizeof. Defaults to None (only the capacity is enforced).
+            Evicted blocks waiting for their write back are not counted.
+        shards : int
+            The number of shards. Defaults to 1.
         """
+        if policy not in self.POLICIES:
+            raise ValueError(f"Buffer policy must be one of {list(self.POLICIES)}.")
+        if shards < 1:
+            raise ValueError("Buffer must have at least one shard.")
+
         # Buffer max capacity
         self._capacity = capacity
+        self._policy = policy
+
+        # Buffer shards, each cache calls back with the nodes it evicts
+        shard_capacity = -(-capacity // shards)
+        shard_max_bytes = -(-max_bytes // shards) if max_bytes is not None else None
+        self._shards = [
+            BufferShard(self.POLICIES[policy], shard_capacity, shard_max_bytes, self._evict)
+            for _ in range(shards)
+        ]
 
-        # Buffer cache instance
-        self._buffer = LRUCache(capacity)
+        self._write_back = None
+        self._write_back_queue = Queue()
+        # Guards _write_back
+        self._write_back_setup_lock = Lock()
 
-        # Buffer mutex
-        self._buffer_lock = Lock()
+        # Held while a block is written to disk, so an older version never overwrites a newer one
+        self.write_back_lock = Lock()
+
+    def _shard(self, cache_key: tuple) -> BufferShard:
+        return self._shards[hash(cache_key) % len(self._shards)]
 
     def is_empty(self) -> bool:
         """
@@ -35,7 +107,106 @@ class Buffer:
         Returns:
         bool: True if buffer is empty, False otherwise
         """
-        return self._buffer.is_empty()
+        return all(shard.cache.is_empty() for shard in self._shards)
+
+    @staticmethod
+    def _sizeof(block_data: any) -> int:
+        """
+        Approximate memory used by a block. Lists and tuples are measured from their first, middle and last items,
+        so the cost does not grow with the number of rows
+
+        Args:
+            block_data (any): The block data
+
+        Returns:
+            int: Approximate size in bytes
+        """
+        size = sys.getsizeof(block_data)
+        if isinstance(block_data, dict):
+            return size + sum(Buffer._sizeof(value) for value in block_data.values())
+        if isinstance(block_data, (list, tuple)) and block_data:
+            sample = (block_data[0], block_data[len(block_data) // 2], block_data[-1])
+            return size + len(block_data) * sum(Buffer._sizeof(item) for item in sample) // len(sample)
+        return size
+
+    def _get(self, cache_key: tuple) -> Union[any, None]:
+        shard = self._shard(cache_key)
+        with shard.lock:
+            # an evicted block is read from the buffer until its write back is done, the disk still holds an older version
+            if cache_key not in shard.cache.cache and cache_key in shard.pending:
+                return shard.pending[cache_key].val
+            return shard.cache.get(cache_key)
+
+    def _peek(self, cache_key: tuple) -> Union[any, None]:
+        shard = self._shard(cache_key)
+        with shard.lock:
+            if cache_key not in shard.cache.cache and cache_key in shard.pending:
+                return shard.pending[cache_key].val
+            return shard.cache.peek(cache_key)
+
+    def _put(self, cache_key: tuple, block_data: any) -> Union[any, None]:
+        size = self._sizeof(block_data)
+        shard = self._shard(cache_key)
+        with shard.lock:
+            # the new dirty version replaces the evicted one, whose write back is skipped
+            shard.pending.pop(cache_key, None)
+            return shard.cache.put(cache_key, block_data, size=size)
+
+    def _delete(self, cache_key: tuple) -> bool:
+        shard = self._shard(cache_key)
+        with shard.lock:
+            pending = shard.pending.pop(cache_key, None)
+            return shard.cache.delete(cache_key) or pending is not None
+
+    def _evict(self, shard: BufferShard, node: DoublyNode) -> None:
+        # called by the cache of the shard while its lock is held
+        if not node.dirty:
+            return
+        shard.pending[node.key] = node
+        if self._write_back is not None:
+            self._write_back_queue.put((node.key, node.version))
+
+    def set_write_back(self, write_back: Callable[[tuple, any], None]) -> None:
+        """
+        Start writing evicted dirty blocks back to disk on a background thread
+
+        Args:
+            write_back (Callable[[tuple, any], None]): Writes a block to disk, given its cache key and block data.
+                Called while write_back_lock is held
+        """
+        with self._write_back_setup_lock:
+            start = self._write_back is None
+            self._write_back = write_back
+        for shard in self._shards:
+            with shard.lock:
+                for cache_key, node in shard.pending.items():
+                    self._write_back_queue.put((cache_key, node.version))
+        if start:
+            Thread(target=self._write_back_loop, daemon=True).start()
+
+    def _write_back_loop(self) -> None:
+        while True:
+            cache_key, version = self._write_back_queue.get()
+            try:
+                with self.write_back_lock:
+                    shard = self._shard(cache_key)
+                    with shard.lock:
+                        pending = shard.pending.get(cache_key)
+                    # skip blocks put again, deleted or already written by a checkpoint
+                    if pending is not None and pending.version == version:
+                        self._write_back(cache_key, pending.val)
+                        self.mark_clean(cache_key, version)
+            except Exception as e:
+                # the block stays pending, the next checkpoint writes it
+                print(f"Error writing back block {cache_key}: {e}")
+            finally:
+                self._write_back_queue.task_done()
+
+    def wait_write_back(self) -> None:
+        """
+        Wait until every evicted dirty block queued so far is written back
+        """
+        self._write_back_queue.join()
 
     def get_buffer(self, table_name: str, block_id: int) -> Union[any, None]:
         """
@@ -49,9 +220,24 @@ class Buffer:
             any: The block data
             None: If the block is not found in the buffer
         """
-        with self._buffer_lock:
-            cache_key = (table_name, block_id)
-            return self._buffer.get(cache_key)
+        cache_key = (table_name, block_id)
+        return self._get(cache_key)
+
+    def peek_buffer(self, table_name: str, block_id: int) -> Union[any, None]:
+        """
+        Get a block from the buffer cache without counting it as a use, for bookkeeping such as writing it to disk.
+        The replacement policy and the hit and miss counters are left unchanged
+
+        Args:
+            table_name (str): The name of the table
+            block_id (int): The block ID
+
+        Returns:
+            any: The block data
+            None: If the block is not found in the buffer
+        """
+        cache_key = (table_name, block_id)
+        return self._peek(cache_key)
 
     def get_buffer_hash(
         self, hashNumber: int, table_name: str, block_id: int, column: str
@@ -67,9 +253,8 @@ class Buffer:
             any: The block data
             None: If the block is not found in the buffer
         """
-        with self._buffer_lock:
-            cache_key = (hashNumber, table_name, block_id, column)
-            return self._buffer.get(cache_key)
+        cache_key = ("hash", hashNumber, table_name, block_id, column)
+        return self._get(cache_key)
 
     def put_buffer(
         self, table_name: str, block_id: int, block_data: any
@@ -86,9 +271,8 @@ class Buffer:
             None: if the buffer still has space or old block is overwritten
             Any: the block data that is overwritten
         """
-        with self._buffer_lock:
-            cache_key = (table_name, block_id)
-            return self._buffer.put(cache_key, block_data)
+        cache_key = (table_name, block_id)
+        return self._put(cache_key, block_data)
 
     def put_buffer_hash(
         self,
@@ -110,9 +294,8 @@ class Buffer:
             None: if the buffer still has space or old block is overwritten
             Any: the block data that is overwritten
         """
-        with self._buffer_lock:
-            cache_key = ("hash", hashNumber, table_name, block_id, column)
-            return self._buffer.put(cache_key, block_data)
+        cache_key = ("hash", hashNumber, table_name, block_id, column)
+        return self._put(cache_key, block_data)
 
     def delete_buffer(self, table_name: str, block_id: int) -> bool:
         """
@@ -125,20 +308,150 @@ class Buffer:
         Returns:
             bool: True if the block is deleted, False if the block is not found
         """
-        with self._buffer_lock:
-            cache_key = (table_name, block_id)
-            result = self._buffer.delete(cache_key)
-            # if result:
-            #     # print(
-            #     #     f"[FRM | {str(datetime.now())}]: Block {block_id} of table {table_name} deleted from buffer."
-            #     # )
-            #     pass
-            # else:
-            #     # print(
-            #     #     f"[FRM | {str(datetime.now())}]: Block {block_id} of table {table_name} not found in buffer."
-            #     # )
-            #     pass
-            return result
+        cache_key = (table_name, block_id)
+        result = self._delete(cache_key)
+        # if result:
+        #     # print(
+        #     #     f"[FRM | {str(datetime.now())}]: Block {block_id} of table {table_name} deleted from buffer."
+        #     # )
+        #     pass
+        # else:
+        #     # print(
+        #     #     f"[FRM | {str(datetime.now())}]: Block {block_id} of table {table_name} not found in buffer."
+        #     # )
+        #     pass
+        return result
+
+    def delete_buffer_hash(
+        self, hashNumber: int, table_name: str, block_id: int, column: str
+    ) -> bool:
+        """
+        Delete a hash index block from the buffer cache
+
+        Args:
+            hashNumber (int): The hash value of the bucket
+            table_name (str): The name of the table
+            block_id (int): The block ID
+            column (str): The indexed column
+
+        Returns:
+            bool: True if the block is deleted, False if the block is not found
+        """
+        cache_key = ("hash", hashNumber, table_name, block_id, column)
+        return self._delete(cache_key)
+
+    def get_buffer_bplus(
+        self, table_name: str, column: str, page_id: int
+    ) -> Union[any, None]:
+        """
+        Get a B+ tree index page from the buffer cache
+
+        Args:
+            table_name (str): The name of the table
+            column (str): The indexed column
+            page_id (int): The page ID
+
+        Returns:
+            any: The page data
+            None: If the page is not found in the buffer
+        """
+        cache_key = ("bplus", table_name, column, page_id)
+        return self._get(cache_key)
+
+    def put_buffer_bplus(
+        self, table_name: str, column: str, page_id: int, block_data: any
+    ) -> Union[any, None]:
+        """
+        Put a B+ tree index page to the buffer cache
+
+        Args:
+            table_name (str): The name of the table
+            column (str): The indexed column
+            page_id (int): The page ID
+            block_data (any): The page data
+
+        Returns:
+            None: if the buffer still has space or old block is overwritten
+            Any: the block data that is overwritten
+        """
+        cache_key = ("bplus", table_name, column, page_id)
+        return self._put(cache_key, block_data)
+
+    def delete_buffer_bplus(self, table_name: str, column: str, page_id: int) -> bool:
+        """
+        Delete a B+ tree index page from the buffer cache
+
+        Args:
+            table_name (str): The name of the table
+            column (str): The indexed column
+            page_id (int): The page ID
+
+        Returns:
+            bool: True if the page is deleted, False if the page is not found
+        """
+        cache_key = ("bplus", table_name, column, page_id)
+        return self._delete(cache_key)
+
+    def delete_buffer_where(self, predicate: Callable[[tuple], bool]) -> int:
+        """
+        Delete every block whose cache key matches a predicate, e.g. the pages of a dropped index.
+        Evicted blocks waiting for their write back are deleted too, so they are never written over newer files.
+        A write back in progress finishes before the blocks are deleted
+
+        Args:
+            predicate (Callable[[tuple], bool]): Called with each cache key, True if the block is deleted
+
+        Returns:
+            int: The number of deleted blocks
+        """
+        deleted = 0
+        with self.write_back_lock:
+            for shard in self._shards:
+                with shard.lock:
+                    for cache_key in [key for key in shard.pending if predicate(key)]:
+                        del shard.pending[cache_key]
+                        deleted += cache_key not in shard.cache.cache
+                    for cache_key in [key for key in shard.cache.cache if predicate(key)]:
+                        shard.cache.delete(cache_key)
+                        deleted += 1
+        return deleted
+
+    def pin_buffer(self, table_name: str, block_id: int) -> Union[any, None]:
+        """
+        Get a block from the buffer cache and pin it, so it is not evicted until unpin_buffer is called as many times.
+        A block not in the buffer is pinned too, it stays once it is put.
+        Like peek_buffer, the lookup is not counted as a use by the replacement policy or the counters
+
+        Args:
+            table_name (str): The name of the table
+            block_id (int): The block ID
+
+        Returns:
+            any: The block data
+            None: If the block is not found in the buffer
+        """
+        cache_key = (table_name, block_id)
+        shard = self._shard(cache_key)
+        with shard.lock:
+            shard.cache.pin(cache_key)
+        # not a use: the put that follows counts, the replacement policy must not see two references
+        return self._peek(cache_key)
+
+    def unpin_buffer(self, table_name: str, block_id: int) -> bool:
+        """
+        Release a pin of a block. Once it has no pin left, the block can be evicted again
+
+        Args:
+            table_name (str): The name of the table
+            block_id (int): The block ID
+
+        Returns:
+            bool: True if the block was pinned, False otherwise
+        """
+        cache_key = (table_name, block_id)
+        shard = self._shard(cache_key)
+        with shard.lock:
+            return shard.cache.unpin(cache_key)
 
     def get_buffer_values(self) -> dict[any, any]:
         """
@@ -147,22 +460,140 @@ class Buffer:
         Returns:
         dict: The buffer cache
         """
-        with self._buffer_lock:
-            return self._buffer.get_cache()
+        values = {}
+        for shard in self._shards:
+            with shard.lock:
+                values.update(shard.cache.get_cache())
+        return values
+
+    def get_stats(self) -> dict[str, any]:
+        """
+        Get the lookup counters of the buffer cache
+
+        Returns:
+        dict: The replacement policy, the number of hits and misses of the get methods, the hit rate
+            and the approximate memory used by the cached blocks
+        """
+        hits = misses = used = 0
+        for shard in self._shards:
+            with shard.lock:
+                stats = shard.cache.get_stats()
+                used += shard.cache.used
+            hits += stats["hits"]
+            misses += stats["misses"]
+        lookups = hits + misses
+        return {
+            "policy": self._policy,
+            "hits": hits,
+            "misses": misses,
+            "hit_rate": hits / lookups if lookups else 0.0,
+            "bytes": used,
+        }
+
+    def get_resident_bytes(self) -> dict[str, dict[str, any]]:
+        """
+        Get the approximate memory used by the buffered blocks of every table, including evicted blocks waiting for their write back
+
+        Returns:
+        dict: {table: {"data": bytes of data blocks, "indexes": {index name: bytes of its pages}}}
+        """
+        nodes = []
+        for shard in self._shards:
+            with shard.lock:
+                nodes.extend(shard.cache.cache.values())
+                nodes.extend(node for key, node in shard.pending.items() if key not in shard.cache.cache)
+        resident = {}
+        for node in nodes:
+            key = node.key
+            if len(key) == 5 and key[0] == "hash":
+                # hash => (hash,hashNumber,table,block_id,column)
+                table, index = key[2], key[4]
+            elif len(key) == 4 and key[0] == "bplus":
+                # b+ tree => (bplus,table,column,page_id)
+                table, index = key[1], key[2]
+            else:
+                table, index = key[0], None
+            usage = resident.setdefault(table, {"data": 0, "indexes": {}})
+            if index is None:
+                usage["data"] += node.size
+            else:
+                usage["indexes"][index] = usage["indexes"].get(index, 0) + node.size
+        return resident
+
+    def get_dirty_buffer(self) -> dict[any, tuple[int, any]]:
+        """
+        Get the blocks changed since they were last written to disk, including evicted blocks not written back yet.
+        They stay dirty until mark_clean is called with their version.
+        Each shard is locked in turn, never the whole buffer
+
+        Returns:
+        dict: The version and the block data of every dirty block
+        """
+        dirty = {}
+        for shard in self._shards:
+            with shard.lock:
+                dirty.update((key, (node.version, node.val)) for key, node in shard.pending.items())
+                dirty.update(shard.cache.get_dirty())
+        return dirty
+
+    def is_dirty(self, cache_key: tuple, version: int) -> bool:
+        """
+        Check whether a version listed by get_dirty_buffer still has to be written to disk
+
+        Args:
+            cache_key (tuple): The key of the block
+            version (int): The listed version
+
+        Returns:
+            bool: False if the block was written, put again or deleted since
+        """
+        shard = self._shard(cache_key)
+        with shard.lock:
+            node = shard.cache.cache.get(cache_key)
+            if node is not None:
+                return node.dirty and node.version == version
+            pending = shard.pending.get(cache_key)
+            return pending is not None and pending.version == version
+
+    def mark_clean(self, cache_key: tuple, version: int) -> bool:
+        """
+        Mark a block as written to disk. The block stays cached
+
+        Args:
+            cache_key (tuple): The key of the block, as in get_dirty_buffer
+            version (int): The version that was written
+
+        Returns:
+            bool: True if the block is now clean, False if it was put again (or deleted) since
+        """
+        shard = self._shard(cache_key)
+        with shard.lock:
+            if shard.cache.mark_clean(cache_key, version):
+                return True
+            pending = shard.pending.get(cache_key)
+            if pending is not None and pending.version == version:
+                del shard.pending[cache_key]
+                return True
+            return False
 
     def clear_buffer(self) -> Union[None, dict[any, any]]:
         """
-        Clear all the entries in the buffer cache
+        Clear all the entries in the buffer cache.
+        Each shard is locked in turn while its entries are taken, the copy is made without any lock
 
         Returns:
         previous buffer
         """
-        with self._buffer_lock:
-            # Check if buffer is empty
-            if self._buffer.is_empty():
-                return None
+        copied_dict = {}
+        for shard in self._shards:
+            with shard.lock:
+                # take the blocks waiting for write back and the cached blocks, and clear them
+                copied_dict.update((key, node.val) for key, node in shard.pending.items())
+                copied_dict.update(shard.cache.get_cache())
+                shard.cache.clear()
+                shard.pending.clear()
 
-            # If not empty, copy the buffer and clear it
-            copied_dict = copy.deepcopy(self._buffer.get_cache())
-            self._buffer.clear()
-            return copied_dict
+        # Check if buffer was empty
+        if not copied_dict:
+            return None
+        return copy.deepcopy(copied_dict)
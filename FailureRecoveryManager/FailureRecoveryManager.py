@@ -6,7 +6,7 @@ from ConcurrencyControlManager.utils import PrimaryKey, Row, Table, TransactionA
 from FailureRecoveryManager.ExecutionResult import ExecutionResult
 from FailureRecoveryManager.RecoverCriteria import RecoverCriteria
 from FailureRecoveryManager.Rows import Rows
-from StorageManager.classes import Condition, DataDeletion, DataWrite, StorageManager
+from StorageManager.classes import Condition, DataDeletion, DataWrite, DuplicateKeyError, StorageManager
 
 from .Buffer import Buffer
 
@@ -43,6 +43,8 @@ class FailureRecoveryManager:
         #     '103|WRITE|employees|[{"id": 1, "name": "Alice", "salary": 5000}]|[{"id": 1, "name": "Alice", "salary": 6000}]',
         # ]
         self._wa_logs = []
+        # Number of leading _wa_logs entries already appended to the log file
+        self._flushed = 0
         # Write-ahead log mutex
         self._wa_log_lock = Lock()
 
@@ -51,6 +53,10 @@ class FailureRecoveryManager:
         """
         self.storage = storage_manager
 
+        # Dirty blocks evicted from the buffer are written back to the storage manager in the background
+        if self.buffer is not None:
+            self.buffer.set_write_back(self._write_page)
+
         """
         SAVE CHECKPOINT CRON JOB
         """
@@ -126,11 +132,13 @@ class FailureRecoveryManager:
     def _save_checkpoint(self) -> None:
         """
         I.S. The write ahead log and buffer exists.
-        F.S. 1. The write ahead log is saved in the log.log and and cleared
-             2. The buffer all is written to the disk and cleared.
+        F.S. 1. The dirty blocks of the buffer are written to the disk and stay cached as clean blocks.
+             2. The write ahead log entries made before the dirty blocks were listed are saved in the log.log and removed.
 
         For saving the wh_logs in the log.log files in every 5 minutes interval OR when the in memory write ahead log reaches its limit.
-        Buffer is also written to the disk and also cleared.
+        This is a fuzzy checkpoint: the buffer is locked only to list the dirty blocks, so transactions keep reading
+        and writing while the blocks are written. A block written again meanwhile stays dirty for the next checkpoint,
+        and the logs added meanwhile are kept in memory so they land after the CHECKPOINT line and are redone on recovery.
 
         Note that write_log method always adds the wa_log 1 element on each call and the limit is determined by the number of elements in the wa_log,
         As a result, it is impossible to have a write log that is not savable in the log.log file.
@@ -138,43 +146,28 @@ class FailureRecoveryManager:
 
         # print(f"[FRM | {str(datetime.now())}]: Saving checkpoint...")
 
-        # MANAGE BUFFER
-        # Clear the buffer
-        initial_cache = self.buffer.clear_buffer()
-        if initial_cache is not None:
-            for ky, value in initial_cache.items():
-                key = tuple(ky)
-                if len(key) == 5 and key[0] == "hash":
-                    # hash => (hash,hashNumber,table,block_id,column)
-                    hash_number = key[1]
-                    table_name = key[2]
-                    block_id = key[3]
-                    column_name = key[4]
-                    self.storage.write_hash_block_to_disk(
-                        table=table_name,
-                        block_id=block_id,
-                        column=column_name,
-                        hash_value=hash_number,
-                        block_data=value,
-                    )
-                elif len(key) == 2:
-                    # normal block => {tablename}:{blockid}
-                    table_name = key[0]
-                    block_id = int(key[1])
-                    self.storage.write_block_to_disk(
-                        table=table_name,
-                        block_id=block_id,
-                        block_data=value,
-                    )
-                else:
-                    print("Error writing block to disk: Invalid key format.")
+        # Changes are applied to the buffer before they are logged,
+        # so the blocks listed below hold every change of the first `logged` entries
+        with self._wa_log_lock:
+            logged = len(self._wa_logs)
 
-        # print(f"[FRM | {str(datetime.now())}]: Buffer cleared.")
+        # MANAGE BUFFER
+        # Write the dirty blocks, clean blocks are already on the disk
+        dirty_cache = self.buffer.get_dirty_buffer() if self.buffer is not None else {}
+        for key, (version, value) in dirty_cache.items():
+            # the background writer may have written a newer version of the block meanwhile
+            with self.buffer.write_back_lock:
+                if self.buffer.is_dirty(key, version) and self._write_page(key, value):
+                    self.buffer.mark_clean(key, version)
+        if dirty_cache:
+            self.storage.flush_metadata()
+
+        # print(f"[FRM | {str(datetime.now())}]: Dirty blocks written.")
 
         # MANAGE WA LOG
         with self._wa_log_lock:
             # Check write ahead not empty
-            if len(self._wa_logs) == 0:
+            if logged == 0:
                 # print(f"[FRM | {str(datetime.now())}]: No logs to save.")
                 return
 
@@ -184,22 +177,74 @@ class FailureRecoveryManager:
                 # So it is guarenteed that the remaining transaction id in the set is active.
                 active_transactions = set()
                 with open(self._log_file, "a") as file:
-                    for log in self._wa_logs:
+                    for index, log in enumerate(self._wa_logs[:logged]):
                         status = log.split("|")[1]
                         id = log.split("|")[0]
                         if status != "COMMIT" and status != "ABORT":
                             active_transactions.add(id)
                         else:
                             active_transactions.discard(id)
-                        file.write(log + "\n")
+                        # the logs flushed before are in the file already
+                        if index >= self._flushed:
+                            file.write(log + "\n")
                     file.write(f"CHECKPOINT|{json.dumps(list(active_transactions))}\n")
-                # Clear the wh_log
-                self._wa_logs.clear()
+                # Remove the saved wh_log, the logs added since the dirty blocks were listed stay
+                del self._wa_logs[:logged]
+                self._flushed = max(0, self._flushed - logged)
                 # print(f"[FRM | {str(datetime.now())}]: write ahead log saved.")
             except Exception as e:
                 # print(f"[FRM | {str(datetime.now())}]: Error saving checkpoint: {e}")
                 pass
 
+    def _write_page(self, ky: tuple, value: any) -> bool:
+        """
+        Writes a block of the buffer to the disk, given its buffer key.
+        The write ahead log is flushed first, so the log records of every change in the block are on disk before the block
+
+        Args:
+            ky (tuple): The buffer key of the block
+            value (any): The block data
+
+        Returns:
+            bool: True if the block was written, False if the key format is invalid
+        """
+        self._flush_wal()
+        key = tuple(ky)
+        if len(key) == 5 and key[0] == "hash":
+            # hash => (hash,hashNumber,table,block_id,column)
+            hash_number = key[1]
+            table_name = key[2]
+            block_id = key[3]
+            column_name = key[4]
+            self.storage.write_hash_block_to_disk(
+                table=table_name,
+                block_id=block_id,
+                column=column_name,
+                hash_value=hash_number,
+                block_data=value,
+            )
+        elif len(key) == 4 and key[0] == "bplus":
+            # b+ tree => (bplus,table,column,page_id)
+            self.storage.write_bplus_block_to_disk(
+                table=key[1],
+                column=key[2],
+                page_id=key[3],
+                block_data=value,
+            )
+        elif len(key) == 2:
+            # normal block => {tablename}:{blockid}
+            table_name = key[0]
+            block_id = int(key[1])
+            self.storage.write_block_to_disk(
+                table=table_name,
+                block_id=block_id,
+                block_data=value,
+            )
+        else:
+            print("Error writing block to disk: Invalid key format.")
+            return False
+        return True
+
     def _start_checkpoint_cron_job(self) -> None:
         """
         Start the checkpoint cron job that runs every _checkpoint_interval seconds.
@@ -239,12 +284,15 @@ class FailureRecoveryManager:
             self.timer = None
 
     def _flush_wal(self):
-        with open(self._log_file, "a") as file:
-            self._wa_log_lock.acquire()
-
-            for line in self._wa_logs:
-                file.write(line + "\n")
-
+        self._wa_log_lock.acquire()
+        try:
+            # only the logs not flushed yet, the others are in the file already
+            if self._flushed < len(self._wa_logs):
+                with open(self._log_file, "a") as file:
+                    for line in self._wa_logs[self._flushed:]:
+                        file.write(line + "\n")
+                self._flushed = len(self._wa_logs)
+        finally:
             self._wa_log_lock.release()
 
     def _read_lines_from_end(self, file_path, chunk_size=1024):
@@ -295,7 +343,8 @@ class FailureRecoveryManager:
         is_start_found = False
         # baca wa_logs dulu
         self._wa_log_lock.acquire()
-        for log_line in self._wa_logs:
+        # the flushed logs are read from the log file
+        for log_line in self._wa_logs[self._flushed:]:
             log_parts = log_line.strip().split("|")
             if log_parts[0].isdigit():
                 transaction_id = int(log_parts[0])
@@ -478,7 +527,11 @@ class FailureRecoveryManager:
                 if before_states == None and after_states != None:
                     for state in after_states:
                         data_write = DataWrite(table, state.keys(), state.values(), "")
-                        affected = self.storage.write_block(data_write)
+                        try:
+                            affected = self.storage.write_block(data_write)
+                        except DuplicateKeyError:
+                            # the row reached the disk before the crash, it is already redone
+                            continue
                         # if (affected == 1):
                         # print(f"[FRM | {str(datetime.now())}]: success write block for rollback query.")
                         # else:
@@ -497,6 +550,9 @@ class FailureRecoveryManager:
                         if affected == 1:
                             # print(f"[FRM | {str(datetime.now())}]: success delete block for rollback query.")
                             pass
+                        elif affected == 0:
+                            # the row was deleted on disk before the crash, it is already redone
+                            continue
                         else:
                             # print(f"[FRM | {str(datetime.now())}]: failed delete block for rollback query.")
                             exit()
@@ -519,6 +575,9 @@ class FailureRecoveryManager:
                         if affected == 1:
                             # print(f"[FRM | {str(datetime.now())}]: success delete block for rollback query.")
                             pass
+                        elif affected == 0:
+                            # the row was updated on disk before the crash, it is already redone
+                            continue
                         else:
                             # print(f"[FRM | {str(datetime.now())}]: failed delete block for rollback query.")
                             exit()
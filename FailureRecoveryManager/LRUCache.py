@@ -1,4 +1,4 @@
-from typing import Union
+from typing import Callable, Union
 
 
 class DoublyNode:
@@ -15,13 +15,22 @@ class DoublyNode:
         The previous node
     next : DoublyNode
         The next node
+    dirty : bool
+        Whether the value changed since it was last written to disk
+    version : int
+        Number of the put that stored the value
+    size : int
+        Approximate size of the value, in the unit of max_size
     """
 
-    def __init__(self, key: any, val: any):
+    def __init__(self, key: any, val: any, dirty: bool = False, version: int = 0, size: int = 1):
         self.key = key
         self.val = val
         self.prev = None
         self.next = None
+        self.dirty = dirty
+        self.version = version
+        self.size = size
 
 
 class LRUCache:
@@ -29,15 +38,37 @@ class LRUCache:
     A class for creating a least recently used cache (used in failure recovery manager buffer)
     """
 
-    def __init__(self, capacity: int):
+    def __init__(
+        self,
+        capacity: int,
+        on_evict: Union[Callable[[DoublyNode], None], None] = None,
+        max_size: Union[int, None] = None,
+    ):
         """
         Parameters
         ----------
         capacity : int
             The capacity of the cache
+        on_evict : Callable[[DoublyNode], None], optional
+            Called with the least recently used node when it is evicted by put
+        max_size : int, optional
+            The maximum total size of the values, see put. Defaults to None (only the capacity is enforced).
         """
         self.cap = capacity
         self.cache = {}
+        self.on_evict = on_evict
+        self.max_size = max_size
+        # Total size of the cached values
+        self.used = 0
+        # Pin count of the keys in use, pinned keys are never evicted
+        self.pins = {}
+        # The node put last, never evicted by its own put
+        self._newest = None
+        # Incremented on every put, tells whether a value was put again since it was read
+        self._version = 0
+        # Lookups found and not found by get
+        self.hits = 0
+        self.misses = 0
 
         self.oldest = DoublyNode(0, 0)
         self.latest = DoublyNode(0, 0)
@@ -98,13 +129,103 @@ class LRUCache:
         None: If the key is not found
         """
         if key in self.cache:
+            self.hits += 1
             node = self.cache[key]
             self._remove(node)
             self._insert(node)
             return node.val
+        self.misses += 1
         return None
 
-    def put(self, key: any, value: any) -> Union[any, None]:
+    def peek(self, key: any) -> Union[any, None]:
+        """
+        Gets the value of a key in the cache without counting it as a use:
+        the replacement order and the hit and miss counters are left unchanged
+
+        Parameters
+        ----------
+        key : any
+            The key to be searched
+
+        Returns
+        -------
+        any: The value of the key
+        None: If the key is not found
+        """
+        node = self.cache.get(key)
+        return node.val if node is not None else None
+
+    def _unlink(self, node: DoublyNode) -> None:
+        """
+        Removes a node from the cache
+
+        Parameters
+        ----------
+        node : DoublyNode
+            The node to be removed
+        """
+        self._remove(node)
+        del self.cache[node.key]
+        self.used -= node.size
+
+    def _first_evictable(self, oldest: DoublyNode, latest: DoublyNode) -> Union[DoublyNode, None]:
+        """
+        Finds the oldest node of a linked list that can be evicted
+
+        Parameters
+        ----------
+        oldest : DoublyNode
+            The head sentinel of the linked list
+        latest : DoublyNode
+            The tail sentinel of the linked list
+
+        Returns
+        -------
+        DoublyNode: The oldest node that is neither pinned nor just put
+        None: If there is no such node
+        """
+        node = oldest.next
+        while node is not latest and (node.key in self.pins or node is self._newest):
+            node = node.next
+        return node if node is not latest else None
+
+    def _victim(self) -> Union[DoublyNode, None]:
+        """
+        Chooses the node to evict
+
+        Returns
+        -------
+        DoublyNode: The least recently used node that can be evicted
+        None: If every node is pinned
+        """
+        return self._first_evictable(self.oldest, self.latest)
+
+    def _reclaim(self) -> Union[any, None]:
+        """
+        Evicts nodes until the cache fits its capacity and maximum size.
+        The most recently put node and the pinned nodes are never evicted, the cache grows past its limits
+        if nothing else is left
+
+        Returns
+        -------
+        any: The first evicted value
+        None: If nothing was evicted
+        """
+        evicted = None
+        while len(self.cache) > self.cap or (
+            self.max_size is not None and self.used > self.max_size
+        ):
+            node = self._victim()
+            if node is None:
+                break
+            self._unlink(node)
+            if self.on_evict is not None:
+                self.on_evict(node)
+            if evicted is None:
+                evicted = node
+        return evicted.val if evicted is not None else None
+
+    def put(self, key: any, value: any, dirty: bool = True, size: int = 1) -> Union[any, None]:
         """
         Puts a key-value pair in the cache
 
@@ -114,6 +235,10 @@ class LRUCache:
             The key to be inserted
         value : any
             The value to be inserted
+        dirty : bool
+            Whether the value still has to be written to disk. Defaults to True.
+        size : int
+            Approximate size of the value, counted against max_size. Defaults to 1.
 
         Returns
         -------
@@ -121,22 +246,16 @@ class LRUCache:
         None: There is still space in the cache or old key is overwritten
         """
         if key in self.cache:
-            self._remove(self.cache[key])
-        node = DoublyNode(key, value)
+            self._unlink(self.cache[key])
+        self._version += 1
+        node = DoublyNode(key, value, dirty, self._version, size)
         self.cache[key] = node
         self._insert(node)
+        self.used += size
+        self._newest = node
 
-        if len(self.cache) > self.cap:
-            # if full, must remove the oldest
-            node = self.oldest.next
-            self._remove(node)
-            del self.cache[node.key]
-
-            # return the least recently used value
-            return node.val
-
-        # if still have space or old key is overwritten
-        return None
+        # if full, must remove the oldest
+        return self._reclaim()
 
     def delete(self, key: any) -> bool:
         """
@@ -152,12 +271,45 @@ class LRUCache:
         bool: True if the key is deleted, False otherwise
         """
         if key in self.cache:
-            node = self.cache[key]
-            self._remove(node)
-            del self.cache[key]
+            self._unlink(self.cache[key])
             return True
         return False
 
+    def pin(self, key: any) -> None:
+        """
+        Pins a key so its value is not evicted until it is unpinned as many times.
+        The key may be put after it is pinned
+
+        Parameters
+        ----------
+        key : any
+            The key to be pinned
+        """
+        self.pins[key] = self.pins.get(key, 0) + 1
+
+    def unpin(self, key: any) -> bool:
+        """
+        Releases a pin of a key. Once it has no pin left, values kept only because it was pinned are evicted
+
+        Parameters
+        ----------
+        key : any
+            The key to be unpinned
+
+        Returns
+        -------
+        bool: True if the key was pinned, False otherwise
+        """
+        count = self.pins.get(key)
+        if count is None:
+            return False
+        if count == 1:
+            del self.pins[key]
+            self._reclaim()
+        else:
+            self.pins[key] = count - 1
+        return True
+
     def get_cache(self) -> dict[any, any]:
         """
         Gets the cache dictionary
@@ -171,6 +323,47 @@ class LRUCache:
             newval[key] = node.val
         return newval
 
+    def get_dirty(self) -> dict[any, tuple[int, any]]:
+        """
+        Gets the values that still have to be written to disk
+
+        Returns
+        -------
+        dict[any, tuple[int, any]]: The version and the value of every dirty key
+        """
+        return {key: (node.version, node.val) for key, node in self.cache.items() if node.dirty}
+
+    def mark_clean(self, key: any, version: int) -> bool:
+        """
+        Marks a value as written to disk, unless it was put again since it was read
+
+        Parameters
+        ----------
+        key : any
+            The key of the value
+        version : int
+            The version of the value that was written, see get_dirty
+
+        Returns
+        -------
+        bool: True if the value is now clean, False if the key is gone or holds a newer value
+        """
+        node = self.cache.get(key)
+        if node is None or node.version != version:
+            return False
+        node.dirty = False
+        return True
+
+    def get_stats(self) -> dict[str, int]:
+        """
+        Gets the lookup counters of the cache
+
+        Returns
+        -------
+        dict[str, int]: The number of hits and misses of get
+        """
+        return {"hits": self.hits, "misses": self.misses}
+
     def clear(self) -> None:
         """
         Clears the cache
@@ -179,8 +372,10 @@ class LRUCache:
         -------
         None
         """
-        # Clear the current dictionary
+        # Clear the current dictionary, pins are kept for their holders to release
         self.cache.clear()
+        self.used = 0
+        self._newest = None
 
         # Reinitialize the linked list
         self.oldest = DoublyNode(0, 0)
@@ -0,0 +1,192 @@
+from collections import OrderedDict
+from typing import Callable, Union
+
+from .LRUCache import DoublyNode, LRUCache
+
+
+class TwoQueueCache(LRUCache):
+    """
+    A class for creating a 2Q cache (Johnson and Shasha, 1994)
+
+    Keys referenced once wait in a FIFO queue (A1in), keys referenced again are kept in the LRU list (Am).
+    A pass over many keys referenced once, e.g. a bulk update, only evicts keys of the FIFO queue,
+    so hot keys such as hash bucket pages stay cached.
+    Putting a key again while it is in the FIFO queue keeps it there, only get moves it to the LRU list.
+    Keys evicted from the FIFO queue are remembered without their value (A1out),
+    a key put again while it is remembered goes straight to the LRU list.
+    """
+
+    def __init__(
+        self,
+        capacity: int,
+        on_evict: Union[Callable[[DoublyNode], None], None] = None,
+        max_size: Union[int, None] = None,
+        in_ratio: float = 0.25,
+        out_ratio: float = 0.5,
+    ):
+        """
+        Parameters
+        ----------
+        capacity : int
+            The capacity of the cache
+        on_evict : Callable[[DoublyNode], None], optional
+            Called with the evicted node when it is evicted by put
+        max_size : int, optional
+            The maximum total size of the values, see put. Defaults to None (only the capacity is enforced).
+        in_ratio : float
+            Share of the capacity and maximum size the FIFO queue keeps before the LRU list is evicted from. Defaults to 0.25.
+        out_ratio : float
+            Number of evicted keys remembered, as a share of the capacity. Defaults to 0.5.
+        """
+        super().__init__(capacity, on_evict, max_size)
+        self.in_cap = max(1, int(capacity * in_ratio))
+        self.in_max_size = max_size * in_ratio if max_size is not None else None
+        self.out_cap = max(1, int(capacity * out_ratio))
+
+        # FIFO queue A1in, the inherited linked list is the LRU list Am
+        self.in_oldest = DoublyNode(0, 0)
+        self.in_latest = DoublyNode(0, 0)
+        self.in_oldest.next = self.in_latest
+        self.in_latest.prev = self.in_oldest
+        self._in_keys = set()
+        self.in_used = 0
+
+        # Keys evicted from the FIFO queue, A1out
+        self._out_keys = OrderedDict()
+
+    def _insert_in(self, node: DoublyNode) -> None:
+        """
+        Inserts a node to the FIFO queue
+
+        Parameters
+        ----------
+        node : DoublyNode
+            The node to be inserted
+        """
+        prev = self.in_latest.prev
+        next = self.in_latest
+        prev.next = next.prev = node
+        node.next = next
+        node.prev = prev
+        self._in_keys.add(node.key)
+        self.in_used += node.size
+
+    def _leave_in(self, node: DoublyNode) -> None:
+        """
+        Forgets that a node is in the FIFO queue, once it is removed from its linked list
+
+        Parameters
+        ----------
+        node : DoublyNode
+            The removed node
+        """
+        if node.key in self._in_keys:
+            self._in_keys.discard(node.key)
+            self.in_used -= node.size
+
+    def _unlink(self, node: DoublyNode) -> None:
+        super()._unlink(node)
+        self._leave_in(node)
+
+    def _victim(self) -> Union[DoublyNode, None]:
+        """
+        Chooses the node to evict
+
+        Returns
+        -------
+        DoublyNode: The oldest node of the FIFO queue if the queue is over its share, the least recently used node otherwise
+        None: If every node is pinned
+        """
+        in_over = len(self._in_keys) > self.in_cap or (
+            self.in_max_size is not None and self.in_used > self.in_max_size
+        )
+        in_node = self._first_evictable(self.in_oldest, self.in_latest)
+        lru_node = self._first_evictable(self.oldest, self.latest)
+        if in_node is not None and (in_over or lru_node is None):
+            self._out_keys[in_node.key] = None
+            if len(self._out_keys) > self.out_cap:
+                self._out_keys.popitem(last=False)
+            return in_node
+        return lru_node
+
+    def get(self, key: any) -> Union[any, None]:
+        """
+        Gets the value of a key in the cache, a second reference moves the key to the LRU list
+
+        Parameters
+        ----------
+        key : any
+            The key to be searched
+
+        Returns
+        -------
+        any: The value of the key
+        None: If the key is not found
+        """
+        if key in self.cache:
+            self.hits += 1
+            node = self.cache[key]
+            self._remove(node)
+            self._leave_in(node)
+            self._insert(node)
+            return node.val
+        self.misses += 1
+        return None
+
+    def put(self, key: any, value: any, dirty: bool = True, size: int = 1) -> Union[any, None]:
+        """
+        Puts a key-value pair in the cache
+
+        Parameters
+        ----------
+        key : any
+            The key to be inserted
+        value : any
+            The value to be inserted
+        dirty : bool
+            Whether the value still has to be written to disk. Defaults to True.
+        size : int
+            Approximate size of the value, counted against max_size. Defaults to 1.
+
+        Returns
+        -------
+        any: The first evicted value
+        None: There is still space in the cache or old key is overwritten
+        """
+        self._version += 1
+        node = DoublyNode(key, value, dirty, self._version, size)
+        if key in self._in_keys:
+            # rewritten while it waits, e.g. a block filled by a bulk insert, it is not a second reference
+            self._unlink(self.cache[key])
+            self._insert_in(node)
+        elif key in self.cache:
+            self._unlink(self.cache[key])
+            self._insert(node)
+        elif key in self._out_keys:
+            # referenced again shortly after it was evicted
+            del self._out_keys[key]
+            self._insert(node)
+        else:
+            self._insert_in(node)
+        self.cache[key] = node
+        self.used += size
+        self._newest = node
+
+        return self._reclaim()
+
+    def clear(self) -> None:
+        """
+        Clears the cache
+
+        Returns
+        -------
+        None
+        """
+        super().clear()
+        self.in_oldest = DoublyNode(0, 0)
+        self.in_latest = DoublyNode(0, 0)
+        self.in_oldest.next = self.in_latest
+        self.in_latest.prev = self.in_oldest
+        self._in_keys.clear()
+        self.in_used = 0
+        self._out_keys.clear()
@@ -1,11 +1,15 @@
 import json
+import shutil
 import unittest
+from threading import Thread
 from unittest.mock import MagicMock, patch
 
 from ConcurrencyControlManager.utils import PrimaryKey, Row, Table, TransactionAction
 from FailureRecoveryManager.Buffer import Buffer
 from FailureRecoveryManager.FailureRecoveryManager import FailureRecoveryManager
 from FailureRecoveryManager.LRUCache import LRUCache
+from FailureRecoveryManager.TwoQueueCache import TwoQueueCache
+from StorageManager.classes import Condition, ConditionGroup, DataDeletion, DataRetrieval, DataWrite, StorageManager
 
 # from FailureRecoveryManager.Rows import Rows
 from FailureRecoveryManager.RecoverCriteria import RecoverCriteria
@@ -58,6 +62,16 @@ class TestFailureRecoveryManager(unittest.TestCase):
         self.assertEqual(lru.get("-1"), None)
         self.assertEqual(lru.get("69"), None)
 
+        # Test case 6: a value put again after its dirty snapshot stays dirty
+        version, value = lru.get_dirty()["5"]
+        self.assertEqual(value, "Paul")
+        lru.put("5", "Paula")
+        self.assertFalse(lru.mark_clean("5", version))
+        version, _ = lru.get_dirty()["5"]
+        self.assertTrue(lru.mark_clean("5", version))
+        self.assertNotIn("5", lru.get_dirty())
+        self.assertEqual(lru.get("5"), "Paula")
+
         # Test case 6: clearing the cache
         lru.clear()
         for i in range(1, 8):
@@ -99,6 +113,150 @@ class TestFailureRecoveryManager(unittest.TestCase):
             json.dumps([{"id": 2, "name": "Bob", "salary": 4000}]),
         )
 
+    def test_two_queue_cache(self):
+        """
+        Method for testing the 2Q cache class against a scan
+        """
+        lru = LRUCache(8)
+        two_queue = TwoQueueCache(8)
+        for cache in (lru, two_queue):
+            # Hot keys are used more than once
+            for key in ("hot1", "hot2", "hot3"):
+                cache.put(key, key)
+                cache.get(key)
+            # A scan puts many keys once
+            for i in range(100):
+                cache.put(f"scan{i}", i)
+        self.assertEqual(lru.get("hot1"), None)
+        for key in ("hot1", "hot2", "hot3"):
+            self.assertEqual(two_queue.get(key), key)
+        self.assertEqual(len(two_queue.cache), 8)
+        self.assertEqual(two_queue.get("scan99"), 99)
+        self.assertEqual(two_queue.get("scan0"), None)
+
+        # A key put again shortly after its eviction goes straight to the LRU list
+        two_queue.put("scan94", 94)
+        for i in range(100, 110):
+            two_queue.put(f"scan{i}", i)
+        self.assertEqual(two_queue.get("scan94"), 94)
+
+        # Deleting and clearing
+        self.assertTrue(two_queue.delete("hot1"))
+        self.assertEqual(two_queue.get("hot1"), None)
+        two_queue.clear()
+        self.assertTrue(two_queue.is_empty())
+
+        # Buffer counters
+        buffer = Buffer(4, policy="2q")
+        buffer.put_buffer("table1", 1, b"block1_data")
+        buffer.get_buffer("table1", 1)
+        buffer.get_buffer("table1", 2)
+        stats = buffer.get_stats()
+        self.assertEqual(
+            (stats["policy"], stats["hits"], stats["misses"], stats["hit_rate"]),
+            ("2q", 1, 1, 0.5),
+        )
+        with self.assertRaises(ValueError):
+            Buffer(4, policy="fifo")
+
+        # Peeking is not a use: no counter changes and the block stays in the FIFO queue
+        buffer.put_buffer("table1", 3, b"block3_data")
+        self.assertEqual(buffer.peek_buffer("table1", 3), b"block3_data")
+        self.assertEqual(buffer.peek_buffer("table1", 4), None)
+        stats = buffer.get_stats()
+        self.assertEqual((stats["hits"], stats["misses"]), (1, 1))
+        cache = buffer._shard(("table1", 3)).cache
+        self.assertIn(("table1", 3), cache._in_keys)
+
+        # A bulk insert pins and puts each block many times, the blocks stay in the FIFO queue
+        buffer = Buffer(8, policy="2q")
+        for block_id in (1, 2, 3):
+            buffer.put_buffer("hot", block_id, [])
+            buffer.get_buffer("hot", block_id)
+        for block_id in range(50):
+            for i in range(20):
+                rows = (buffer.pin_buffer("table1", block_id) or []) + [i]
+                buffer.put_buffer("table1", block_id, rows)
+                buffer.unpin_buffer("table1", block_id)
+        cache = buffer._shard(("table1", 49)).cache
+        self.assertIn(("table1", 49), cache._in_keys)
+        for block_id in (1, 2, 3):
+            self.assertEqual(buffer.peek_buffer("hot", block_id), [])
+        self.assertEqual(buffer.peek_buffer("table1", 49), list(range(20)))
+
+    def test_buffer_max_bytes(self):
+        """
+        Method for testing the byte budget of the buffer
+        """
+        block = [{"id": i, "name": f"Student {i}"} for i in range(100)]
+        block_size = Buffer._sizeof(block)
+        self.assertGreater(block_size, 10000)
+
+        # The byte budget evicts before the block capacity is reached
+        buffer = Buffer(100, max_bytes=3 * block_size)
+        for block_id in range(10):
+            buffer.put_buffer("table1", block_id, list(block))
+        self.assertEqual(len(buffer.get_buffer_values()), 3)
+        self.assertLessEqual(buffer.get_stats()["bytes"], 3 * block_size)
+
+        # A block larger than the budget is still cached
+        buffer = Buffer(100, max_bytes=block_size // 2)
+        buffer.put_buffer("table1", 1, block)
+        self.assertEqual(buffer.get_buffer("table1", 1), block)
+
+        # Resident bytes per table and per index
+        buffer = Buffer(100, policy="2q", max_bytes=10 * block_size)
+        buffer.put_buffer("table1", 1, block)
+        buffer.put_buffer_hash(7, "table1", 0, "id", {"pages": 1, "entries": [(1, 1, 0)]})
+        buffer.put_buffer_bplus("table1", "name", 0, {"leaf": True, "keys": [], "next": None})
+        resident = buffer.get_resident_bytes()
+        self.assertEqual(resident["table1"]["data"], block_size)
+        self.assertEqual(set(resident["table1"]["indexes"]), {"id", "name"})
+        self.assertEqual(
+            buffer.get_stats()["bytes"],
+            block_size + sum(resident["table1"]["indexes"].values()),
+        )
+
+    def test_buffer_shards(self):
+        """
+        Method for testing the sharded buffer and the pins
+        """
+        # Pinned blocks are not evicted until they are unpinned
+        buffer = Buffer(2)
+        self.assertEqual(buffer.pin_buffer("table1", 1), None)
+        buffer.put_buffer("table1", 1, b"block1_data")
+        for block_id in range(2, 6):
+            buffer.put_buffer("table1", block_id, b"data")
+        self.assertEqual(buffer.get_buffer("table1", 1), b"block1_data")
+        self.assertTrue(buffer.unpin_buffer("table1", 1))
+        self.assertFalse(buffer.unpin_buffer("table1", 1))
+        buffer.put_buffer("table1", 6, b"data")
+        buffer.put_buffer("table1", 7, b"data")
+        self.assertNotIn(("table1", 1), buffer.get_buffer_values())
+
+        # Threads using a sharded buffer, every block stays readable
+        buffer = Buffer(64, shards=8)
+
+        def work(table):
+            for block_id in range(50):
+                buffer.put_buffer(table, block_id, [table, block_id])
+                buffer.pin_buffer(table, block_id)
+                self.assertEqual(buffer.get_buffer(table, block_id), [table, block_id])
+                buffer.unpin_buffer(table, block_id)
+
+        threads = [Thread(target=work, args=(f"table{i}",)) for i in range(4)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        self.assertLessEqual(len(buffer.get_buffer_values()), 64)
+        dirty = buffer.get_dirty_buffer()
+        self.assertEqual(len(dirty), 200)
+        self.assertEqual(dirty[("table3", 49)][1], ["table3", 49])
+        self.assertEqual(buffer.get_buffer("table0", 0), ["table0", 0])
+        with self.assertRaises(ValueError):
+            Buffer(64, shards=0)
+
     @patch.object(FailureRecoveryManager, "_start_checkpoint_cron_job")
     @patch("StorageManager.classes.StorageManager")
     def test_save_checkpoint(
@@ -110,12 +268,11 @@ class TestFailureRecoveryManager(unittest.TestCase):
         mock_storage.write_block_to_disk = MagicMock()
         mock_storage.write_hash_block_to_disk = MagicMock()
 
-        # Create test buffer data
-        test_buffer = {
-            ("table1", "1"): b"block1_data",
-            ("table2", "2"): b"block2_data",
-            ("hash", 1, "table3", 3, "column1"): b"hash_block_data",
-        }
+        # Create test buffer data, written blocks are dirty
+        buffer = Buffer(5)
+        buffer.put_buffer("table1", "1", b"block1_data")
+        buffer.put_buffer("table2", "2", b"block2_data")
+        buffer.put_buffer_hash(1, "table3", 3, "column1", b"hash_block_data")
 
         # Create test write-ahead logs
         test_wa_logs = [
@@ -128,9 +285,6 @@ class TestFailureRecoveryManager(unittest.TestCase):
         with open("./FailureRecoveryManager/test/test_log.log", "w") as file:
             pass  # Create empty test log file
 
-        buffer = Buffer(5)
-        buffer.clear_buffer = MagicMock(return_value=test_buffer)
-
         frm = FailureRecoveryManager(
             buffer=buffer,
             log_file="./FailureRecoveryManager/test/test_log.log",
@@ -141,8 +295,10 @@ class TestFailureRecoveryManager(unittest.TestCase):
         # Execute
         frm._save_checkpoint()
 
-        # Assert buffer operations
-        buffer.clear_buffer.assert_called_once()
+        # Assert buffer operations: the blocks stay cached as clean blocks
+        self.assertEqual(len(buffer.get_buffer_values()), 3)
+        self.assertEqual(buffer.get_buffer("table1", "1"), b"block1_data")
+        self.assertEqual(buffer.get_dirty_buffer(), {})
 
         # Verify normal block writes
         mock_storage.write_block_to_disk.assert_any_call(
@@ -176,6 +332,16 @@ class TestFailureRecoveryManager(unittest.TestCase):
         # Verify write-ahead logs were cleared
         self.assertEqual(len(frm._wa_logs), 0)
 
+        # Only the block written since is written by the next checkpoint
+        buffer.put_buffer("table2", "2", b"block2_new_data")
+        mock_storage.write_block_to_disk.reset_mock()
+        mock_storage.write_hash_block_to_disk.reset_mock()
+        frm._save_checkpoint()
+        mock_storage.write_block_to_disk.assert_called_once_with(
+            table="table2", block_id=2, block_data=b"block2_new_data"
+        )
+        mock_storage.write_hash_block_to_disk.assert_not_called()
+
         # Cleanup
         with open("./FailureRecoveryManager/test/test_log.log", "w") as file:
             pass
@@ -190,7 +356,6 @@ class TestFailureRecoveryManager(unittest.TestCase):
         mock_storage = mock_storage_manager()
 
         buffer = Buffer(5)
-        buffer.clear_buffer = MagicMock(return_value=None)
 
         frm = FailureRecoveryManager(
             buffer=buffer,
@@ -203,7 +368,7 @@ class TestFailureRecoveryManager(unittest.TestCase):
         frm._save_checkpoint()
 
         # Assert
-        buffer.clear_buffer.assert_called_once()
+        mock_storage.write_block_to_disk.assert_not_called()
         self.assertEqual(len(frm._wa_logs), 0)
 
         with open("./FailureRecoveryManager/test/test_log.log", "r") as f:
@@ -213,6 +378,101 @@ class TestFailureRecoveryManager(unittest.TestCase):
         with open("./FailureRecoveryManager/test/test_log.log", "w") as file:
             pass
 
+    @patch.object(FailureRecoveryManager, "_start_checkpoint_cron_job")
+    @patch("StorageManager.classes.StorageManager")
+    def test_write_back_flushes_log(
+        self, mock_storage_manager, mock_start_checkpoint_cron_job
+    ):
+        # Setup, the storage records the log file when a block is written
+        mock_start_checkpoint_cron_job.return_value = None
+        mock_storage = mock_storage_manager()
+        log_file = "./FailureRecoveryManager/test/test_log.log"
+        logs_at_write = []
+
+        def write_block_to_disk(table, block_id, block_data):
+            with open(log_file, "r") as f:
+                logs_at_write.append(f.read().strip().split("\n"))
+
+        mock_storage.write_block_to_disk = MagicMock(side_effect=write_block_to_disk)
+        with open(log_file, "w") as file:
+            pass
+
+        buffer = Buffer(1)
+        frm = FailureRecoveryManager(
+            buffer=buffer, log_file=log_file, storage_manager=mock_storage
+        )
+        test_wa_logs = [
+            "101|START",
+            '101|WRITE|employees|None|[{"id": 1, "name": "Alice", "salary": 5000}]',
+        ]
+        frm._wa_logs = test_wa_logs.copy()
+
+        # Execute, the dirty block is evicted and written back before the transaction ends
+        buffer.put_buffer("employees", 0, [{"id": 1, "name": "Alice", "salary": 5000}])
+        buffer.put_buffer("employees", 1, [])
+        buffer.wait_write_back()
+
+        # Assert the log records reached the log file before the block
+        self.assertEqual(logs_at_write, [test_wa_logs])
+        self.assertEqual(frm._wa_logs, test_wa_logs)
+
+        # The next checkpoint does not write the flushed logs again
+        frm._save_checkpoint()
+        with open(log_file, "r") as f:
+            log_content = f.read().strip().split("\n")
+        self.assertEqual(log_content[:2], test_wa_logs)
+        self.assertEqual(len(log_content), 3)
+        self.assertEqual(log_content[-1], 'CHECKPOINT|["101"]')
+        self.assertEqual(frm._wa_logs, [])
+
+        # Cleanup
+        with open(log_file, "w") as file:
+            pass
+
+    @patch.object(FailureRecoveryManager, "_start_checkpoint_cron_job")
+    @patch("StorageManager.classes.StorageManager")
+    def test_write_back_on_eviction(
+        self, mock_storage_manager, mock_start_checkpoint_cron_job
+    ):
+        # Without a writer, an evicted dirty block stays readable and is left to the checkpoint
+        buffer = Buffer(1)
+        buffer.put_buffer("table1", 1, b"block1_data")
+        buffer.put_buffer("table1", 2, b"block2_data")
+        self.assertEqual(buffer.get_buffer("table1", 1), b"block1_data")
+        self.assertIn(("table1", 1), buffer.get_dirty_buffer())
+
+        # The FRM writes evicted dirty blocks back in the background
+        mock_start_checkpoint_cron_job.return_value = None
+        mock_storage = mock_storage_manager()
+        mock_storage.write_block_to_disk = MagicMock()
+        frm = FailureRecoveryManager(
+            buffer=buffer,
+            log_file="./FailureRecoveryManager/test/test_log.log",
+            storage_manager=mock_storage,
+        )
+        buffer.wait_write_back()
+        mock_storage.write_block_to_disk.assert_called_once_with(
+            table="table1", block_id=1, block_data=b"block1_data"
+        )
+        self.assertEqual(set(buffer.get_dirty_buffer()), {("table1", 2)})
+
+        buffer.put_buffer("table1", 3, b"block3_data")
+        buffer.wait_write_back()
+        mock_storage.write_block_to_disk.assert_called_with(
+            table="table1", block_id=2, block_data=b"block2_data"
+        )
+
+        # Clean blocks are dropped without a write
+        frm._save_checkpoint()
+        mock_storage.write_block_to_disk.reset_mock()
+        buffer.put_buffer("table1", 4, b"block4_data")
+        buffer.wait_write_back()
+        mock_storage.write_block_to_disk.assert_not_called()
+
+        # Cleanup
+        with open("./FailureRecoveryManager/test/test_log.log", "w") as file:
+            pass
+
     # test_recover
     @patch.object(FailureRecoveryManager, "_start_checkpoint_cron_job")
     @patch("StorageManager.classes.StorageManager")
@@ -384,6 +644,48 @@ class TestFailureRecoveryManager(unittest.TestCase):
         with open("./FailureRecoveryManager/test/log_recover_crash.log", "w") as file:
             pass
 
+    @patch.object(FailureRecoveryManager, "_start_checkpoint_cron_job")
+    def test_recover_system_crash_written_back(self, mock_start_checkpoint_cron_job):
+        # The changes of a committed transaction reach the disk by write back before the crash
+        shutil.rmtree(StorageManager.DATA_DIR, ignore_errors=True)
+        log_file = "./FailureRecoveryManager/test/log_recover_crash.log"
+        alice = {"id": 1, "name": "Alice", "dept_name": "Physics", "tot_cred": 10}
+        bob = {"id": 2, "name": "Bob", "dept_name": "Physics", "tot_cred": 20}
+        alice_b = dict(alice, name="Alice B")
+        log_data = [
+            "101|START",
+            f"101|WRITE|Student|None|{json.dumps([alice, bob])}",
+            f"101|WRITE|Student|{json.dumps([bob])}|None",
+            f"101|WRITE|Student|{json.dumps([alice])}|{json.dumps([alice_b])}",
+            "101|COMMIT",
+        ]
+        with open(log_file, "w") as file:
+            file.write("\n".join(log_data) + "\n")
+
+        buffer = Buffer(1)
+        storage = StorageManager(buffer)
+        FailureRecoveryManager(buffer=buffer, log_file=log_file, storage_manager=storage)
+        for row in (alice, bob):
+            storage.write_block(DataWrite("Student", list(row), list(row.values()), "row"))
+        storage.delete_block(DataDeletion("Student", ConditionGroup([Condition("id", "=", 2)]), "row"))
+        storage.write_block(DataWrite("Student", ["name"], ["Alice B"], "row", conditions=ConditionGroup([Condition("id", "=", 1)])))
+        # the last dirty block is evicted too, then the system crashes before any checkpoint
+        buffer.put_buffer("Other", 0, [])
+        buffer.wait_write_back()
+
+        # Redoing the delete and the update matches no row, they are already applied
+        storage = StorageManager(Buffer(10))
+        frm = FailureRecoveryManager(buffer=storage.buffer, log_file=log_file, storage_manager=storage)
+        all_students = DataRetrieval("Student", ["id", "name"], ConditionGroup([]), "sequential", "row")
+        self.assertEqual(storage.read_block(all_students), [{"id": 1, "name": "Alice B"}])
+        frm.recover_system_crash()
+        self.assertEqual(storage.read_block(all_students), [{"id": 1, "name": "Alice B"}])
+
+        # Cleanup
+        shutil.rmtree(StorageManager.DATA_DIR)
+        with open(log_file, "w") as file:
+            pass
+
 
 if __name__ == "__main__":
     unittest.main()
@@ -1,5 +1,5 @@
 import math
-from typing import Literal, Union
+from typing import Dict, Iterable, List, Literal, Union
 
 from QueryOptimizer.query_plan.nodes.constants import BLOCK_SIZE
 
@@ -40,7 +40,11 @@ MOCK_DATA = {
             "semester": {"V": 4, "index": "hash", "size": 1, "min": 1, "max": 4},
             "year": {"V": 10, "index": "hash", "size": 2, "min": 2020, "max": 2030},
             "grade": {"V": 5, "index": None, "size": 1, "min": 0, "max": 4},
-        }
+        },
+        # Composite indexes, "include" lists the columns stored in the index entries (covering index)
+        "indexes": [
+            {"attributes": ["id", "course_id"], "type": "hash", "include": ["grade"]},
+        ]
     },
     "instructor": {
         "n": 300,
@@ -76,7 +80,10 @@ MOCK_DATA = {
             "building": {"V": 10, "index": None, "size": 16},
             "room_no": {"V": 50, "index": None, "size": 4, "min": 100, "max": 999},
             "time_slot_id": {"V": 20, "index": None, "size": 2, "min": 1, "max": 20},
-        }
+        },
+        "indexes": [
+            {"attributes": ["course_id", "sec_id", "semester", "year"], "type": "btree", "include": []},
+        ]
     },
     "teaches": {
         "n": 1200,
@@ -86,7 +93,10 @@ MOCK_DATA = {
             "sec_id": {"V": 50, "index": "hash", "size": 2, "min": 1, "max": 50}, # Primary Key
             "semester": {"V": 4, "index": "hash", "size": 1, "min": 1, "max": 4}, # Primary Key
             "year": {"V": 10, "index": "hash", "size": 2, "min": 2020, "max": 2030}, # Primary Key
-        }
+        },
+        "indexes": [
+            {"attributes": ["id", "course_id", "sec_id", "semester", "year"], "type": "hash", "include": []},
+        ]
     },
     "time_slot": {
         "n": 50,
@@ -138,14 +148,60 @@ class QOData:
             raise ValueError("Relation not found")
         return ret
 
-    def get_index(self, attribute: str, relation: str) -> Union[Literal["hash", "btree"], None]:
-        """Get the type of index on the given attribute in the relation."""
+    def get_index(self, attribute: Union[str, List[str]], relation: str) -> Union[Literal["hash", "btree"], None]:
+        """Get the type of index on the given attribute (or composite index on the given attributes, in key order) in the relation."""
+        if not isinstance(attribute, str):
+            attributes = list(attribute)
+            if len(attributes) != 1:
+                index = next((index for index in self.get_indexes(relation) if index["attributes"] == attributes), None)
+                return index["type"] if index is not None else None
+            attribute = attributes[0]
         return self.data.get(relation, {}).get("attributes", {}).get(attribute, {}).get("index", None)
     
-    def has_index(self, attribute: str, relation: str) -> bool:
-        """Check if the attribute in the relation has an index."""
+    def has_index(self, attribute: Union[str, List[str]], relation: str) -> bool:
+        """Check if the attribute (or the attributes, as a composite index) in the relation has an index."""
         return self.get_index(attribute, relation) is not None
 
+    def get_indexes(self, relation: str) -> List[Dict]:
+        """Get every index of the relation as {"attributes", "type", "include"}, single-attribute indexes first."""
+        relation_data = self.data.get(relation, {})
+        indexes = [{"attributes": [attribute], "type": info["index"], "include": []}
+                   for attribute, info in relation_data.get("attributes", {}).items() if info.get("index") is not None]
+        return indexes + [{"include": [], **index} for index in relation_data.get("indexes", [])]
+
+    def get_probe_index(self, attributes: Iterable[str], relation: str) -> Union[Dict, None]:
+        """
+        Get the index answering equalities on the given attributes with a single probe:
+        a hash index on a subset of them, or a btree whose leading attributes are among them.
+
+        Args:
+            attributes (Iterable[str]): Attributes compared for equality with a literal
+            relation (str): Name of the relation
+
+        Returns:
+            Dict: The index using the most attributes (a hash index on a tie), with "probe" set to the attributes it uses
+            None: If no index applies
+        """
+        attributes = set(attributes)
+        best, best_score = None, 0
+        for index in self.get_indexes(relation):
+            if index["type"] == "hash":
+                if not attributes.issuperset(index["attributes"]):
+                    continue
+                probe = list(index["attributes"])
+                score = len(probe) + 0.5
+            else:
+                probe = []
+                for attribute in index["attributes"]:
+                    if attribute not in attributes:
+                        break
+                    probe.append(attribute)
+                score = len(probe)
+            if probe and score > best_score:
+                best, best_score = {**index, "probe": probe}, score
+        return best
+
+
     def get_V(self, attribute: str, relation: str) -> int:
         """Get the number of distinct values for the attribute in the relation."""
         ret = self.data.get(relation, {}).get("attributes", {}).get(attribute, {}).get("V", 0)
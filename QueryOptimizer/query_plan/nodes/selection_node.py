@@ -65,6 +65,17 @@ class SelectionNode(QueryNode):
 
         previous_cost = self.child.estimate_cost(statistics, alias_dict)
 
+        # Equalities on every attribute of a composite hash index or on leading attributes of a composite btree: one probe
+        equalities = {}
+        for condition in self.conditions:
+            if condition.right_table_alias is None and condition.operator == Operator.EQ:
+                equalities.setdefault(alias_dict[condition.left_table_alias], set()).add(condition.left_attribute)
+        for table_name, attributes in equalities.items():
+            index = QOData().get_probe_index(attributes, table_name)
+            if index is not None and len(index["probe"]) > 1:
+                c = 1 if index["type"] == "hash" else 3
+                return previous_cost + (c + self.n) * (t_T + t_S) + self.b * t_T
+
         is_index = False
         for condition in self.conditions:
 
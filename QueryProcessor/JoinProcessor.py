@@ -1,5 +1,8 @@
+from itertools import islice, repeat
 from typing import *
 
+from StorageManager.ColumnBatch import ColumnBatch
+
 class JoinCondition:
     def __init__(self, column1: str, operation: str, column2: str):
         # Column in table1 (Left of JOIN)
@@ -39,41 +42,66 @@ class JoinProcessor:
 
         return result
 
-    def join_on_nested_loop(self, rows1: List[dict], rows2: List[dict], condition: Union[JoinCondition, None], size: int = 10):
+    def join_on_nested_loop(self, rows1: Iterable[dict], rows2: Iterable[dict], condition: Union[JoinCondition, None], size: int = 10):
         """
         Perform a JOIN ON (inner join) using block nested loop strategy.
         Simulates processing rows in smaller blocks for memory optimization.
         
-        :param rows1: Rows from the first table.
+        :param rows1: Rows from the first table, any iterable (e.g. StorageManager.scan).
         :param rows2: Rows from the second table.
         :param condition: A Condition object specifying the join condition. If None, combines all rows.
         :param size: The number of rows in each block to simulate block processing.
         :return: A list of joined rows.
         """
-        result = []
+        return list(self.iter_join_on_nested_loop(rows1, rows2, condition, size))
+
+    def iter_join_on_nested_loop(self, rows1: Iterable[dict], rows2: Iterable[dict], condition: Union[JoinCondition, None], size: int = 10) -> Iterator[dict]:
+        """
+        Pipelined version of join_on_nested_loop, yields the joined rows as rows1 is consumed.
+        Only rows2 (the inner side) is materialized.
+
+        :param rows1: Rows from the first table, any iterable (e.g. StorageManager.scan).
+        :param rows2: Rows from the second table.
+        :param condition: A Condition object specifying the join condition. If None, combines all rows.
+        :param size: The number of rows of rows1 read per block.
+        :return: An iterator over the joined rows.
+        """
+        rows2 = rows2 if isinstance(rows2, list) else list(rows2)
+        rows1 = iter(rows1)
 
         # Process rows1 in blocks
-        for i in range(0, len(rows1), size):
-            block1 = rows1[i:i + size]
+        while True:
+            block1 = list(islice(rows1, size))
+            if not block1:
+                return
 
             for row1 in block1:
                 for row2 in rows2:
                     if condition is None or self._evaluate_JoinCondition(row1, row2, condition):
-                        result.append({**row1, **row2})
-
-        return result
+                        yield {**row1, **row2}
 
 
-    def join_on_hash(self, rows1: List[dict], rows2: List[dict], condition: JoinCondition):
+    def join_on_hash(self, rows1: Iterable[dict], rows2: Iterable[dict], condition: JoinCondition):
         """
         Perform a JOIN ON (inner join) using hash join strategy.
 
-        :param rows1: Rows from the first table.
-        :param rows2: Rows from the second table.
+        :param rows1: Rows from the first table (probe side), any iterable (e.g. StorageManager.scan).
+        :param rows2: Rows from the second table (build side).
         :param condition: A Condition object specifying the join condition.
         :return: A list of joined rows.
         """
-        result = []
+        return list(self.iter_join_on_hash(rows1, rows2, condition))
+
+    def iter_join_on_hash(self, rows1: Iterable[dict], rows2: Iterable[dict], condition: JoinCondition) -> Iterator[dict]:
+        """
+        Pipelined version of join_on_hash, yields the joined rows as rows1 is consumed.
+        Only the hash table of rows2 (the build side) is kept in memory.
+
+        :param rows1: Rows from the first table (probe side), any iterable (e.g. StorageManager.scan).
+        :param rows2: Rows from the second table (build side).
+        :param condition: A Condition object specifying the join condition.
+        :return: An iterator over the joined rows.
+        """
         hash_table = {}
 
         for row in rows2:
@@ -92,12 +120,43 @@ class JoinProcessor:
 
             if key in hash_table:
                 for row2 in hash_table[key]:
-                    result.append({**row1, **row2})
+                    yield {**row1, **row2}
 
-        return result
 
+    def iter_join_batches_on_hash(self, batches1: Iterable[ColumnBatch], batches2: Iterable[ColumnBatch], condition: JoinCondition) -> Iterator[ColumnBatch]:
+        """
+        Perform a JOIN ON (inner join) with "=" using hash join strategy over column batches
+        (e.g. StorageManager.scan_batches). The build side is stacked into one batch and hashed
+        once, every probe batch is joined with a single pass over its key column.
+        Rows with a NULL key never match.
 
-    def join_on_merge(self, rows1: List[dict], rows2: List[dict], condition: JoinCondition):
+        :param batches1: Batches from the first table (probe side).
+        :param batches2: Batches from the second table (build side).
+        :param condition: A Condition object specifying the join condition.
+        :return: An iterator over the joined batches, one per probe batch with matches.
+        """
+        if condition.operation != "=":
+            raise ValueError(f"Unsupported operation for a hash join: {condition.operation}")
+        build = ColumnBatch.concat(batches2)
+        if not len(build):
+            return
+        hash_table = {}
+        for index, key in enumerate(build.values(condition.column2)):
+            if key is not None:
+                hash_table.setdefault(key, []).append(index)
+
+        for batch in batches1:
+            left, right = [], []
+            for index, key in enumerate(batch.values(condition.column1)):
+                matches = hash_table.get(key) if key is not None else None
+                if matches:
+                    left.extend(repeat(index, len(matches)))
+                    right.extend(matches)
+            if left:
+                yield batch.take(left).merge(build.take(right))
+
+
+    def join_on_merge(self, rows1: Iterable[dict], rows2: Iterable[dict], condition: JoinCondition):
         """
         Perform a JOIN ON (inner join) using merge join strategy.
         Sort both rows1 and rows2 on the join keys.
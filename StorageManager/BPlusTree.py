@@ -1,386 +1,422 @@
+import math
 import os
 import pickle
-from typing import Union, List, Dict
-import uuid as UUID
+from bisect import bisect_left, bisect_right, insort
+from typing import Any, Callable, Dict, Iterable, Iterator, List, Tuple, Union
 
 from FailureRecoveryManager.Buffer import Buffer
 
-class BPlusBlock:
-    def __init__(self, block_id: int, uuid: str):
-        self.block_id = block_id
-        self.uuid = uuid
-        
-class BPlusLeaf:
-    def __init__(self, block_id: int, identifier: Union[str, int]):
-        self.block_id = block_id
-        self.identifier = identifier
-    
-class BPlusTreeNode:
-    def __init__(self, parent: Union[None, BPlusBlock]=None, is_leaf=False, prev: Union[None, BPlusBlock]=None,
-                 next: Union[None, BPlusBlock]=None, table='', column='', uuid: Union[str, None]=None):
-        self.uuid = str(UUID.uuid4()) if uuid is None else uuid
-        self.table = table
-        self.column = column
-        self.prev = prev
-        self.next = next
-        self.is_leaf = is_leaf
-        self.keys: List[Union[str, int]] = []
-        self.children: List[BPlusBlock | BPlusLeaf] = []
-        self.parent: BPlusBlock = parent
-        if self.is_leaf and self.prev:
-            prev_node = BPlusReader._resolve_node(table, column, prev.block_id, prev.uuid)
-            prev_node.next = self
-            BPlusReader._update_bplus_block(table, column, prev_node.block_id, prev_node.uuid, prev_node)
-        if self.is_leaf and self.next:
-            next_node = BPlusReader._resolve_node(table, column, prev.block_id, prev.uuid)
-            next_node.prev = self
-            BPlusReader._update_bplus_block(table, column, next_node.block_id, next_node.uuid, next_node)
-        self.block_id = BPlusReader._add_bplus_block(table, column, self)
-        
-    def _find(self, key: Union[str, int]):
-        for i, item in enumerate(self.keys):
-            if key < item:
-                return i
-        return len(self.keys)
-
-    def get(self, item: Union[str, int]):
-        return self.children[self._find(item)]
-    
-    def delete(self, key):
-        key_index = self._find(key)
-        self.children.pop(key_index)
-        if key_index < len(self.keys):
-            self.keys.pop(key_index)
-        else:
-            self.keys.pop(key_index - 1)
-        BPlusReader._update_bplus_block(self.table, self.column, self.block_id, self.uuid, self)
-    
-    def merge(self):
-        next = None if not self.next else BPlusReader._resolve_node(self.table, self.column, self.next.block_id, self.next.uuid)
-        prev = None if not self.prev else BPlusReader._resolve_node(self.table, self.column, self.prev.block_id, self.prev.uuid)
-        if self.is_leaf and next and next.parent == self.parent:
-            next.keys = self.keys + next.keys
-            next.children = self.children + next.children
-        elif self.is_leaf:
-            prev.keys += self.keys
-            prev.children += self.children
-        if self.is_leaf and self.next:
-            next.prev = self.prev
-        elif self.is_leaf and self.prev:
-            prev.next = self.next
-        if self.is_leaf:
-            if next:
-                BPlusReader._update_bplus_block(self.table, self.column, next.block_id, next.uuid, next)
-            if prev:
-                BPlusReader._update_bplus_block(self.table, self.column, prev.block_id, prev.uuid, prev)
-            return
-        parent = BPlusReader._resolve_node(self.table, self.column, self.parent.block_id, self.parent.uuid)
-        self_index = parent._find(self.keys[0])
-        if self_index < len(parent.keys):
-            next = parent.children[self_index + 1]
-            next = BPlusReader._resolve_node(self.table, self.column, next.block_id, next.uuid)
-            next.keys = self.keys + [parent.keys[self_index]] + next.keys
-            for child_identifier in self.children:
-                child = BPlusReader._resolve_node(self.table, self.column, child_identifier.block_id, child_identifier.uuid)
-                child.parent = BPlusBlock(next.block_id, next.uuid)
-                BPlusReader._update_bplus_block(self.table, self.column, child.block_id, child.uuid, child)
-            next.children = self.children + next.children
-            BPlusReader._update_bplus_block(self.table, self.column, next.block_id, next.uuid, next)
-            return
-        prev = parent.children[-2]
-        prev = BPlusReader._resolve_node(self.table, self.column, prev.block_id, prev.uuid)
-        prev.keys += [parent.keys[-1]] + self.keys
-        for child_identifier in self.children:
-            child = BPlusReader._resolve_node(self.table, self.column, child_identifier.block_id, child_identifier.uuid)
-            child.parent = BPlusBlock(prev.block_id, prev.uuid)
-            BPlusReader._update_bplus_block(self.table, self.column, child.block_id, child.uuid, child)
-        prev.children += self.children
-        BPlusReader._update_bplus_block(self.table, self.column, prev.block_id, prev.uuid, prev)
-            
-    def take(self, min: int):
-        parent = None if not self.parent else BPlusReader._resolve_node(self.table, self.column, self.parent.block_id, self.parent.uuid)
-        next = None if not self.next else BPlusReader._resolve_node(self.table, self.column, self.next.block_id, self.next.uuid)
-        prev = None if not self.prev else BPlusReader._resolve_node(self.table, self.column, self.prev.block_id, self.prev.uuid)
-        self_index = parent.get(self.keys[0])
-        if self.is_leaf and self_index < len(parent.keys) and \
-            len(next.keys) > min:
-            self.keys += [next.keys.pop(0)]
-            self.children += [next.children.pop(0)]
-            parent.keys[self_index] = next.keys[0]
-            BPlusReader._update_bplus_block(self.table, self.column, parent.block_id, parent.uuid, parent)
-            BPlusReader._update_bplus_block(self.table, self.column, next.block_id, next.uuid, next)
-            BPlusReader._update_bplus_block(self.table, self.column, self.block_id, self.uuid, self)
-            return True
-        elif self.is_leaf and self_index != 0 and len(prev.keys) > min:
-            self.keys = [prev.keys.pop()] + self.keys
-            self.children = [prev.children.pop()] + self.children
-            parent.keys[self_index - 1] = self.keys[0]
-            BPlusReader._update_bplus_block(self.table, self.column, parent.block_id, parent.uuid, parent)
-            BPlusReader._update_bplus_block(self.table, self.column, prev.block_id, prev.uuid, prev)
-            BPlusReader._update_bplus_block(self.table, self.column, self.block_id, self.uuid, self)
-            return True
-        if self.is_leaf or (self_index >= len(parent.keys) and self_index != 0):
-            return False
-        if self_index < len(parent.keys):
-            next: BPlusBlock = parent.children[self_index + 1]
-            next: BPlusTreeNode = BPlusReader._resolve_node(self.table, self.column, next.block_id, next.uuid)
-            if len(next.keys) > min:
-                self.keys += [parent.keys[self_index]]
-                key_taken = next.children.pop(0)
-                key_taken = BPlusReader._resolve_node(self.table, self.column, key_taken.block_id, key_taken.uuid)
-                key_taken.parent = self
-                self.children += [BPlusBlock(key_taken.block_id, key_taken.uuid)]
-                parent.keys[self_index] = next.keys.pop(0)
-                BPlusReader._update_bplus_block(self.table, self.column, next.block_id, next.uuid, next)
-                BPlusReader._update_bplus_block(self.table, self.column, key_taken.block_id, key_taken.uuid, key_taken)
-                BPlusReader._update_bplus_block(self.table, self.column, self.block_id, self.uuid, self)
-        elif self_index != 0:
-            prev: BPlusTreeNode = parent.children[self_index - 1]
-            if len(prev.keys) > min:
-                self.keys = [parent.keys[self_index - 1]] + self.keys
-                key_taken = prev.children.pop()
-                key_taken = BPlusReader._resolve_node(self.table, self.column, key_taken.block_id, key_taken.uuid)
-                key_taken.parent = BPlusBlock(self.block_id, self.uuid)
-                self.children = [BPlusBlock(key_taken.block_id, key_taken.uuid)] + self.children
-                parent.keys[self_index - 1] = prev.keys.pop()
-                BPlusReader._update_bplus_block(self.table, self.column, prev.block_id, prev.uuid, prev)
-                BPlusReader._update_bplus_block(self.table, self.column, key_taken.block_id, key_taken.uuid, key_taken)
-                BPlusReader._update_bplus_block(self.table, self.column, self.block_id, self.uuid, self)
-        return True
-    
-    def split(self):
-        if self.is_leaf:
-            left = BPlusTreeNode(self.parent, True, self.prev, BPlusBlock(self.block_id, self.uuid), self.table, self.column)
-            mid = len(self.keys) // 2
-            left.keys = self.keys[:mid]
-            left.children = self.children[:mid]
-            self.keys = self.keys[mid:]
-            self.children = self.children[mid:]
-            BPlusReader._update_bplus_block(left.table, left.column, left.block_id, left.uuid, left)
-            BPlusReader._update_bplus_block(self.table, self.column, self.block_id, self.uuid, self)
-            return (self.keys[0], [left, self])
-        left = BPlusTreeNode(self.parent, table=self.table, column=self.column)
-        mid = len(self.keys) // 2
-        left.keys = self.keys[:mid]
-        left.children = self.children[:mid + 1]
-        for child_block in left.children:
-            child = BPlusReader._resolve_node(self.table, self.column, child_block.block_id, child_block.uuid)
-            child.parent = BPlusBlock(left.block_id, left.uuid)
-            BPlusReader._update_bplus_block(self.table, self.column, child.block_id, child.uuid, child)
-        key = self.keys[mid]
-        self.keys = self.keys[mid + 1:]
-        self.children = self.children[mid + 1:]
-        BPlusReader._update_bplus_block(left.table, left.column, left.block_id, left.uuid, left)
-        BPlusReader._update_bplus_block(self.table, self.column, self.block_id, self.uuid, self)
-        return (key, [left, self])
-    
-class BPlusReader:
-    
+# An entry (order key, block_id, slot) points to the row stored in slot `slot` of data block `block_id`.
+# The row position makes every entry unique, so duplicate values need no special case.
+# Entries of a covering index end with a fourth item, the values of the included columns.
+Entry = Tuple
+# Saves a B+ tree page: (table, column, page_id, page)
+PageSaver = Callable[[str, str, int, Union[Dict, None]], None]
+
+
+class BPlusTree(object):
+    """
+    B+ TREE INDEX
+    Ordered index on one column or on a tuple of columns, one page per node `{table}__{column}__bplus__block__{page_id}.blk`.
+    Nodes refer to each other by page id, page 0 is the meta page:
+
+        meta     | {"version": BPLUS_VERSION, "root": page id, "pages": next unused page id, "free": [page ids], "size": number of entries}
+        leaf     | {"leaf": True, "entries": [entry, ...], "prev": page id or None, "next": page id or None}
+        internal | {"leaf": False, "keys": [(order key, block_id, slot), ...], "children": [page id, ...]}
+
+    Leaf entries are sorted and the leaves are chained in order, so a range is read by finding its
+    first leaf and following `next`. In an internal node children[i] holds the entries e with
+    keys[i - 1] <= e < keys[i]. Every node but the root holds at least half of its capacity.
+    Freed pages are kept as {} until they are reused, so the checkpoint can remove their file.
+    """
+    # Stored in the meta page, indexes with another page format are rebuilt
+    BPLUS_VERSION = 1
+    LEAF_CAPACITY = 128
+    NODE_CAPACITY = 128
+    META = 0
     DATA_DIR = "data_blocks/"
-    HASH_DIR = "hash/"
     BPLUS_DIR = "bplus/"
-    BLOCK_SIZE = 4096
-    BUFFER: Union[None, Buffer] = None
-    
+    buffer = None
+
     @staticmethod
-    def _get_block_file(table: str, block_id: int) -> str:
-        return os.path.join(BPlusReader.DATA_DIR, f"{table}__block__{block_id}.blk")
+    def change_config(DATA_DIR="data_blocks/", BPLUS_DIR="bplus/", buffer: Union[Buffer, None]=None):
+        BPlusTree.DATA_DIR = DATA_DIR
+        BPlusTree.BPLUS_DIR = BPLUS_DIR
+        BPlusTree.buffer = buffer
 
     @staticmethod
-    def _load_block(table: str, block_id: int) -> List[Dict]:
-        block_file = BPlusReader._get_block_file(table, block_id)
-        if os.path.exists(block_file):
-            with open(block_file, "rb") as file:
-                return pickle.load(file)
-        return []
-    
+    def _order_key(value: Any) -> Tuple:
+        """Key ordering values of any type: NULLs first, then numbers, then strings.
+        Values of the same rank compare like the values themselves.
+        The tuple of a composite index is ordered column by column"""
+        if value is None:
+            return (0, 0)
+        if isinstance(value, (int, float)):
+            return (1, value)
+        if isinstance(value, str):
+            return (2, value)
+        if isinstance(value, tuple):
+            return (4, tuple(map(BPlusTree._order_key, value)))
+        return (3, repr(value))
+
     @staticmethod
-    def read_block(table: str, block_id: str) -> List[Dict]:
-        block = BPlusReader.BUFFER.get_buffer(table, block_id)
-        if not block:
-            block = BPlusReader._load_block(table, block_id)
-        results = []
-        for row in block:
-            results.append({col: row[col] for col in row.keys()})
-        return results
-    
+    def _key_value(order_key: Tuple) -> Tuple[Any, bool]:
+        """Returns the value an order key was made from, and False if it cannot be
+        recovered (values of other types are only kept as their repr)"""
+        rank, value = order_key
+        if rank == 0:
+            return None, True
+        if rank == 4:
+            values = [BPlusTree._key_value(key) for key in value]
+            return tuple(item for item, _ in values), all(exact for _, exact in values)
+        return value, rank != 3
+
     @staticmethod
-    def _get_bplus_block_file(table: str, column: str, block_id: int) -> str:
-        return os.path.join(BPlusReader.DATA_DIR, BPlusReader.BPLUS_DIR, f"{table}__{column}__bplus__block__{block_id}.blk")
-    
+    def _get_bplus_block_file(table: str, column: str, page_id: int) -> str:
+        return os.path.join(BPlusTree.DATA_DIR, BPlusTree.BPLUS_DIR, f"{table}__{column}__bplus__block__{page_id}.blk")
+
     @staticmethod
-    def _load_bplus_block(table: str, column: str, block_id: int) -> List[Dict]:
-        block_file = BPlusReader._get_bplus_block_file(table, column, block_id)
+    def _load_bplus_block(table: str, column: str, page_id: int) -> Union[Dict, None]:
+        block_file = BPlusTree._get_bplus_block_file(table, column, page_id)
         if os.path.exists(block_file):
             with open(block_file, "rb") as file:
                 return pickle.load(file)
-        return []
-            
+        return None
+
     @staticmethod
-    def read_bplus_block(table: str, column: str, block_id: int) -> List[BPlusTreeNode]:
-        results = []
-        block = BPlusReader._load_bplus_block(table, column, block_id)
-        for row in block:
-            results.append(row)
-        return results
-    
+    def _get_bplus_block(table: str, column: str, page_id: int) -> Union[Dict, None]:
+        """Returns a page from the buffer, or from disk if it is not buffered. None if it does not exist"""
+        block = BPlusTree.buffer.get_buffer_bplus(table, column, page_id) if BPlusTree.buffer is not None else None
+        if block is None:
+            return BPlusTree._load_bplus_block(table, column, page_id)
+        return block
+
     @staticmethod
-    def _save_bplus_block(table: str, column: str, block_id: int, block_data: List[Dict]):
-        block_file = BPlusReader._get_bplus_block_file(table, column, block_id)
+    def _save_bplus_block(table: str, column: str, page_id: int, block_data: Dict):
+        if BPlusTree.buffer is None:
+            BPlusTree._save_bplus_block_to_disk(table, column, page_id, block_data)
+            return
+        BPlusTree.buffer.put_buffer_bplus(table, column, page_id, block_data)
+
+    @staticmethod
+    def _save_bplus_block_to_disk(table: str, column: str, page_id: int, block_data: Union[Dict, None]):
+        block_file = BPlusTree._get_bplus_block_file(table, column, page_id)
         if not block_data:
+            # freed pages are kept in the buffer as {} until the checkpoint removes their file
             if os.path.exists(block_file):
                 os.remove(block_file)
-                return
+            return
         with open(block_file, "wb") as file:
             pickle.dump(block_data, file)
-    
+
     @staticmethod
-    def _resolve_node(table: str, column: str, block_id: int, uuid: str) -> BPlusTreeNode:
-        block = BPlusReader.read_bplus_block(table, column, block_id)
-        for node in block:
-            if node.uuid == uuid:
-                return node
-        return None
-    
+    def _get_meta(table: str, column: str) -> Union[Dict, None]:
+        return BPlusTree._get_bplus_block(table, column, BPlusTree.META)
+
     @staticmethod
-    def _resolve_leaf(table: str, column: str, block_id: int, identifier: Union[str, int]) -> Dict:
-        block = BPlusReader.read_block(table, column, block_id)
-        for row in block:
-            if row['column'] == identifier:
-                return row
-        return None
-    
+    def _new_meta() -> Dict:
+        return {"version": BPlusTree.BPLUS_VERSION, "root": 1, "pages": 2, "free": [], "size": 0}
+
     @staticmethod
-    def _update_bplus_block(table: str, column: str, block_id: int, uuid: str, updated_node: BPlusTreeNode):
-        bplus_block = BPlusReader.read_bplus_block(table, column, block_id)
-        new_block = []
-        for node in bplus_block:
-            if node.uuid != uuid:
-                new_block.append(node)
-        new_block.append(updated_node)
-        BPlusReader._save_bplus_block(table, column, block_id, new_block)
-    
+    def _new_leaf(entries: List[Entry], prev: Union[int, None]=None, next: Union[int, None]=None) -> Dict:
+        return {"leaf": True, "entries": entries, "prev": prev, "next": next}
+
     @staticmethod
-    def _add_bplus_block(table: str, column: str, node: BPlusTreeNode) -> int:
-        blocks = sorted(int(file.split('__')[-1].split('.')[0]) 
-                        for file in os.listdir(os.path.join(BPlusReader.DATA_DIR, BPlusReader.BPLUS_DIR)) 
-                        if file.startswith(f"{table}__{column}__bplus"))
-        # add operation
-        for block_id in blocks:
-            block = BPlusReader.read_bplus_block(table, column, block_id)
-            if len(block) < BPlusReader.BLOCK_SIZE:
-                block.append(node)
-                return block_id
-        # If no space, create a new block
-        new_block_id = max(blocks, default=-1) + 1
-        new_block = [node]
-        # give clue it exists
-        BPlusReader._save_bplus_block(table, column, new_block_id, new_block)
-        return new_block_id
-    
+    def _allocate(meta: Dict) -> int:
+        """Returns an unused page id, reusing freed pages first"""
+        if meta["free"]:
+            return meta["free"].pop()
+        page_id = meta["pages"]
+        meta["pages"] += 1
+        return page_id
+
     @staticmethod
-    def change_config(DATA_DIR="data_blocks/", BPLUS_DIR="bplus/", BUFFER=None):
-        BPlusReader.DATA_DIR = DATA_DIR
-        BPlusReader.BPLUS_DIR = BPLUS_DIR
-        BPlusReader.BUFFER = BUFFER
+    def _release(table: str, column: str, meta: Dict, page_id: int, save: PageSaver) -> None:
+        meta["free"].append(page_id)
+        save(table, column, page_id, {})
 
-class BPlusTree:
-    DATA_DIR = "data_blocks/"
-    HASH_DIR = "hash/"
-    BPLUS_DIR = "bplus/"
-    DEGREE = 8
-    DEGREE_MIN = 4
-    
     @staticmethod
-    def initialize_bplus(table, column):
-        root = BPlusTreeNode(is_leaf=True, parent=None, table=table, column=column, uuid='0')
-        BPlusReader._add_bplus_block(table, column, root)
+    def _find_path(table: str, column: str, meta: Dict, probe: Tuple) -> List[Tuple[int, Dict, int]]:
+        """Walks from the root to the leaf where probe belongs
+
+        Returns:
+            List[Tuple[int, Dict, int]]: (page id, node, position of the next node among its children)
+            of every node on the way, the leaf last with position -1
+        """
+        path = []
+        page_id = meta["root"]
+        node = BPlusTree._get_bplus_block(table, column, page_id)
+        while not node["leaf"]:
+            position = bisect_right(node["keys"], probe)
+            path.append((page_id, node, position))
+            page_id = node["children"][position]
+            node = BPlusTree._get_bplus_block(table, column, page_id)
+        path.append((page_id, node, -1))
+        return path
 
     @staticmethod
-    def find(table: str, column: str, key) -> BPlusTreeNode:
-        node = BPlusReader._resolve_node(table, column, 0, '0')
-        while not node.is_leaf:
-            node = node.get(key)
-            node = BPlusReader._resolve_node(table, column, node.block_id, node.uuid)
-        return node
-    
-    def __init__(self, table, column, degree):
-        self.degree = max(degree, 2)
-        self.degree_min = self.degree // 2
-        self.table = table
-        self.column = column
-        self.root = BPlusTreeNode(is_leaf=True, table=self.table, column=self.column)
+    def _split(table: str, column: str, meta: Dict, path: List[Tuple[int, Dict, int]], save: PageSaver) -> None:
+        """Splits the overflowing nodes of path bottom-up, growing a new root if the root splits"""
+        for depth in range(len(path) - 1, -1, -1):
+            page_id, node, _ = path[depth]
+            if node["leaf"]:
+                if len(node["entries"]) <= BPlusTree.LEAF_CAPACITY:
+                    return
+                middle = len(node["entries"]) // 2
+                sibling_id = BPlusTree._allocate(meta)
+                sibling = BPlusTree._new_leaf(node["entries"][middle:], page_id, node["next"])
+                node["entries"] = node["entries"][:middle]
+                if node["next"] is not None:
+                    next_leaf = BPlusTree._get_bplus_block(table, column, node["next"])
+                    next_leaf["prev"] = sibling_id
+                    save(table, column, node["next"], next_leaf)
+                node["next"] = sibling_id
+                separator = sibling["entries"][0][:3]
+            else:
+                if len(node["keys"]) <= BPlusTree.NODE_CAPACITY:
+                    return
+                middle = len(node["keys"]) // 2
+                sibling_id = BPlusTree._allocate(meta)
+                separator = node["keys"][middle]
+                sibling = {"leaf": False, "keys": node["keys"][middle + 1:], "children": node["children"][middle + 1:]}
+                node["keys"] = node["keys"][:middle]
+                node["children"] = node["children"][:middle + 1]
+            save(table, column, page_id, node)
+            save(table, column, sibling_id, sibling)
+            if depth == 0:
+                root_id = BPlusTree._allocate(meta)
+                save(table, column, root_id, {"leaf": False, "keys": [separator], "children": [page_id, sibling_id]})
+                meta["root"] = root_id
+                return
+            parent_id, parent, position = path[depth - 1]
+            parent["keys"].insert(position, separator)
+            parent["children"].insert(position + 1, sibling_id)
+            save(table, column, parent_id, parent)
 
     @staticmethod
-    def get(table: str, column: str, key):
-        leaf = BPlusTree.find(table, column, key)
-        for i, item in enumerate(leaf.keys):
-            if item == key:
-                return BPlusReader._resolve_leaf(table, column, leaf.children[i].identifier)
-        return None
-    
-    def set(self, key, value, leaf=None):
-        if not leaf:
-            leaf = self.find(key)
-        
-    def insert(self, key, value):
-        leaf = self.find(key)
-        if key in leaf.keys:
-            raise ValueError(f"Key {key} tidak unik.")
-        self._insert_in_leaf(leaf, key, value)
-        if len(leaf.keys) == self.degree:
-            self._split_node(leaf)
-
-    def delete(self, key):
-        leaf = self._find_leaf(self.root, key)
-        if key in leaf.keys:
-            index = leaf.keys.index(key)
-            del leaf.keys[index]
-            del leaf.children[index]
-        else:
-            raise KeyError(f"Key {key} tidak ditemukan.")
-
-    def _insert_in_leaf(self, leaf: BPlusTreeNode, key, value):
-        index = 0
-        while index < len(leaf.keys) and key > leaf.keys[index]:
-            index += 1
-        leaf.keys.insert(index, key)
-        leaf.children.insert(index, value)
-
-    def _split_node(self, node: BPlusTreeNode):
-        middle = len(node.keys) // 2
-        sibling = BPlusTreeNode(is_leaf=node.is_leaf)
-        sibling.keys = node.keys[middle:]
-        sibling.children = node.children[middle:]
-        node.keys = node.keys[:middle]
-        node.children = node.children[:middle]
-
-        if node == self.root:
-            new_root = BPlusTreeNode()
-            new_root.keys = [sibling.keys[0]]
-            new_root.children = [node, sibling]
-            self.root = new_root
+    def _rebalance(table: str, column: str, meta: Dict, path: List[Tuple[int, Dict, int]], save: PageSaver) -> None:
+        """Refills the underflowing nodes of path bottom-up, borrowing from a sibling
+        or merging with it, and shrinks the tree when the root is left with one child"""
+        for depth in range(len(path) - 1, 0, -1):
+            page_id, node, _ = path[depth]
+            parent_id, parent, position = path[depth - 1]
+            is_leaf = node["leaf"]
+            items = node["entries"] if is_leaf else node["keys"]
+            minimum = (BPlusTree.LEAF_CAPACITY if is_leaf else BPlusTree.NODE_CAPACITY) // 2
+            if len(items) >= minimum:
+                return
+            left_id = parent["children"][position - 1] if position > 0 else None
+            right_id = parent["children"][position + 1] if position + 1 < len(parent["children"]) else None
+            left = BPlusTree._get_bplus_block(table, column, left_id) if left_id is not None else None
+            right = BPlusTree._get_bplus_block(table, column, right_id) if right_id is not None else None
+
+            if left is not None and len(left["entries" if is_leaf else "keys"]) > minimum:
+                if is_leaf:
+                    node["entries"].insert(0, left["entries"].pop())
+                    parent["keys"][position - 1] = node["entries"][0][:3]
+                else:
+                    node["keys"].insert(0, parent["keys"][position - 1])
+                    node["children"].insert(0, left["children"].pop())
+                    parent["keys"][position - 1] = left["keys"].pop()
+                for changed_id, changed in ((left_id, left), (page_id, node), (parent_id, parent)):
+                    save(table, column, changed_id, changed)
+                return
+            if right is not None and len(right["entries" if is_leaf else "keys"]) > minimum:
+                if is_leaf:
+                    node["entries"].append(right["entries"].pop(0))
+                    parent["keys"][position] = right["entries"][0][:3]
+                else:
+                    node["keys"].append(parent["keys"][position])
+                    node["children"].append(right["children"].pop(0))
+                    parent["keys"][position] = right["keys"].pop(0)
+                for changed_id, changed in ((right_id, right), (page_id, node), (parent_id, parent)):
+                    save(table, column, changed_id, changed)
+                return
+
+            # both siblings are at the minimum, merge the right node of the pair into the left one
+            if left is not None:
+                kept_id, kept, removed_id, removed, separator_position = left_id, left, page_id, node, position - 1
+            else:
+                kept_id, kept, removed_id, removed, separator_position = page_id, node, right_id, right, position
+            if is_leaf:
+                kept["entries"].extend(removed["entries"])
+                kept["next"] = removed["next"]
+                if removed["next"] is not None:
+                    next_leaf = BPlusTree._get_bplus_block(table, column, removed["next"])
+                    next_leaf["prev"] = kept_id
+                    save(table, column, removed["next"], next_leaf)
+            else:
+                kept["keys"].extend([parent["keys"][separator_position]] + removed["keys"])
+                kept["children"].extend(removed["children"])
+            del parent["keys"][separator_position]
+            del parent["children"][separator_position + 1]
+            save(table, column, kept_id, kept)
+            BPlusTree._release(table, column, meta, removed_id, save)
+            save(table, column, parent_id, parent)
+
+        root_id, root, _ = path[0]
+        if not root["leaf"] and not root["keys"]:
+            meta["root"] = root["children"][0]
+            BPlusTree._release(table, column, meta, root_id, save)
+
+    @staticmethod
+    def _insert(table: str, column: str, new_block_id: int, value: Any, slot: int, save: PageSaver,
+                include: Union[Tuple, None]=None) -> None:
+        meta = BPlusTree._get_meta(table, column)
+        if meta is None:
+            meta = BPlusTree._new_meta()
+            save(table, column, meta["root"], BPlusTree._new_leaf([]))
+        entry = (BPlusTree._order_key(value), new_block_id, slot)
+        if include is not None:
+            entry += (include,)
+        path = BPlusTree._find_path(table, column, meta, entry)
+        leaf_id, leaf, _ = path[-1]
+        insort(leaf["entries"], entry)
+        save(table, column, leaf_id, leaf)
+        BPlusTree._split(table, column, meta, path, save)
+        meta["size"] += 1
+        save(table, column, BPlusTree.META, meta)
+
+    @staticmethod
+    def _remove(table: str, column: str, old_block_id: int, value: Any, slot: int, save: PageSaver) -> None:
+        meta = BPlusTree._get_meta(table, column)
+        if meta is None:
+            return
+        # a (block, slot) holds one row, so it identifies the entry whatever the included values
+        entry = (BPlusTree._order_key(value), old_block_id, slot)
+        path = BPlusTree._find_path(table, column, meta, entry)
+        leaf_id, leaf, _ = path[-1]
+        position = bisect_left(leaf["entries"], entry)
+        if position == len(leaf["entries"]) or leaf["entries"][position][:3] != entry:
+            return
+        del leaf["entries"][position]
+        save(table, column, leaf_id, leaf)
+        BPlusTree._rebalance(table, column, meta, path, save)
+        meta["size"] -= 1
+        save(table, column, BPlusTree.META, meta)
+
+    @staticmethod
+    def _range(table: str, column: str, low: Union[Tuple, None]=None, high: Union[Tuple, None]=None,
+               low_inclusive: bool=True, high_inclusive: bool=True, descending: bool=False) -> Iterator[Entry]:
+        """Yields the entries whose order key is between low and high, walking the leaf chain
+
+        Args:
+            table (str): Table name
+            column (str): Indexed column
+            low (Tuple, optional): Lowest order key. Defaults to None, no lower bound.
+            high (Tuple, optional): Highest order key. Defaults to None, no upper bound.
+            low_inclusive (bool): Whether entries equal to low are included. Defaults to True.
+            high_inclusive (bool): Whether entries equal to high are included. Defaults to True.
+            descending (bool): Yield the entries from high to low. Defaults to False.
+
+        Yields:
+            Entry: (order key, block_id, slot[, included values])
+        """
+        meta = BPlusTree._get_meta(table, column)
+        if meta is None:
+            return
+        # (key,) sorts before every entry (key, block_id, slot) and (key, inf) after them
+        if descending:
+            probe = ((math.inf,),) if high is None else (high, math.inf) if high_inclusive else (high,)
         else:
-            parent = self._find_parent(self.root, node)
-            self._insert_in_internal(parent, sibling.keys[0], sibling)
-
-    def _find_parent(self, current: BPlusTreeNode, child):
-        if current.is_leaf or current.children[0].is_leaf:
-            return None
-        for node in current.children:
-            if node == child:
-                return current
-            parent = self._find_parent(node, child)
-            if parent:
-                return parent
-        return None
+            probe = () if low is None else (low,) if low_inclusive else (low, math.inf)
+        leaf = BPlusTree._find_path(table, column, meta, probe)[-1][1]
+        # the caller may write between two yields, each leaf is read from a snapshot
+        entries = tuple(leaf["entries"])
+        position = bisect_left(entries, probe)
+        while True:
+            if descending:
+                for index in range(position - 1, -1, -1):
+                    entry = entries[index]
+                    if low is not None and (entry[0] < low or (entry[0] == low and not low_inclusive)):
+                        return
+                    yield entry
+                following = leaf["prev"]
+            else:
+                for index in range(position, len(entries)):
+                    entry = entries[index]
+                    if high is not None and (entry[0] > high or (entry[0] == high and not high_inclusive)):
+                        return
+                    yield entry
+                following = leaf["next"]
+            if following is None:
+                return
+            leaf = BPlusTree._get_bplus_block(table, column, following)
+            entries = tuple(leaf["entries"])
+            position = len(entries) if descending else 0
+
+    @staticmethod
+    def _write_row(table: str, column: str, new_block_id: int, value, slot: int, include: Union[Tuple, None]=None):
+        BPlusTree._insert(table, column, new_block_id, value, slot, BPlusTree._save_bplus_block, include)
+
+    @staticmethod
+    def _delete_row(table: str, column: str, old_block_id: int, value, slot: int):
+        BPlusTree._remove(table, column, old_block_id, value, slot, BPlusTree._save_bplus_block)
+
+    @staticmethod
+    def _write_row_to_disk(table: str, column: str, new_block_id: int, value, slot: int, include: Union[Tuple, None]=None):
+        BPlusTree._insert(table, column, new_block_id, value, slot, BPlusTree._save_bplus_block_to_disk, include)
+
+    @staticmethod
+    def _delete_row_to_disk(table: str, column: str, old_block_id: int, value, slot: int):
+        BPlusTree._remove(table, column, old_block_id, value, slot, BPlusTree._save_bplus_block_to_disk)
 
-    def _insert_in_internal(self, parent: BPlusTreeNode, key, child):
-        index = 0
-        while index < len(parent.keys) and key > parent.keys[index]:
-            index += 1
-        parent.keys.insert(index, key)
-        parent.children.insert(index + 1, child)
-        if len(parent.keys) == self.degree:
-            self._split_node(parent)
-        
\ No newline at end of file
+    @staticmethod
+    def _bulk_build(table: str, column: str, rows: Iterable[Tuple[Any, int, int, Union[Tuple, None]]]) -> None:
+        """Builds a whole index bottom-up from the sorted entries, writing every page straight
+        to disk exactly once. The buffer is left untouched, the index must not exist yet
+
+        Args:
+            table (str): Table name
+            column (str): Index name
+            rows (Iterable[Tuple[Any, int, int, Tuple]]): (value, block_id, slot, included values or None) of every row of the table
+        """
+        order_key = BPlusTree._order_key
+        # (block_id, slot) is unique, the included values are never compared
+        entries = sorted((order_key(value), block_id, slot) if include is None else (order_key(value), block_id, slot, include)
+                         for value, block_id, slot, include in rows)
+        meta = BPlusTree._new_meta()
+        meta.update(pages=BPlusTree.META + 1, size=len(entries))
+
+        # nodes are filled completely, the last two of a level share their items so none is under half full
+        leaf_chunks = BPlusTree._chunks(entries, BPlusTree.LEAF_CAPACITY, BPlusTree.LEAF_CAPACITY // 2) or [[]]
+        level = []
+        for number, chunk in enumerate(leaf_chunks):
+            level.append((meta["pages"] + number, chunk[0][:3] if chunk else None))
+        for number, chunk in enumerate(leaf_chunks):
+            prev = level[number - 1][0] if number > 0 else None
+            next = level[number + 1][0] if number + 1 < len(level) else None
+            BPlusTree._save_bplus_block_to_disk(table, column, level[number][0], BPlusTree._new_leaf(chunk, prev, next))
+        meta["pages"] += len(level)
+
+        # each internal level has one child per node of the level below it
+        while len(level) > 1:
+            upper = []
+            for children in BPlusTree._chunks(level, BPlusTree.NODE_CAPACITY + 1, BPlusTree.NODE_CAPACITY // 2 + 1):
+                page_id = BPlusTree._allocate(meta)
+                node = {"leaf": False, "keys": [first for _, first in children[1:]], "children": [child for child, _ in children]}
+                BPlusTree._save_bplus_block_to_disk(table, column, page_id, node)
+                upper.append((page_id, children[0][1]))
+            level = upper
+        meta["root"] = level[0][0]
+        BPlusTree._save_bplus_block_to_disk(table, column, BPlusTree.META, meta)
+
+    @staticmethod
+    def _chunks(items: List, capacity: int, minimum: int) -> List[List]:
+        """Cuts items into full chunks of capacity items, balancing the last two chunks
+        so each one holds at least minimum items"""
+        chunks = [items[start:start + capacity] for start in range(0, len(items), capacity)]
+        if len(chunks) > 1 and len(chunks[-1]) < minimum:
+            merged = chunks[-2] + chunks[-1]
+            chunks[-2:] = [merged[:len(merged) // 2], merged[len(merged) // 2:]]
+        return chunks
+
+    @staticmethod
+    def _drop_index(table: str, column: str, buffer: Union[Buffer, None]=None):
+        buffer = buffer if buffer is not None else BPlusTree.buffer
+        if buffer is not None:
+            buffer.delete_buffer_where(lambda key: len(key) == 4 and key[0] == "bplus" and key[1] == table and key[2] == column)
+        bplus_dir = os.path.join(BPlusTree.DATA_DIR, BPlusTree.BPLUS_DIR)
+        for file in os.listdir(bplus_dir):
+            if file.startswith(f"{table}__{column}__bplus__"):
+                os.remove(os.path.join(bplus_dir, file))
@@ -0,0 +1,120 @@
+import os
+import pickle
+from threading import Lock
+from typing import Callable, Dict, Iterable, List, Tuple, Union
+
+
+class BlockCatalog:
+    """
+    BLOCK CATALOG
+    Maps every table to its live block ids and the fill level (number of rows) of each block.
+    Kept in memory and persisted inside DATA_DIR, so a table scan starts with one dictionary lookup
+    instead of listing the whole data directory.
+    """
+
+    CATALOG_FILE = "block_catalog.dat"
+
+    def __init__(self, data_dir: str, stored_blocks: Union[Callable[[], Iterable[Tuple[str, int]]], None] = None,
+                 load_block: Union[Callable[[str, int], List[Dict]], None] = None):
+        """
+        Args:
+            data_dir (str): Directory where the catalog lives
+            stored_blocks (Callable): Lists every (table, block_id) on disk, only used to rebuild a missing catalog
+            load_block (Callable): Reads a block from disk, only used to rebuild a missing catalog
+        """
+        self._file = os.path.join(data_dir, self.CATALOG_FILE)
+        # {table: {block_id: fill}}, block ids are kept in ascending order
+        self._tables: Dict[str, Dict[int, int]] = {}
+        self._dirty = False
+        self._lock = Lock()
+
+        if os.path.exists(self._file):
+            with open(self._file, "rb") as file:
+                self._tables = pickle.load(file)
+        elif stored_blocks is not None and load_block is not None:
+            self._rebuild(list(stored_blocks()), load_block)
+
+    def _rebuild(self, found: List[Tuple[str, int]], load_block: Callable[[str, int], List[Dict]]) -> None:
+        """One-time migration for data directories written before the catalog existed
+
+        Args:
+            found (List[Tuple[str, int]]): Every (table, block_id) on disk
+            load_block (Callable): Reads a block from disk
+        """
+        for table, block_id in sorted(found):
+            # empty (None) slots are not rows
+            self._tables.setdefault(table, {})[block_id] = sum(row is not None for row in load_block(table, block_id))
+        if found:
+            self._dirty = True
+            self.flush()
+
+    def get_blocks(self, table: str) -> List[int]:
+        """Returns every block id of a table in ascending order"""
+        return list(self._tables.get(table, ()))
+
+    def get_tables(self) -> List[str]:
+        """Returns every table that owns at least one block"""
+        return list(self._tables)
+
+    def has_block(self, table: str, block_id: int) -> bool:
+        return block_id in self._tables.get(table, ())
+
+    def get_fill(self, table: str, block_id: int) -> int:
+        """Returns the number of rows in a block, 0 if the block does not exist"""
+        return self._tables.get(table, {}).get(block_id, 0)
+
+    def next_block_id(self, table: str) -> int:
+        """Returns the id a newly allocated block of the table should use"""
+        blocks = self._tables.get(table)
+        if not blocks:
+            return 0
+        return next(reversed(blocks)) + 1
+
+    def set_fill(self, table: str, block_id: int, fill: int) -> bool:
+        """Registers a block (if new) and updates its fill level
+
+        Args:
+            table (str): Table name
+            block_id (int): Block id
+            fill (int): Number of rows in the block
+
+        Returns:
+            bool: True if the block was not in the catalog before
+        """
+        with self._lock:
+            blocks = self._tables.setdefault(table, {})
+            is_new = block_id not in blocks
+            if is_new and blocks and block_id < next(reversed(blocks)):
+                blocks[block_id] = fill
+                self._tables[table] = dict(sorted(blocks.items()))
+            else:
+                blocks[block_id] = fill
+            self._dirty = True
+            return is_new
+
+    def remove_block(self, table: str, block_id: int) -> bool:
+        """Removes a block from the catalog
+
+        Returns:
+            bool: True if the block was in the catalog
+        """
+        with self._lock:
+            blocks = self._tables.get(table)
+            if blocks is None or block_id not in blocks:
+                return False
+            del blocks[block_id]
+            if not blocks:
+                del self._tables[table]
+            self._dirty = True
+            return True
+
+    def flush(self) -> None:
+        """Writes the catalog to disk if it changed since the last flush"""
+        with self._lock:
+            if not self._dirty:
+                return
+            temp_file = self._file + ".tmp"
+            with open(temp_file, "wb") as file:
+                pickle.dump(self._tables, file)
+            os.replace(temp_file, self._file)
+            self._dirty = False
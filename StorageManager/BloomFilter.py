@@ -0,0 +1,133 @@
+import os
+import pickle
+from threading import Lock
+from typing import Any, Callable, Dict, Iterable, List, Union
+
+from StorageManager.HashIndex import Hash
+
+
+class BloomFilter:
+    """
+    BLOOM FILTER
+    One Bloom filter per block and filtered column, telling which blocks certainly do not hold a value,
+    so equality conditions on columns without an index skip those blocks.
+    Values are added when rows are written, the filter of a block is rebuilt exactly when the block is written to disk.
+    Kept in memory and persisted inside DATA_DIR. The file is removed on the first change after a flush,
+    so a crash before the next flush makes the storage manager rebuild the filters instead of trusting stale ones.
+    """
+
+    BLOOM_FILE = "bloom_filters.dat"
+    # bits per filter and hash functions per value, about 3% false positives for the 128 rows of a full block
+    BITS = 1024
+    HASHES = 4
+
+    def __init__(self, data_dir: str):
+        """
+        Args:
+            data_dir (str): Directory where the filters are persisted
+        """
+        self._file = os.path.join(data_dir, self.BLOOM_FILE)
+        # {table: {column: {block_id: bits}}}
+        self._filters: Dict[str, Dict[str, Dict[int, int]]] = {}
+        self._dirty = False
+        self._lock = Lock()
+
+        if os.path.exists(self._file):
+            with open(self._file, "rb") as file:
+                self._filters = pickle.load(file)
+
+    def exists(self) -> bool:
+        return os.path.exists(self._file)
+
+    @staticmethod
+    def _bits(value: Any) -> int:
+        """Returns the filter bits of a value, by double hashing one 32-bit hash.
+        Values that compare equal hash the same, see Hash._encode_key"""
+        hash_value = Hash._hash_function(value)
+        first, step = hash_value % BloomFilter.BITS, (hash_value // BloomFilter.BITS) | 1
+        bits = 0
+        for i in range(BloomFilter.HASHES):
+            bits |= 1 << (first + i * step) % BloomFilter.BITS
+        return bits
+
+    def _changed(self) -> None:
+        if not self._dirty:
+            self._dirty = True
+            if os.path.exists(self._file):
+                os.remove(self._file)
+
+    def add(self, table: str, block_id: int, row: Dict, columns: Iterable[str]) -> None:
+        """Adds the values of a row written to a block
+
+        Args:
+            table (str): Table name
+            block_id (int): Block id
+            row (Dict): The row
+            columns (Iterable[str]): Filtered columns of the table
+        """
+        with self._lock:
+            self._changed()
+            for column in columns:
+                blocks = self._filters.setdefault(table, {}).setdefault(column, {})
+                blocks[block_id] = blocks.get(block_id, 0) | self._bits(row[column])
+
+    def set_block(self, table: str, block_id: int, read_rows: Callable[[], Iterable[Union[Dict, None]]], columns: Iterable[str]) -> None:
+        """Rebuilds the filters of a block from its rows, dropping the values of deleted and updated rows
+
+        Args:
+            table (str): Table name
+            block_id (int): Block id
+            read_rows (Callable): Returns the current rows of the block, None for an empty slot.
+                Called while the filters are locked, so a value added meanwhile is never lost
+            columns (Iterable[str]): Filtered columns of the table
+        """
+        with self._lock:
+            self._changed()
+            rows = [row for row in read_rows() if row is not None]
+            for column in columns:
+                bits = 0
+                for row in rows:
+                    bits |= self._bits(row[column])
+                self._filters.setdefault(table, {}).setdefault(column, {})[block_id] = bits
+
+    def remove_block(self, table: str, block_id: int) -> None:
+        """Forgets the filters of a block that no longer exists"""
+        with self._lock:
+            for blocks in self._filters.get(table, {}).values():
+                if blocks.pop(block_id, None) is not None:
+                    self._changed()
+
+    def drop_column(self, table: str, column: str) -> None:
+        """Forgets every filter of a column"""
+        with self._lock:
+            if self._filters.get(table, {}).pop(column, None) is not None:
+                self._changed()
+
+    def filter_blocks(self, table: str, column: str, value: Any, blocks: List[int]) -> List[int]:
+        """Keeps the blocks that may hold a row where column = value
+
+        Args:
+            table (str): Table name
+            column (str): Filtered column
+            value (Any): The value
+            blocks (List[int]): Candidate block ids
+
+        Returns:
+            List[int]: The blocks whose filter may hold the value, in the same order. Blocks without a filter are kept
+        """
+        filters = self._filters.get(table, {}).get(column)
+        if filters is None:
+            return blocks
+        bits = self._bits(value)
+        return [block_id for block_id in blocks if filters.get(block_id, bits) & bits == bits]
+
+    def flush(self) -> None:
+        """Writes the filters to disk if they changed since the last flush"""
+        with self._lock:
+            if not self._dirty:
+                return
+            temp_file = self._file + ".tmp"
+            with open(temp_file, "wb") as file:
+                pickle.dump(self._filters, file)
+            os.replace(temp_file, self._file)
+            self._dirty = False
@@ -0,0 +1,195 @@
+from array import array
+from typing import Any, Dict, Iterable, List, Sequence, Union
+
+# A column is an array('q') for integers, an array('d') for floats and a plain list otherwise.
+# NULLs of an array column are stored as 0 and masked out by the validity mask.
+Column = Union[array, List[Any]]
+
+INT_MIN = -(2**63)
+INT_MAX = 2**63 - 1
+
+
+def _typecode(values: List[Any]) -> Union[str, None]:
+    """Returns the array typecode able to hold every non-NULL value, None if a list is needed"""
+    typecode = None
+    for value in values:
+        if value is None:
+            continue
+        if type(value) is int and INT_MIN <= value <= INT_MAX:
+            kind = "q"
+        elif type(value) is float:
+            kind = "d"
+        else:
+            return None
+        if typecode is None:
+            typecode = kind
+        elif typecode != kind:
+            return None
+    return typecode
+
+
+def mask_and(first: bytes, second: bytes) -> bytearray:
+    """Bitwise AND of two 0/1 masks of the same length"""
+    result = int.from_bytes(first, "little") & int.from_bytes(second, "little")
+    return bytearray(result.to_bytes(len(first), "little"))
+
+
+def mask_or(first: bytes, second: bytes) -> bytearray:
+    """Bitwise OR of two 0/1 masks of the same length"""
+    result = int.from_bytes(first, "little") | int.from_bytes(second, "little")
+    return bytearray(result.to_bytes(len(first), "little"))
+
+
+class ColumnBatch:
+    """
+    COLUMN BATCH
+    Columnar representation of a set of rows: one array per column plus a validity mask
+    (one byte per row, 1 = not NULL) for the columns holding NULLs.
+    Replaces the per-row dictionaries of a scan when the rows are filtered, projected
+    or joined in bulk.
+    """
+
+    def __init__(self, columns: List[str], data: Dict[str, Column], validity: Union[Dict[str, bytearray], None] = None, length: Union[int, None] = None):
+        """
+        Args:
+            columns (List[str]): Column order
+            data (Dict[str, Column]): Values of every column
+            validity (Dict[str, bytearray], optional): Validity mask of the columns holding NULLs. Defaults to None.
+            length (int, optional): Number of rows, only needed for a batch without columns. Defaults to None.
+        """
+        self.columns = list(columns)
+        self.data = data
+        self.validity = validity if validity is not None else {}
+        if length is None:
+            length = len(data[columns[0]]) if columns else 0
+        self.length = length
+
+    @staticmethod
+    def from_rows(columns: List[str], rows: Sequence[Dict]) -> "ColumnBatch":
+        """Builds a batch from row dictionaries, a missing value is NULL
+
+        Args:
+            columns (List[str]): Columns to keep
+            rows (Sequence[Dict]): The rows
+
+        Returns:
+            ColumnBatch: The batch
+        """
+        data = {}
+        validity = {}
+        for column in columns:
+            values = [row.get(column) for row in rows]
+            if None in values:
+                validity[column] = bytearray(value is not None for value in values)
+            typecode = _typecode(values)
+            if typecode is None:
+                data[column] = values
+            else:
+                data[column] = array(typecode, [0 if value is None else value for value in values])
+        return ColumnBatch(columns, data, validity, len(rows))
+
+    @staticmethod
+    def concat(batches: Iterable["ColumnBatch"]) -> "ColumnBatch":
+        """Stacks batches with the same columns into one batch
+
+        Raises:
+            ValueError: If the batches do not have the same columns
+        """
+        batches = list(batches)
+        if not batches:
+            return ColumnBatch([], {}, length=0)
+        columns = batches[0].columns
+        if any(batch.columns != columns for batch in batches):
+            raise ValueError("Cannot concatenate batches with different columns")
+        if len(batches) == 1:
+            return batches[0]
+        rows = []
+        for batch in batches:
+            rows.extend(batch.to_rows())
+        return ColumnBatch.from_rows(columns, rows)
+
+    def __len__(self) -> int:
+        return self.length
+
+    def column(self, column: str) -> Column:
+        return self.data[column]
+
+    def is_valid(self, column: str, index: int) -> bool:
+        validity = self.validity.get(column)
+        return validity is None or bool(validity[index])
+
+    def get(self, column: str, index: int) -> Any:
+        """Returns a single value, None if it is NULL"""
+        if not self.is_valid(column, index):
+            return None
+        return self.data[column][index]
+
+    def values(self, column: str) -> List[Any]:
+        """Returns the values of a column as a list, with None for NULLs"""
+        validity = self.validity.get(column)
+        if validity is None:
+            return list(self.data[column])
+        return [value if valid else None for value, valid in zip(self.data[column], validity)]
+
+    def to_rows(self) -> List[Dict]:
+        """Converts the batch back to row dictionaries"""
+        columns = [self.values(column) for column in self.columns]
+        return [dict(zip(self.columns, values)) for values in zip(*columns)] if self.columns else [{} for _ in range(self.length)]
+
+    def project(self, columns: List[str]) -> "ColumnBatch":
+        """Returns a batch holding only the given columns, without copying them"""
+        return ColumnBatch(columns, {column: self.data[column] for column in columns},
+                           {column: self.validity[column] for column in columns if column in self.validity}, self.length)
+
+    def filter(self, mask: bytes) -> "ColumnBatch":
+        """Returns a batch holding the rows whose mask byte is not 0
+
+        Args:
+            mask (bytes): One byte per row
+
+        Returns:
+            ColumnBatch: The selected rows
+        """
+        if mask.count(0) == 0:
+            return self
+        return self.take([index for index, selected in enumerate(mask) if selected])
+
+    def take(self, indices: List[int]) -> "ColumnBatch":
+        """Returns a batch holding the rows at the given positions, in that order"""
+        data = {}
+        validity = {}
+        for column in self.columns:
+            values = self.data[column]
+            taken = [values[index] for index in indices]
+            data[column] = array(values.typecode, taken) if isinstance(values, array) else taken
+            if column in self.validity:
+                column_validity = self.validity[column]
+                validity[column] = bytearray(column_validity[index] for index in indices)
+        return ColumnBatch(self.columns, data, validity, len(indices))
+
+    def merge(self, other: "ColumnBatch") -> "ColumnBatch":
+        """Places the columns of another batch of the same length next to these ones.
+        A column present in both batches takes the values of other.
+
+        Raises:
+            ValueError: If the batches do not have the same length
+        """
+        if len(other) != self.length:
+            raise ValueError("Cannot merge batches of different length")
+        columns = self.columns + [column for column in other.columns if column not in self.data]
+        data = {**self.data, **other.data}
+        validity = {column: mask for column, mask in self.validity.items() if column not in other.data}
+        validity.update(other.validity)
+        return ColumnBatch(columns, data, validity, self.length)
+
+    def to_numpy(self, column: str) -> Any:
+        """Returns a column as a NumPy array, NULLs are 0 for numeric columns and None otherwise
+
+        Raises:
+            ImportError: If NumPy is not installed
+        """
+        import numpy
+        values = self.data[column]
+        if isinstance(values, array):
+            return numpy.frombuffer(values, dtype=numpy.int64 if values.typecode == "q" else numpy.float64)
+        return numpy.array(self.values(column), dtype=object)
@@ -0,0 +1,114 @@
+import os
+import pickle
+from threading import Lock
+from typing import Dict, List, Union
+
+
+class FreeSpaceMap:
+    """
+    FREE SPACE MAP
+    Remembers, per table, which blocks still have room for new rows.
+    Blocks are grouped into a fixed number of free-space categories, so naming a block
+    with enough room never depends on how many blocks the table has.
+    Full blocks are not stored at all.
+    """
+
+    FSM_FILE = "free_space_map.dat"
+    CATEGORIES = 32
+    # How many blocks of the lowest candidate category are probed before giving up
+    MAX_PROBE = 8
+
+    def __init__(self, data_dir: str, capacity: int):
+        """
+        Args:
+            data_dir (str): Directory where the map is persisted
+            capacity (int): Free space of an empty block
+        """
+        self._file = os.path.join(data_dir, self.FSM_FILE)
+        self._capacity = capacity
+        self._category_size = max(1, -(-capacity // self.CATEGORIES))
+        # {table: {block_id: free}}
+        self._free: Dict[str, Dict[int, int]] = {}
+        # {table: [{block_id: None}, ...]} one ordered set per category
+        self._categories: Dict[str, List[Dict[int, None]]] = {}
+        self._dirty = False
+        self._lock = Lock()
+
+        if os.path.exists(self._file):
+            with open(self._file, "rb") as file:
+                for table, blocks in pickle.load(file).items():
+                    for block_id, free in blocks.items():
+                        self._set(table, block_id, free)
+
+    def exists(self) -> bool:
+        return os.path.exists(self._file)
+
+    def _category(self, free: int) -> int:
+        return min(free // self._category_size, self.CATEGORIES - 1)
+
+    def _set(self, table: str, block_id: int, free: int) -> None:
+        blocks = self._free.setdefault(table, {})
+        categories = self._categories.setdefault(table, [{} for _ in range(self.CATEGORIES)])
+        old_free = blocks.pop(block_id, None)
+        if old_free is not None:
+            categories[self._category(old_free)].pop(block_id, None)
+        if free > 0:
+            blocks[block_id] = free
+            categories[self._category(free)][block_id] = None
+
+    def update(self, table: str, block_id: int, free: int) -> None:
+        """Records the free space left in a block
+
+        Args:
+            table (str): Table name
+            block_id (int): Block id
+            free (int): Free space left, 0 (or less) removes the block from the map
+        """
+        with self._lock:
+            self._set(table, block_id, free)
+            self._dirty = True
+
+    def remove_block(self, table: str, block_id: int) -> None:
+        """Forgets a block that no longer exists"""
+        self.update(table, block_id, 0)
+
+    def get_free(self, table: str, block_id: int) -> int:
+        return self._free.get(table, {}).get(block_id, 0)
+
+    def find_block(self, table: str, needed: int = 1) -> Union[int, None]:
+        """Names a block of the table with at least `needed` free space
+
+        Args:
+            table (str): Table name
+            needed (int): Space the new row needs
+
+        Returns:
+            int: Block id with enough room
+            None: If no known block has enough room
+        """
+        categories = self._categories.get(table)
+        if not categories:
+            return None
+        blocks = self._free[table]
+        # Every block of these categories is guaranteed to have enough room
+        for category in range(min(-(-needed // self._category_size), self.CATEGORIES), self.CATEGORIES):
+            if categories[category]:
+                return next(iter(categories[category]))
+        # The category holding `needed` may still have a block that fits
+        for probed, block_id in enumerate(categories[self._category(needed)]):
+            if probed >= self.MAX_PROBE:
+                break
+            if blocks[block_id] >= needed:
+                return block_id
+        return None
+
+    def flush(self) -> None:
+        """Writes the map to disk if it changed since the last flush"""
+        with self._lock:
+            if not self._dirty:
+                return
+            temp_file = self._file + ".tmp"
+            with open(temp_file, "wb") as file:
+                pickle.dump(self._free, file)
+            os.replace(temp_file, self._file)
+            self._dirty = False
@@ -1,214 +1,385 @@
+import math
 import os
 import pickle
-from typing import Any, Dict, List, Union
+import struct
+import zlib
+from typing import Any, Callable, Dict, Iterable, List, Tuple, Union
 
 from FailureRecoveryManager.Buffer import Buffer
 
+# crc32 of the type tags of _encode_key, to continue the checksum without concatenating
+_INT_SEED = zlib.crc32(b"i")
+_STR_SEED = zlib.crc32(b"s")
+
+# Saves a hash page: (table, column, bucket, page_id, page)
+PageSaver = Callable[[str, str, Any, int, Union[Dict, None]], None]
+
+
 class Hash(object):
-    MAX_BUCKET = 10000
+    """
+    HASH INDEX
+    Linear hashing index on one column. The bucket count grows one bucket at a time when the
+    index gets too full and shrinks the same way when it empties, without ever rebuilding the index.
+
+    The state of the index lives in its meta page `{table}__{column}__hash__meta__block__0.blk`:
+
+        {"version": HASH_VERSION, "level": L, "split": next bucket to split, "size": number of entries}
+
+    With N = INITIAL_BUCKETS * 2**L, a hash h lives in bucket h % N, or h % (2 * N) if that bucket
+    was already split during this round. Each bucket is a chain of pages
+    `{table}__{column}__hash__{bucket}__block__{page_id}.blk` numbered from 0:
+
+        head page (0) | {"pages": number of pages in the chain, "entries": [...]}
+        other pages   | {"pages": 0, "entries": [...]}
+
+    An entry `{'key': value, 'id': block_id, 'slot': slot, 'hash': h}` points to the row of that value
+    stored in slot `slot` of data block `block_id`, so a lookup fetches exactly the matching rows.
+    The key of a composite index is the tuple of the row values, and the entries of a covering index
+    also hold `'include': (values of the included columns)` so a query can be answered from the index alone.
+    Every page but the last one holds exactly BUCKET_CAPACITY entries, so an insert only
+    touches the head and the tail page whatever the number of duplicates.
+    """
+    # Stored in the meta page, indexes built with another hash function are rebuilt
+    HASH_VERSION = 2
+    INITIAL_BUCKETS = 4
+    BUCKET_CAPACITY = 128
+    # Average bucket fill, as a fraction of one page, above which a bucket is split and below which two are merged
+    MAX_LOAD = 0.75
+    MIN_LOAD = 0.25
+    META = "meta"
     DATA_DIR = "data_blocks/"
     HASH_DIR = "hash/"
     buffer = None
-    
-    @staticmethod
-    def _get_block_file(table: str, block_id: int) -> str:
-        return os.path.join(Hash.DATA_DIR, f"{table}__block__{block_id}.blk")
-    
-    @staticmethod
-    def _load_block(table: str, block_id: int) -> List[Dict]:
-        block_file = Hash._get_block_file(table, block_id)
-        if os.path.exists(block_file):
-            with open(block_file, "rb") as file:
-                return pickle.load(file)
-        return []
-    
-    @staticmethod
-    def read_block(table: str, column: str, hash_value: int, block_id: int):
-        results = []
-        block = Hash.buffer.get_buffer(table, block_id)
-        if not block:
-            block = Hash._load_block(table, block_id)
-        for row in block:
-            if Hash._hash_function(row[column]) == hash_value:
-                results.append({col: row[col] for col in row.keys()})
-        return results
-    
+    # Reads the row of a (table, block_id, slot) from buffer or disk, provided by the StorageManager
+    row_reader: Union[Callable[[str, int, int], Union[Dict, None]], None] = None
+
     @staticmethod
-    def change_config(DATA_DIR="data_blocks/", HASH_DIR="hash/", buffer: Union[Buffer, None]=None):
+    def change_config(DATA_DIR="data_blocks/", HASH_DIR="hash/", buffer: Union[Buffer, None]=None,
+                      row_reader: Union[Callable[[str, int, int], Union[Dict, None]], None]=None):
         Hash.DATA_DIR = DATA_DIR
         Hash.buffer = buffer
         Hash.HASH_DIR = HASH_DIR
-        
+        Hash.row_reader = row_reader
+
     @staticmethod
-    # have to be stable (unchanged) 
+    def _encode_key(obj: Any) -> bytes:
+        """Typed binary encoding of a key. Keys that compare equal encode the same,
+        so integral floats and booleans are encoded as integers"""
+        if isinstance(obj, float) and obj.is_integer():
+            obj = int(obj)
+        if isinstance(obj, int):
+            obj = int(obj)
+            if -(2**63) <= obj < 2**63:
+                return b"i" + obj.to_bytes(8, "little", signed=True)
+            return b"I" + str(obj).encode("ascii")
+        if isinstance(obj, str):
+            return b"s" + obj.encode("utf-8", "surrogatepass")
+        if isinstance(obj, float):
+            return b"f" + struct.pack("<d", obj)
+        if obj is None:
+            return b"n"
+        if isinstance(obj, tuple):
+            # length prefixed items so (1, 23) and (12, 3) differ
+            return b"t" + b"".join(len(item).to_bytes(4, "little") + item for item in map(Hash._encode_key, obj))
+        if isinstance(obj, bytes):
+            return b"b" + obj
+        return b"o" + str(obj).encode("utf-8", "surrogatepass")
+
+    @staticmethod
+    # have to be stable (unchanged), bump HASH_VERSION when it changes
     def _hash_function(obj: Any) -> int:
-        obj_str = str(obj)
-        
-        def encode_str(s):
-            hash_value = 0
-            for char in s:
-                hash_value = (hash_value * 31 + ord(char)) % (2**32)
-            return hash_value
-
-        def lcg(seed, a=1664525, c=1013904223, m=2**32):
-            return (a * seed + c) % m
-        
-        seed = encode_str(obj_str)
-        random_value = lcg(seed)
-        
-        return random_value % (Hash.MAX_BUCKET)
-    
-    @staticmethod 
+        # fast paths, same result as hashing _encode_key(obj)
+        if type(obj) is int and -(2**63) <= obj < 2**63:
+            return zlib.crc32(obj.to_bytes(8, "little", signed=True), _INT_SEED)
+        if type(obj) is str:
+            return zlib.crc32(obj.encode("utf-8", "surrogatepass"), _STR_SEED)
+        return zlib.crc32(Hash._encode_key(obj))
+
+    @staticmethod
     def _get_hash_buffer_block_file(table: str, column: str, hash_value: str) -> str:
         return f"hash:{hash_value}:{table}:{column}"
-    
+
     @staticmethod
-    def _get_hash_block_file(table: str, column: str, hash_value: int, block_id: int) -> str:
+    def _get_hash_block_file(table: str, column: str, hash_value: Any, block_id: int) -> str:
         return os.path.join(Hash.DATA_DIR, Hash.HASH_DIR, f"{table}__{column}__hash__{hash_value}__block__{block_id}.blk")
-    
+
+    @staticmethod
+    def _as_page(block: Union[Dict, List[Dict], None]) -> Union[Dict, None]:
+        # bucket blocks written before overflow chains are a plain list of entries
+        if isinstance(block, list):
+            return {"pages": 1, "entries": block}
+        return block
+
     @staticmethod
-    def _load_hash_block(table: str, column: str, hash_value: int, block_id: int) -> List[Dict] :
+    def _load_hash_block(table: str, column: str, hash_value: Any, block_id: int) -> Union[Dict, None]:
         block_file = Hash._get_hash_block_file(table, column, hash_value, block_id)
         if os.path.exists(block_file):
             with open(block_file, "rb") as file:
-                return pickle.load(file)
-        return []
-    
+                return Hash._as_page(pickle.load(file))
+        return None
+
+    @staticmethod
+    def _get_hash_block(table: str, column: str, hash_value: Any, block_id: int) -> Union[Dict, None]:
+        """Returns a hash page from the buffer, or from disk if it is not buffered. None if it does not exist"""
+        block = Hash.buffer.get_buffer_hash(hash_value, table, block_id, column) if Hash.buffer is not None else None
+        if block is None:
+            return Hash._load_hash_block(table, column, hash_value, block_id)
+        return Hash._as_page(block)
+
     @staticmethod
-    def _save_hash_block(table: str, column: str, hash_value: int, block_id: int, block_data: List[Dict]):
-        # block_file = Hash._get_hash_buffer_block_file(table, column, hash_value)
+    def _save_hash_block(table: str, column: str, hash_value: Any, block_id: int, block_data: Dict):
+        if Hash.buffer is None:
+            Hash._save_hash_block_to_disk(table, column, hash_value, block_id, block_data)
+            return
         Hash.buffer.put_buffer_hash(hash_value, table, block_id, column, block_data)
-        # with open(block_file, "wb") as file:
-        #    pickle.dump(block_data, file)
-        
+
     @staticmethod
-    def _save_hash_block_to_disk(table: str, column: str, hash_value: int, block_id: int, block_data: List[Dict]):
+    def _save_hash_block_to_disk(table: str, column: str, hash_value: Any, block_id: int, block_data: Union[Dict, None]):
         block_file = Hash._get_hash_block_file(table, column, hash_value, block_id)
-        if block_data is None:
-            if os.path.exists(Hash._get_hash_block_file(table, column, hash_value, block_id)):
-               os.remove(Hash._get_hash_block_file(table, column, hash_value, block_id))
+        page = Hash._as_page(block_data)
+        if page is None or ("entries" in page and not page["entries"]):
+            # emptied pages are kept in the buffer until the checkpoint removes their file
+            if os.path.exists(block_file):
+                os.remove(block_file)
             return
         with open(block_file, "wb") as file:
-           pickle.dump(block_data, file)
-    
-    @staticmethod
-    def _write_hash_block(table: str, column: str, hash_value: int, new_block_id: int):
-        # assumes entries fit in one block
-        block = Hash.buffer.get_buffer_hash(hash_value, table, 0, column)
-        if not block:
-            block = Hash._load_hash_block(table, column, hash_value, 0)
-        block.append({'id': new_block_id})
-        # assumes entries fit in one block
-        # Hash.buffer.put_buffer(Hash._get_hash_buffer_block_file(table, column, hash_value), 0, block)
-        Hash._save_hash_block(table, column, hash_value, 0, block)
-        # print("HASH SAVED IN BUFFER")
-        return
-    
-    @staticmethod
-    def _write_hash_block_to_disk(table: str, column: str, hash_value: str, new_block_id: int):
-        # assumes entries fit in one block
-        block = Hash.buffer.get_buffer_hash(hash_value, table, 0, column)
-        if not block:
-            block = Hash._load_hash_block(table, column, hash_value, 0)
-        block.append({'id': new_block_id})
-        # assumes entries fit in one block
-        Hash._save_hash_block_to_disk(table, column, hash_value, 0, block)
-        # print("HASH SAVED IN DISK")
-        return
-    
-    @staticmethod
-    def _delete_hash_block(table: str, column: str, hash_value: int, old_block_id: int):
-        # assumes entries fit in one block
-        block = Hash.buffer.get_buffer_hash(hash_value, table, 0, column)
-        if not block:
-            Hash._load_hash_block(table, column, hash_value, 0)
-        new_block = []
-        found = False
-        for row in block:
-            if row['id'] != old_block_id or found:
-                new_block.append(row)
-            else:
-                found = True
-        # assumes entries fit in one block
-        if not new_block and hash_value != 0:
-            Hash.buffer.put_buffer_hash(hash_value, table, 0, column, None)
-            # if os.path.exists(Hash._get_hash_block_file(table, column, hash_value, old_block_id)):
-            #    os.remove(Hash._get_hash_block_file(table, column, hash_value, old_block_id))
-        else:
-            Hash.buffer.put_buffer_hash(hash_value, table, 0, column, new_block)
-            # Hash._save_hash_block(table, column, hash_value, 0, new_block)
-        # print("HASH UPDATED")
-        return
-    
-    @staticmethod
-    def _delete_hash_block_to_disk(table: str, column: str, hash_value: int, old_block_id: int):
-        # assumes entries fit in one block
-        block = Hash.buffer.get_buffer_hash(hash_value, table, 0, column)
-        if not block:
-            block = Hash._load_hash_block(table, column, hash_value, 0)
-        new_block = []
-        found = False
-        for row in block:
-            if row['id'] != old_block_id or found:
-                new_block.append(row)
+            pickle.dump(block_data, file)
+
+    @staticmethod
+    def _get_meta(table: str, column: str) -> Union[Dict, None]:
+        return Hash._get_hash_block(table, column, Hash.META, 0)
+
+    @staticmethod
+    def _bucket_count(meta: Dict) -> int:
+        return Hash.INITIAL_BUCKETS * 2 ** meta["level"] + meta["split"]
+
+    @staticmethod
+    def _get_bucket(meta: Dict, hash_value: int) -> int:
+        round_buckets = Hash.INITIAL_BUCKETS * 2 ** meta["level"]
+        bucket = hash_value % round_buckets
+        if bucket < meta["split"]:
+            bucket = hash_value % (2 * round_buckets)
+        return bucket
+
+    @staticmethod
+    def _read_chain(table: str, column: str, bucket: int) -> List[Dict]:
+        """Returns every entry of a bucket"""
+        head = Hash._get_hash_block(table, column, bucket, 0)
+        if head is None:
+            return []
+        entries = list(head["entries"])
+        for page_id in range(1, head["pages"]):
+            entries.extend(Hash._get_hash_block(table, column, bucket, page_id)["entries"])
+        return entries
+
+    @staticmethod
+    def _write_chain(table: str, column: str, bucket: int, entries: List[Dict], save: PageSaver) -> None:
+        """Replaces every entry of a bucket, emptying the pages the new chain no longer uses"""
+        head = Hash._get_hash_block(table, column, bucket, 0)
+        old_pages = head["pages"] if head is not None else 0
+        pages = -(-len(entries) // Hash.BUCKET_CAPACITY)
+        for page_id in range(max(pages, old_pages)):
+            page_entries = entries[page_id * Hash.BUCKET_CAPACITY:(page_id + 1) * Hash.BUCKET_CAPACITY]
+            save(table, column, bucket, page_id, {"pages": pages if page_id == 0 else 0, "entries": page_entries})
+
+    @staticmethod
+    def _append_entry(table: str, column: str, hash_value: Any, entry: Dict, save: PageSaver) -> None:
+        """Appends an entry to the tail page of a bucket, touching at most the head and the tail page"""
+        head = Hash._get_hash_block(table, column, hash_value, 0)
+        if head is None or head["pages"] == 0:
+            save(table, column, hash_value, 0, {"pages": 1, "entries": [entry]})
+            return
+        tail_id = head["pages"] - 1
+        tail = head if tail_id == 0 else Hash._get_hash_block(table, column, hash_value, tail_id)
+        if len(tail["entries"]) < Hash.BUCKET_CAPACITY:
+            tail["entries"].append(entry)
+            save(table, column, hash_value, tail_id, tail)
+            return
+        # tail page is full, chain a new page
+        head["pages"] += 1
+        save(table, column, hash_value, tail_id + 1, {"pages": 0, "entries": [entry]})
+        save(table, column, hash_value, 0, head)
+
+    @staticmethod
+    def _remove_entry(table: str, column: str, hash_value: Any, matches: Callable[[Dict], bool], save: PageSaver) -> bool:
+        """Removes the first entry satisfying matches. The hole is filled with the last entry of the
+        tail page, so every page but the tail stays full and the chain never has gaps
+
+        Returns:
+            bool: True if an entry was removed
+        """
+        head = Hash._get_hash_block(table, column, hash_value, 0)
+        if head is None:
+            return False
+        pages = {0: head}
+        for page_id in range(head["pages"]):
+            if page_id not in pages:
+                pages[page_id] = Hash._get_hash_block(table, column, hash_value, page_id)
+            page = pages[page_id]
+            for position, entry in enumerate(page["entries"]):
+                if matches(entry):
+                    break
             else:
-                found = True
-        # assumes entries fit in one block
-        if not new_block and hash_value != 0:
-            if os.path.exists(Hash._get_hash_block_file(table, column, hash_value, old_block_id)):
-               os.remove(Hash._get_hash_block_file(table, column, hash_value, old_block_id))
-        else:
-            Hash._save_hash_block_to_disk(table, column, hash_value, 0, new_block)
-        # print("HASH UPDATED")
-        return
+                continue
+            tail_id = head["pages"] - 1
+            if tail_id not in pages:
+                pages[tail_id] = Hash._get_hash_block(table, column, hash_value, tail_id)
+            tail = pages[tail_id]
+            last = tail["entries"].pop()
+            if page_id != tail_id or position != len(page["entries"]):
+                page["entries"][position] = last
+                save(table, column, hash_value, page_id, page)
+            if not tail["entries"] and tail_id > 0:
+                head["pages"] -= 1
+                save(table, column, hash_value, 0, head)
+            elif not tail["entries"]:
+                head["pages"] = 0
+            save(table, column, hash_value, tail_id, tail)
+            return True
+        return False
 
     @staticmethod
-    def _get_rows(table: str, column: str, value):
-        results = []
-        block_id = 0
-        hash_value = Hash._hash_function(value)
-        id_read = []
-        # assumes entries fit in one block
-        while(os.path.exists(Hash._get_hash_block_file(table, column, hash_value, block_id)) or 
-              Hash.buffer.get_buffer_hash(hash_value, table, block_id, column) is not None):
-            block = Hash.buffer.get_buffer_hash(hash_value, table, block_id, column)
-            if not block:
-                block = Hash._load_hash_block(table, column, hash_value, block_id)
-            for row in block:
-                if row['id'] not in id_read:
-                    results.extend(Hash.read_block(table, column, hash_value, row['id']))
-                    id_read.append(row['id'])
-            break # hapus ketika asumsi di atas salah
-        return results
-    
+    def _split(table: str, column: str, meta: Dict, save: PageSaver) -> None:
+        """Splits the next bucket of the round into itself and a new bucket at the end"""
+        round_buckets = Hash.INITIAL_BUCKETS * 2 ** meta["level"]
+        bucket = meta["split"]
+        entries = Hash._read_chain(table, column, bucket)
+        staying = [entry for entry in entries if entry['hash'] % (2 * round_buckets) == bucket]
+        moving = [entry for entry in entries if entry['hash'] % (2 * round_buckets) != bucket]
+        Hash._write_chain(table, column, bucket, staying, save)
+        Hash._write_chain(table, column, bucket + round_buckets, moving, save)
+        meta["split"] += 1
+        if meta["split"] == round_buckets:
+            meta["level"] += 1
+            meta["split"] = 0
+
     @staticmethod
-    def _write_row(table: str, column: str, new_block_id: int, value):
-        hash_value = Hash._hash_function(value)
-        # print("HASH", hash_value)
-        Hash._write_hash_block(table, column, hash_value, new_block_id)
-            
+    def _merge(table: str, column: str, meta: Dict, save: PageSaver) -> None:
+        """Undoes the last split, merging the last bucket back into its buddy"""
+        if meta["split"] == 0:
+            meta["level"] -= 1
+            meta["split"] = Hash.INITIAL_BUCKETS * 2 ** meta["level"]
+        meta["split"] -= 1
+        round_buckets = Hash.INITIAL_BUCKETS * 2 ** meta["level"]
+        bucket = meta["split"]
+        last_bucket = bucket + round_buckets
+        Hash._write_chain(table, column, bucket, Hash._read_chain(table, column, bucket) + Hash._read_chain(table, column, last_bucket), save)
+        Hash._write_chain(table, column, last_bucket, [], save)
+
     @staticmethod
-    def _delete_row(table: str, column: str, old_block_id: int, value):
+    def _resize(table: str, column: str, meta: Dict, save: PageSaver) -> None:
+        load = meta["size"] / (Hash._bucket_count(meta) * Hash.BUCKET_CAPACITY)
+        if load > Hash.MAX_LOAD:
+            Hash._split(table, column, meta, save)
+        elif load < Hash.MIN_LOAD and Hash._bucket_count(meta) > Hash.INITIAL_BUCKETS:
+            Hash._merge(table, column, meta, save)
+
+    @staticmethod
+    def _insert(table: str, column: str, new_block_id: int, value: Any, slot: int, save: PageSaver,
+                include: Union[Tuple, None]=None) -> None:
         hash_value = Hash._hash_function(value)
-        # print("HASH", hash_value)
-        Hash._delete_hash_block(table, column, hash_value, old_block_id)
-        
+        meta = Hash._get_meta(table, column) or Hash._new_meta()
+        entry = {'key': value, 'id': new_block_id, 'slot': slot, 'hash': hash_value}
+        if include is not None:
+            entry['include'] = include
+        Hash._append_entry(table, column, Hash._get_bucket(meta, hash_value), entry, save)
+        meta["size"] += 1
+        Hash._resize(table, column, meta, save)
+        save(table, column, Hash.META, 0, meta)
+
     @staticmethod
-    def _write_row_to_disk(table: str, column: str, new_block_id: int, value):
+    def _remove(table: str, column: str, old_block_id: int, value: Any, slot: int, save: PageSaver) -> None:
         hash_value = Hash._hash_function(value)
-        # print("HASH", hash_value)
-        Hash._write_hash_block_to_disk(table, column, hash_value, new_block_id)
-            
+        meta = Hash._get_meta(table, column)
+        if meta is None:
+            return
+        bucket = Hash._get_bucket(meta, hash_value)
+        # a (block, slot) holds one row, so it identifies the entry
+        if not Hash._remove_entry(table, column, bucket, lambda entry: entry['slot'] == slot and entry['id'] == old_block_id, save):
+            return
+        meta["size"] -= 1
+        Hash._resize(table, column, meta, save)
+        save(table, column, Hash.META, 0, meta)
+
+    @staticmethod
+    def _new_meta() -> Dict:
+        return {"version": Hash.HASH_VERSION, "level": 0, "split": 0, "size": 0}
+
     @staticmethod
-    def _delete_row_to_disk(table: str, column: str, old_block_id: int, value):
+    def _get_entries(table: str, column: str, value) -> List[Dict]:
+        """Returns the entries of every row with that value, without reading the rows"""
         hash_value = Hash._hash_function(value)
-        # print("HASH", hash_value)
-        Hash._delete_hash_block_to_disk(table, column, hash_value, old_block_id)
+        meta = Hash._get_meta(table, column)
+        if meta is None:
+            return []
+        bucket = Hash._get_bucket(meta, hash_value)
+        # entries of other values may share the bucket
+        return [entry for entry in Hash._read_chain(table, column, bucket) if entry['hash'] == hash_value and entry['key'] == value]
+
+    @staticmethod
+    def _get_rows(table: str, column: str, value):
+        results = []
+        for entry in Hash._get_entries(table, column, value):
+            row = Hash.row_reader(table, entry['id'], entry['slot'])
+            if row is not None:
+                results.append(dict(row))
+        return results
+
+    @staticmethod
+    def _write_row(table: str, column: str, new_block_id: int, value, slot: int, include: Union[Tuple, None]=None):
+        Hash._insert(table, column, new_block_id, value, slot, Hash._save_hash_block, include)
+
+    @staticmethod
+    def _delete_row(table: str, column: str, old_block_id: int, value, slot: int):
+        Hash._remove(table, column, old_block_id, value, slot, Hash._save_hash_block)
+
+    @staticmethod
+    def _write_row_to_disk(table: str, column: str, new_block_id: int, value, slot: int, include: Union[Tuple, None]=None):
+        Hash._insert(table, column, new_block_id, value, slot, Hash._save_hash_block_to_disk, include)
+
+    @staticmethod
+    def _delete_row_to_disk(table: str, column: str, old_block_id: int, value, slot: int):
+        Hash._remove(table, column, old_block_id, value, slot, Hash._save_hash_block_to_disk)
+
+    @staticmethod
+    def _bulk_build(table: str, column: str, rows: Iterable[Tuple[Any, int, int, Union[Tuple, None]]]) -> None:
+        """Builds a whole index in one pass, writing every page straight to disk exactly once.
+        The buffer is left untouched, the index must not exist yet
+
+        Args:
+            table (str): Table name
+            column (str): Index name
+            rows (Iterable[Tuple[Any, int, int, Tuple]]): (value, block_id, slot, included values or None) of every row of the table
+        """
+        hash_function = Hash._hash_function
+        keys = [(hash_function(value), value, block_id, slot, include) for value, block_id, slot, include in rows]
+        # smallest bucket count keeping the load under MAX_LOAD, as if the index grew row by row
+        buckets = max(Hash.INITIAL_BUCKETS, math.ceil(len(keys) / (Hash.BUCKET_CAPACITY * Hash.MAX_LOAD)))
+        level = (buckets // Hash.INITIAL_BUCKETS).bit_length() - 1
+        meta = Hash._new_meta()
+        meta.update(level=level, split=buckets - Hash.INITIAL_BUCKETS * 2 ** level, size=len(keys))
+
+        partitions: Dict[int, List[Tuple[int, Any, int, int, Union[Tuple, None]]]] = {}
+        for key in keys:
+            partitions.setdefault(Hash._get_bucket(meta, key[0]), []).append(key)
+        del keys
+        for bucket, bucket_keys in partitions.items():
+            entries = [{'key': value, 'id': block_id, 'slot': slot, 'hash': hash_value} for hash_value, value, block_id, slot, _ in bucket_keys]
+            for entry, key in zip(entries, bucket_keys):
+                if key[4] is not None:
+                    entry['include'] = key[4]
+            pages = -(-len(entries) // Hash.BUCKET_CAPACITY)
+            for page_id in range(pages):
+                page_entries = entries[page_id * Hash.BUCKET_CAPACITY:(page_id + 1) * Hash.BUCKET_CAPACITY]
+                Hash._save_hash_block_to_disk(table, column, bucket, page_id, {"pages": pages if page_id == 0 else 0, "entries": page_entries})
+        Hash._save_hash_block_to_disk(table, column, Hash.META, 0, meta)
 
     @staticmethod
-    def _initiate_block(table: str, column: str):
-        Hash._save_hash_block_to_disk(table, column, 0, 0, [])
-        
-    
-    
-    
+    def _drop_index(table: str, column: str, buffer: Union[Buffer, None]=None):
+        buffer = buffer if buffer is not None else Hash.buffer
+        if buffer is not None:
+            buffer.delete_buffer_where(lambda key: len(key) == 5 and key[0] == "hash" and key[2] == table and key[4] == column)
+        hash_dir = os.path.join(Hash.DATA_DIR, Hash.HASH_DIR)
+        for file in os.listdir(hash_dir):
+            if file.startswith(f"{table}__{column}__hash__"):
+                os.remove(os.path.join(hash_dir, file))
@@ -0,0 +1,227 @@
+import operator
+from itertools import repeat
+from typing import Any, Callable, Dict, List, Set, Union
+
+from StorageManager.ColumnBatch import ColumnBatch, mask_and, mask_or
+
+# Turns a WHERE clause (ConditionGroup / Condition / list of Condition) into one closure,
+# compiled once per statement and called once per row.
+#
+# NULL semantics: a condition on a missing or None value, or against a None operand, is false.
+# Ordering comparisons between incomparable types (e.g. int and str) are false instead of raising.
+
+RowPredicate = Callable[[Dict], bool]
+# Batch predicates return one byte per row of the batch, 1 for the rows satisfying the conditions
+BatchPredicate = Callable[[ColumnBatch], bytearray]
+
+OPERATORS = {
+    "=": operator.eq,
+    "<>": operator.ne,
+    ">": operator.gt,
+    ">=": operator.ge,
+    "<": operator.lt,
+    "<=": operator.le,
+}
+
+
+def _always(row: Dict) -> bool:
+    return True
+
+
+def _never(row: Dict) -> bool:
+    return False
+
+
+def _is_group(conditions: Any) -> bool:
+    return hasattr(conditions, "conditions") and hasattr(conditions, "logic_operator")
+
+
+def _compile_condition(condition: Any) -> RowPredicate:
+    if condition.operation not in OPERATORS:
+        raise ValueError(f"Invalid operation '{condition.operation}'. Use one of {list(OPERATORS)}.")
+    column = condition.column
+    operand = condition.operand
+    if operand is None:
+        return _never
+
+    if condition.operation == "=":
+        # None == operand is already false
+        def evaluate(row: Dict) -> bool:
+            return row.get(column) == operand
+        return evaluate
+
+    if condition.operation == "<>":
+        def evaluate(row: Dict) -> bool:
+            value = row.get(column)
+            return value is not None and value != operand
+        return evaluate
+
+    compare = OPERATORS[condition.operation]
+
+    def evaluate(row: Dict) -> bool:
+        value = row.get(column)
+        if value is None:
+            return False
+        try:
+            return compare(value, operand)
+        except TypeError:
+            return False
+    return evaluate
+
+
+def _compile_and(predicates: List[RowPredicate]) -> RowPredicate:
+    if not predicates:
+        return _always
+    if len(predicates) == 1:
+        return predicates[0]
+    if len(predicates) == 2:
+        first, second = predicates
+        return lambda row: first(row) and second(row)
+
+    def evaluate(row: Dict) -> bool:
+        for predicate in predicates:
+            if not predicate(row):
+                return False
+        return True
+    return evaluate
+
+
+def _compile_or(predicates: List[RowPredicate]) -> RowPredicate:
+    if not predicates:
+        return _never
+    if len(predicates) == 1:
+        return predicates[0]
+    if len(predicates) == 2:
+        first, second = predicates
+        return lambda row: first(row) or second(row)
+
+    def evaluate(row: Dict) -> bool:
+        for predicate in predicates:
+            if predicate(row):
+                return True
+        return False
+    return evaluate
+
+
+def compile_conditions(conditions: Any) -> RowPredicate:
+    """Compiles conditions into a single row predicate with short-circuit AND/OR
+
+    Args:
+        conditions (Union[ConditionGroup, Condition, List]): The conditions, a list is an implicit AND
+
+    Raises:
+        ValueError: If a logic operator or an operation is invalid
+
+    Returns:
+        Callable[[Dict], bool]: Predicate returning True for the rows satisfying the conditions
+    """
+    if conditions is None:
+        return _always
+    if isinstance(conditions, (list, tuple)):
+        return _compile_and([compile_conditions(condition) for condition in conditions])
+    if not _is_group(conditions):
+        return _compile_condition(conditions)
+    predicates = [compile_conditions(condition) for condition in conditions.conditions]
+    if conditions.logic_operator == "AND":
+        return _compile_and(predicates)
+    if conditions.logic_operator == "OR":
+        return _compile_or(predicates)
+    raise ValueError("Invalid logic_operator. Use 'AND' or 'OR'.")
+
+
+def _compile_batch_condition(condition: Any) -> BatchPredicate:
+    if condition.operation not in OPERATORS:
+        raise ValueError(f"Invalid operation '{condition.operation}'. Use one of {list(OPERATORS)}.")
+    column = condition.column
+    operand = condition.operand
+    compare = OPERATORS[condition.operation]
+    row_predicate = _compile_condition(condition)
+
+    def evaluate(batch: ColumnBatch) -> bytearray:
+        if operand is None or column not in batch.data:
+            return bytearray(len(batch))
+        try:
+            # one C level loop over the column, NULLs are masked out below
+            mask = bytearray(map(compare, batch.data[column], repeat(operand)))
+        except TypeError:
+            values = batch.values(column)
+            return bytearray(row_predicate({column: value}) for value in values)
+        validity = batch.validity.get(column)
+        return mask if validity is None else mask_and(mask, validity)
+    return evaluate
+
+
+def compile_batch_conditions(conditions: Any) -> BatchPredicate:
+    """Compiles conditions into a predicate evaluated over a whole ColumnBatch at once,
+    with the same NULL semantics as compile_conditions
+
+    Args:
+        conditions (Union[ConditionGroup, Condition, List]): The conditions, a list is an implicit AND
+
+    Raises:
+        ValueError: If a logic operator or an operation is invalid
+
+    Returns:
+        Callable[[ColumnBatch], bytearray]: Predicate returning the selection mask of a batch
+    """
+    if conditions is None:
+        return lambda batch: bytearray(b"\x01" * len(batch))
+    if isinstance(conditions, (list, tuple)):
+        predicates = [compile_batch_conditions(condition) for condition in conditions]
+        combine, empty = mask_and, b"\x01"
+    elif not _is_group(conditions):
+        return _compile_batch_condition(conditions)
+    else:
+        predicates = [compile_batch_conditions(condition) for condition in conditions.conditions]
+        if conditions.logic_operator == "AND":
+            combine, empty = mask_and, b"\x01"
+        elif conditions.logic_operator == "OR":
+            combine, empty = mask_or, b"\x00"
+        else:
+            raise ValueError("Invalid logic_operator. Use 'AND' or 'OR'.")
+
+    def evaluate(batch: ColumnBatch) -> bytearray:
+        mask = bytearray(empty * len(batch))
+        for predicate in predicates:
+            mask = combine(mask, predicate(batch))
+        return mask
+    return evaluate
+
+
+def condition_columns(conditions: Any) -> Set[str]:
+    """Returns every column the conditions read
+
+    Args:
+        conditions (Union[ConditionGroup, Condition, List]): The conditions
+
+    Returns:
+        Set[str]: The column names
+    """
+    if conditions is None:
+        return set()
+    if isinstance(conditions, (list, tuple)):
+        return set().union(*(condition_columns(condition) for condition in conditions))
+    if _is_group(conditions):
+        return condition_columns(conditions.conditions)
+    return {conditions.column}
+
+
+def conjunctive_conditions(conditions: Any) -> List[Any]:
+    """Returns the single conditions every satisfying row must meet, i.e. the conditions
+    reached from the top through AND only. Conditions under an OR are left out
+
+    Args:
+        conditions (Union[ConditionGroup, Condition, List]): The conditions, a list is an implicit AND
+
+    Returns:
+        List[Condition]: The conditions
+    """
+    if conditions is None:
+        return []
+    if isinstance(conditions, (list, tuple)):
+        return [single for condition in conditions for single in conjunctive_conditions(condition)]
+    if _is_group(conditions):
+        if conditions.logic_operator != "AND":
+            return []
+        return conjunctive_conditions(conditions.conditions)
+    return [conditions]
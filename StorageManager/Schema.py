@@ -0,0 +1,298 @@
+import ast
+import inspect
+import os
+import pickle
+import textwrap
+import typing
+from threading import Lock
+from typing import Dict, Iterable, List, Sequence, Union
+
+COLUMN_TYPES = ("int", "float", "str", "bool")
+# Joins the columns of a composite index into its name, e.g. "id+course_id"
+INDEX_SEPARATOR = "+"
+
+
+def index_name(columns: Union[str, Sequence[str]]) -> str:
+    """Returns the name of the index on a column or on a tuple of columns"""
+    if isinstance(columns, str):
+        return columns
+    return INDEX_SEPARATOR.join(columns)
+
+
+class DuplicateKeyError(ValueError):
+    """Raised when a write would give two rows of a table the same primary key"""
+
+
+class TableSchema:
+    """
+    TABLE SCHEMA
+    Column order, column types, primary key, index and Bloom filter metadata of one table.
+    An index is named after its column, or after its columns joined by INDEX_SEPARATOR for a composite index.
+    """
+
+    def __init__(self, name: str, columns: List[str], types: Union[Dict[str, Union[str, None]], None] = None,
+                 primary_key: Union[List[str], None] = None, indexes: Union[Dict[str, str], None] = None,
+                 include: Union[Dict[str, List[str]], None] = None):
+        """
+        Args:
+            name (str): Table name
+            columns (List[str]): Column names in storage order
+            types (Dict[str, str], optional): Type of each column, one of COLUMN_TYPES or None if unknown. Defaults to None.
+            primary_key (List[str], optional): Primary key columns. Defaults to None.
+            indexes (Dict[str, str], optional): Index type of each index name. Defaults to None.
+            include (Dict[str, List[str]], optional): Columns stored in the entries of each covering index. Defaults to None.
+
+        Raises:
+            ValueError: If the columns, types or primary key are invalid
+        """
+        if not columns:
+            raise ValueError(f"Table {name} must have at least one column.")
+        if len(set(columns)) != len(columns):
+            raise ValueError(f"Table {name} has duplicate columns.")
+        if any(INDEX_SEPARATOR in column for column in columns):
+            raise ValueError(f"Column names of table {name} cannot contain '{INDEX_SEPARATOR}'.")
+        types = dict(types or {})
+        for column, column_type in types.items():
+            if column not in columns:
+                raise ValueError(f"Unknown column {column} in table {name}.")
+            if column_type is not None and column_type not in COLUMN_TYPES:
+                raise ValueError(f"Invalid type {column_type} of {name}.{column}. Use one of {list(COLUMN_TYPES)}.")
+        primary_key = list(primary_key or [])
+        for column in primary_key:
+            if column not in columns:
+                raise ValueError(f"Primary key column {column} is not a column of {name}.")
+        self.name = name
+        self.columns = list(columns)
+        self.types = {column: types.get(column) for column in columns}
+        self.primary_key = primary_key
+        self.indexes = dict(indexes or {})
+        self.include = {index: list(included) for index, included in (include or {}).items()}
+        # columns with a Bloom filter per block
+        self.bloom_filters: List[str] = []
+        self._column_set = frozenset(columns)
+
+    def has_column(self, column: str) -> bool:
+        return column in self._column_set
+
+    @staticmethod
+    def index_columns(name: str) -> List[str]:
+        """Returns the columns of an index, in key order"""
+        return name.split(INDEX_SEPARATOR)
+
+    def __getstate__(self) -> Dict:
+        state = self.__dict__.copy()
+        del state["_column_set"]
+        return state
+
+    def __setstate__(self, state: Dict) -> None:
+        # registries saved before covering indexes and Bloom filters
+        state.setdefault("include", {})
+        state.setdefault("bloom_filters", [])
+        self.__dict__.update(state)
+        self._column_set = frozenset(self.columns)
+
+    @staticmethod
+    def _type_name(annotation) -> Union[str, None]:
+        """Maps an annotation such as Union[int, None] to a column type"""
+        if typing.get_origin(annotation) is Union:
+            annotations = [arg for arg in typing.get_args(annotation) if arg is not type(None)]
+            if len(annotations) != 1:
+                return None
+            annotation = annotations[0]
+        return annotation.__name__ if annotation in (int, float, str, bool) else None
+
+    @staticmethod
+    def from_class(cls: type) -> "TableSchema":
+        """Derives the schema of a model class from its __init__:
+        the assigned attributes give the columns, the annotations the types
+        and the `self.primary_key = PrimaryKey(...)` arguments the primary key
+
+        Args:
+            cls (type): Model class
+
+        Returns:
+            TableSchema: The schema
+        """
+        init_method = cls.__init__
+        tree = ast.parse(textwrap.dedent(inspect.getsource(init_method)))
+        columns = []
+        primary_key = []
+        for node in ast.walk(tree):
+            if isinstance(node, ast.Attribute) and isinstance(node.ctx, ast.Store) and node.attr != "primary_key":
+                columns.append(node.attr)
+            elif isinstance(node, ast.Assign) and any(isinstance(target, ast.Attribute) and target.attr == "primary_key" for target in node.targets):
+                if isinstance(node.value, ast.Call):
+                    primary_key = [arg.id for arg in node.value.args if isinstance(arg, ast.Name)]
+        annotations = typing.get_type_hints(init_method)
+        types = {column: TableSchema._type_name(annotations[column]) if column in annotations else None for column in columns}
+        return TableSchema(cls.__name__, columns, types, [column for column in primary_key if column in columns])
+
+
+class SchemaRegistry:
+    """
+    SCHEMA REGISTRY
+    Every table schema, built once when the storage manager starts.
+    Tables come from the model classes and from the tables created with create_table,
+    which are persisted inside DATA_DIR together with the index metadata.
+    """
+
+    SCHEMA_FILE = "schema.dat"
+
+    def __init__(self, data_dir: str, model_classes: Iterable[type] = ()):
+        """
+        Args:
+            data_dir (str): Directory where the registry is persisted
+            model_classes (Iterable[type]): Model classes describing the built-in tables
+        """
+        self._file = os.path.join(data_dir, self.SCHEMA_FILE)
+        self._tables: Dict[str, TableSchema] = {}
+        self._lock = Lock()
+
+        if os.path.exists(self._file):
+            with open(self._file, "rb") as file:
+                self._tables = pickle.load(file)
+        for cls in model_classes:
+            if cls.__name__ not in self._tables:
+                self._tables[cls.__name__] = TableSchema.from_class(cls)
+        self._relations = sorted(self._tables)
+
+    def get_relations(self) -> List[str]:
+        """Returns every table name in alphabetical order"""
+        return list(self._relations)
+
+    def has_relation(self, table: str) -> bool:
+        return table in self._tables
+
+    def get(self, table: str) -> TableSchema:
+        """Returns the schema of a table
+
+        Raises:
+            ValueError: If the table does not exist
+        """
+        schema = self._tables.get(table)
+        if schema is None:
+            raise ValueError(f"Table {table} does not exist.")
+        return schema
+
+    def create_table(self, schema: TableSchema) -> None:
+        """Registers a new table and persists the registry
+
+        Raises:
+            ValueError: If the table already exists
+        """
+        with self._lock:
+            if schema.name in self._tables:
+                raise ValueError(f"Table {schema.name} already exists.")
+            self._tables[schema.name] = schema
+            self._relations = sorted(self._tables)
+            self._save()
+
+    def exists(self) -> bool:
+        return os.path.exists(self._file)
+
+    def get_index(self, table: str, column: Union[str, Sequence[str]]) -> Union[str, None]:
+        """Returns the index type on table.column (or on a tuple of columns),
+        None if there is no such index or the table does not exist"""
+        schema = self._tables.get(table)
+        if schema is None:
+            return None
+        return schema.indexes.get(index_name(column))
+
+    def get_indexes(self, table: str) -> Dict[str, str]:
+        """Returns {index name: index type} of every index of a table. The returned dict is shared, do not modify it."""
+        schema = self._tables.get(table)
+        return schema.indexes if schema is not None else {}
+
+    def get_include(self, table: str, name: str) -> List[str]:
+        """Returns the columns stored in the entries of an index, empty if it is not a covering index"""
+        schema = self._tables.get(table)
+        return schema.include.get(name, []) if schema is not None else []
+
+    def set_index(self, table: str, column: Union[str, Sequence[str]], index_type: str,
+                  include: Union[Sequence[str], None] = None) -> str:
+        """Records an index on table.column (or on a tuple of columns) and persists the registry
+
+        Raises:
+            ValueError: If the table or a column does not exist
+
+        Returns:
+            str: Name of the index
+        """
+        schema = self.get(table)
+        columns = [column] if isinstance(column, str) else list(column)
+        include = [included for included in include or [] if included not in columns]
+        if not columns or len(set(columns)) != len(columns):
+            raise ValueError(f"Index columns of table {table} must be distinct and non-empty.")
+        for indexed in columns + include:
+            if not schema.has_column(indexed):
+                raise ValueError(f"Column {indexed} does not exist in table {table}.")
+        name = index_name(columns)
+        with self._lock:
+            schema.indexes[name] = index_type
+            if include:
+                schema.include[name] = include
+            else:
+                schema.include.pop(name, None)
+            self._save()
+        return name
+
+    def drop_index(self, table: str, column: Union[str, Sequence[str]]) -> Union[str, None]:
+        """Forgets the index on table.column (or on a tuple of columns) and persists the registry
+
+        Returns:
+            str: Type of the dropped index
+            None: If there was no such index
+        """
+        schema = self._tables.get(table)
+        name = index_name(column)
+        if schema is None or name not in schema.indexes:
+            return None
+        with self._lock:
+            index_type = schema.indexes.pop(name)
+            schema.include.pop(name, None)
+            self._save()
+        return index_type
+
+    def set_bloom_filter(self, table: str, column: str) -> bool:
+        """Records a Bloom filter on table.column and persists the registry
+
+        Raises:
+            ValueError: If the table or the column does not exist
+
+        Returns:
+            bool: False if the column already had one
+        """
+        schema = self.get(table)
+        if not schema.has_column(column):
+            raise ValueError(f"Column {column} does not exist in table {table}.")
+        if column in schema.bloom_filters:
+            return False
+        with self._lock:
+            schema.bloom_filters.append(column)
+            self._save()
+        return True
+
+    def drop_bloom_filter(self, table: str, column: str) -> bool:
+        """Forgets the Bloom filter on table.column and persists the registry
+
+        Returns:
+            bool: False if there was no such filter
+        """
+        schema = self._tables.get(table)
+        if schema is None or column not in schema.bloom_filters:
+            return False
+        with self._lock:
+            schema.bloom_filters.remove(column)
+            self._save()
+        return True
+
+    def save(self) -> None:
+        """Persists the registry"""
+        with self._lock:
+            self._save()
+
+    def _save(self) -> None:
+        temp_file = self._file + ".tmp"
+        with open(temp_file, "wb") as file:
+            pickle.dump(self._tables, file)
+        os.replace(temp_file, self._file)
@@ -0,0 +1,137 @@
+import mmap
+import os
+from threading import Lock
+from typing import Dict, List, Tuple, Union
+
+
+class SegmentFile:
+    """
+    SEGMENT FILE
+    One preallocated file holding a fixed number of pages of a table, accessed through mmap.
+    Reads are zero-copy slices of the mapping and writes update the page in place.
+    """
+
+    def __init__(self, path: str, pages: int, page_size: int):
+        """
+        Args:
+            path (str): Segment file path
+            pages (int): Number of pages in the segment
+            page_size (int): Size of a page in bytes
+        """
+        self._page_size = page_size
+        size = pages * page_size
+        self._file = open(path, "r+b" if os.path.exists(path) else "w+b")
+        if os.fstat(self._file.fileno()).st_size < size:
+            # sparse on most file systems, pages only take disk space once written
+            self._file.truncate(size)
+        self._map = mmap.mmap(self._file.fileno(), size)
+        self._view = memoryview(self._map)
+
+    def read_page(self, index: int) -> memoryview:
+        """Returns a zero-copy view of a page. Release it once decoded"""
+        return self._view[index * self._page_size:(index + 1) * self._page_size]
+
+    def write_page(self, index: int, page: bytes) -> None:
+        start = index * self._page_size
+        self._map[start:start + len(page)] = page
+
+    def flush(self) -> None:
+        self._map.flush()
+
+    def close(self) -> None:
+        self._view.release()
+        self._map.close()
+        self._file.close()
+
+
+class SegmentStore:
+    """
+    SEGMENT STORE
+    Storage mode in which each table lives in a few segment files
+    `{table}__segment__{segment_id}.seg` instead of one file per block.
+    Block `block_id` is page `block_id % SEGMENT_PAGES` of segment `block_id // SEGMENT_PAGES`.
+    A page whose header does not carry the page magic is an empty (deleted) block.
+    """
+
+    SEGMENT_PAGES = 256
+
+    def __init__(self, data_dir: str, page_size: int, magic: bytes):
+        """
+        Args:
+            data_dir (str): Directory of the segment files
+            page_size (int): Size of a page in bytes
+            magic (bytes): Leading bytes of every live page
+        """
+        self._data_dir = data_dir
+        self._page_size = page_size
+        self._magic = magic
+        self._segments: Dict[Tuple[str, int], SegmentFile] = {}
+        self._lock = Lock()
+
+    def _get_segment_file(self, table: str, segment_id: int) -> str:
+        return os.path.join(self._data_dir, f"{table}__segment__{segment_id}.seg")
+
+    def _get_segment(self, table: str, block_id: int, create: bool) -> Tuple[Union[SegmentFile, None], int]:
+        segment_id, index = divmod(block_id, self.SEGMENT_PAGES)
+        segment = self._segments.get((table, segment_id))
+        if segment is None:
+            with self._lock:
+                segment = self._segments.get((table, segment_id))
+                if segment is None:
+                    path = self._get_segment_file(table, segment_id)
+                    if not create and not os.path.exists(path):
+                        return None, index
+                    segment = SegmentFile(path, self.SEGMENT_PAGES, self._page_size)
+                    self._segments[(table, segment_id)] = segment
+        return segment, index
+
+    def read_page(self, table: str, block_id: int) -> Union[memoryview, None]:
+        """Returns a zero-copy view of a block, None if the block is empty or was never written"""
+        segment, index = self._get_segment(table, block_id, create=False)
+        if segment is None:
+            return None
+        page = segment.read_page(index)
+        if bytes(page[:len(self._magic)]) != self._magic:
+            page.release()
+            return None
+        return page
+
+    def has_page(self, table: str, block_id: int) -> bool:
+        page = self.read_page(table, block_id)
+        if page is None:
+            return False
+        page.release()
+        return True
+
+    def write_page(self, table: str, block_id: int, page: bytes) -> None:
+        segment, index = self._get_segment(table, block_id, create=True)
+        segment.write_page(index, page)
+
+    def delete_page(self, table: str, block_id: int) -> None:
+        segment, index = self._get_segment(table, block_id, create=False)
+        if segment is not None:
+            segment.write_page(index, bytes(len(self._magic)))
+
+    def stored_blocks(self) -> List[Tuple[str, int]]:
+        """Lists every live block of every segment file, used to rebuild the block catalog"""
+        blocks = []
+        for file in os.listdir(self._data_dir):
+            if not file.endswith(".seg") or "__segment__" not in file:
+                continue
+            table, segment_id = file[: -len(".seg")].split("__segment__")
+            first_block = int(segment_id) * self.SEGMENT_PAGES
+            for block_id in range(first_block, first_block + self.SEGMENT_PAGES):
+                if self.has_page(table, block_id):
+                    blocks.append((table, block_id))
+        return blocks
+
+    def flush(self) -> None:
+        """Forces the written pages of every segment to disk"""
+        for segment in list(self._segments.values()):
+            segment.flush()
+
+    def close(self) -> None:
+        with self._lock:
+            for segment in self._segments.values():
+                segment.close()
+            self._segments.clear()
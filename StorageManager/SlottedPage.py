@@ -0,0 +1,238 @@
+import pickle
+import struct
+from typing import Any, Dict, Iterable, List, Tuple, Union
+
+
+class SlottedPage:
+    """
+    SLOTTED PAGE
+    On-disk format of a data block, exactly PAGE_SIZE bytes:
+
+        header    | magic (2s) | version (B) | unused (B) | slot count (H) | record area start (H)
+        slots     | (offset (H), length (H)) per slot, growing forward after the header
+        free      |
+        records   | packed backwards from the end of the page
+
+    A record stores no column names, the column order comes from the table schema:
+
+        field offsets | (n_columns + 1) * H, relative to the record start
+        fields        | tag (B) followed by the encoded value
+
+    The offset table lets a single field (or a single slot) be decoded without touching the rest of the page.
+    A slot with length 0 is empty: deleting a row leaves its slot empty so the slots of the other rows,
+    which indexes point to, never change. In memory an empty slot is a None row.
+    """
+
+    PAGE_SIZE = 4096
+    MAGIC = b"MP"
+    VERSION = 1
+
+    HEADER = struct.Struct("<2sBBHH")
+    SLOT = struct.Struct("<HH")
+    OFFSET = struct.Struct("<H")
+    INT = struct.Struct("<q")
+    FLOAT = struct.Struct("<d")
+
+    HEADER_SIZE = HEADER.size
+    SLOT_SIZE = SLOT.size
+    # Space available for slots and records in an empty page
+    CAPACITY = PAGE_SIZE - HEADER_SIZE
+
+    TAG_NONE = 0
+    TAG_INT = 1
+    TAG_FLOAT = 2
+    TAG_STR = 3
+    TAG_BOOL = 4
+    TAG_BIGINT = 5
+    TAG_PICKLE = 6
+
+    @staticmethod
+    def _encode_value(value: Any) -> bytes:
+        if value is None:
+            return bytes((SlottedPage.TAG_NONE,))
+        if isinstance(value, bool):
+            return bytes((SlottedPage.TAG_BOOL, value))
+        if isinstance(value, int):
+            if -(2**63) <= value < 2**63:
+                return bytes((SlottedPage.TAG_INT,)) + SlottedPage.INT.pack(value)
+            return bytes((SlottedPage.TAG_BIGINT,)) + str(value).encode("ascii")
+        if isinstance(value, float):
+            return bytes((SlottedPage.TAG_FLOAT,)) + SlottedPage.FLOAT.pack(value)
+        if isinstance(value, str):
+            return bytes((SlottedPage.TAG_STR,)) + value.encode("utf-8")
+        return bytes((SlottedPage.TAG_PICKLE,)) + pickle.dumps(value)
+
+    @staticmethod
+    def _decode_value(data: Union[bytes, memoryview], start: int, end: int) -> Any:
+        tag = data[start]
+        if tag == SlottedPage.TAG_NONE:
+            return None
+        if tag == SlottedPage.TAG_INT:
+            return SlottedPage.INT.unpack_from(data, start + 1)[0]
+        if tag == SlottedPage.TAG_STR:
+            return bytes(data[start + 1:end]).decode("utf-8")
+        if tag == SlottedPage.TAG_FLOAT:
+            return SlottedPage.FLOAT.unpack_from(data, start + 1)[0]
+        if tag == SlottedPage.TAG_BOOL:
+            return bool(data[start + 1])
+        if tag == SlottedPage.TAG_BIGINT:
+            return int(bytes(data[start + 1:end]).decode("ascii"))
+        return pickle.loads(data[start + 1:end])
+
+    @staticmethod
+    def encode_record(columns: List[str], row: Dict) -> bytes:
+        """Encodes a row in schema column order
+
+        Args:
+            columns (List[str]): Column order of the table
+            row (Dict): The row
+
+        Raises:
+            ValueError: If the row has a column that is not in the schema
+
+        Returns:
+            bytes: The encoded record
+        """
+        unknown = [column for column in row if column not in columns]
+        if unknown:
+            raise ValueError(f"Unknown column(s) {unknown}")
+        fields = [SlottedPage._encode_value(row.get(column)) for column in columns]
+        offset = SlottedPage.OFFSET.size * (len(fields) + 1)
+        offsets = []
+        for field in fields:
+            offsets.append(offset)
+            offset += len(field)
+        offsets.append(offset)
+        return struct.pack(f"<{len(offsets)}H", *offsets) + b"".join(fields)
+
+    @staticmethod
+    def decode_record(columns: List[str], data: Union[bytes, memoryview], start: int = 0,
+                      wanted: Union[Iterable[str], None] = None) -> Dict:
+        """Decodes a record, optionally only some of its columns
+
+        Args:
+            columns (List[str]): Column order of the table
+            data (bytes): Buffer holding the record
+            start (int): Position of the record in data
+            wanted (Iterable[str], optional): Columns to decode. Defaults to every column.
+
+        Returns:
+            Dict: The (partial) row
+        """
+        return SlottedPage._decode_fields(data, start, struct.Struct(f"<{len(columns) + 1}H"),
+                                         SlottedPage._positions(columns, wanted))
+
+    @staticmethod
+    def _positions(columns: List[str], wanted: Union[Iterable[str], None]) -> List[Tuple[int, str]]:
+        """Returns the (field index, column) pairs to decode"""
+        if wanted is None:
+            return list(enumerate(columns))
+        wanted = set(wanted)
+        return [(i, column) for i, column in enumerate(columns) if column in wanted]
+
+    @staticmethod
+    def _decode_fields(data: Union[bytes, memoryview], start: int, offsets_struct: struct.Struct,
+                       positions: List[Tuple[int, str]]) -> Dict:
+        offsets = offsets_struct.unpack_from(data, start)
+        decode_value = SlottedPage._decode_value
+        return {column: decode_value(data, start + offsets[i], start + offsets[i + 1]) for i, column in positions}
+
+    @staticmethod
+    def record_size(columns: List[str], row: Dict) -> int:
+        """Returns the number of bytes a row takes in a page, slot included"""
+        return len(SlottedPage.encode_record(columns, row)) + SlottedPage.SLOT_SIZE
+
+    @staticmethod
+    def used_space(columns: List[str], rows: List[Union[Dict, None]]) -> int:
+        """Returns the number of bytes the rows take in a page, slots included"""
+        return sum(SlottedPage.record_size(columns, row) if row is not None else SlottedPage.SLOT_SIZE for row in rows)
+
+    @staticmethod
+    def is_page(data: Union[bytes, memoryview]) -> bool:
+        return len(data) >= SlottedPage.HEADER_SIZE and bytes(data[:2]) == SlottedPage.MAGIC
+
+    @staticmethod
+    def pack(columns: List[str], rows: List[Dict]) -> bytes:
+        """Builds a page holding the rows
+
+        Args:
+            columns (List[str]): Column order of the table
+            rows (List[Dict]): Rows of the block, None for an empty slot
+
+        Raises:
+            ValueError: If the rows do not fit in one page
+
+        Returns:
+            bytes: The page, exactly PAGE_SIZE bytes
+        """
+        page = bytearray(SlottedPage.PAGE_SIZE)
+        end = SlottedPage.PAGE_SIZE
+        for slot, row in enumerate(rows):
+            slot_position = SlottedPage.HEADER_SIZE + slot * SlottedPage.SLOT_SIZE
+            if row is None:
+                if end < slot_position + SlottedPage.SLOT_SIZE:
+                    raise ValueError(f"Rows do not fit in a {SlottedPage.PAGE_SIZE} bytes block")
+                SlottedPage.SLOT.pack_into(page, slot_position, 0, 0)
+                continue
+            record = SlottedPage.encode_record(columns, row)
+            end -= len(record)
+            if end < slot_position + SlottedPage.SLOT_SIZE:
+                raise ValueError(f"Rows do not fit in a {SlottedPage.PAGE_SIZE} bytes block")
+            page[end:end + len(record)] = record
+            SlottedPage.SLOT.pack_into(page, slot_position, end, len(record))
+        SlottedPage.HEADER.pack_into(page, 0, SlottedPage.MAGIC, SlottedPage.VERSION, 0, len(rows), end)
+        return bytes(page)
+
+    @staticmethod
+    def slot_count(page: Union[bytes, memoryview]) -> int:
+        return SlottedPage.HEADER.unpack_from(page, 0)[3]
+
+    @staticmethod
+    def free_space(page: Union[bytes, memoryview]) -> int:
+        """Returns the number of unused bytes between the slot directory and the records"""
+        _, _, _, slot_count, record_start = SlottedPage.HEADER.unpack_from(page, 0)
+        return record_start - SlottedPage.HEADER_SIZE - slot_count * SlottedPage.SLOT_SIZE
+
+    @staticmethod
+    def read_slot(columns: List[str], page: Union[bytes, memoryview], slot: int,
+                  wanted: Union[Iterable[str], None] = None) -> Union[Dict, None]:
+        """Decodes the record of one slot without decoding the rest of the page
+
+        Args:
+            columns (List[str]): Column order of the table
+            page (bytes): The page
+            slot (int): Slot number
+            wanted (Iterable[str], optional): Columns to decode. Defaults to every column.
+
+        Returns:
+            Dict: The row
+            None: If the slot does not exist or is empty
+        """
+        if slot >= SlottedPage.slot_count(page):
+            return None
+        offset, length = SlottedPage.SLOT.unpack_from(page, SlottedPage.HEADER_SIZE + slot * SlottedPage.SLOT_SIZE)
+        if length == 0:
+            return None
+        return SlottedPage.decode_record(columns, page, offset, wanted)
+
+    @staticmethod
+    def unpack(columns: List[str], page: Union[bytes, memoryview],
+               wanted: Union[Iterable[str], None] = None) -> List[Union[Dict, None]]:
+        """Decodes every slot of a page
+
+        Args:
+            columns (List[str]): Column order of the table
+            page (bytes): The page
+            wanted (Iterable[str], optional): Columns to decode. Defaults to every column.
+
+        Returns:
+            List[Dict]: Rows of the page in slot order, None for an empty slot
+        """
+        # resolved once per page, only the wanted fields of each record are decoded
+        offsets_struct = struct.Struct(f"<{len(columns) + 1}H")
+        positions = SlottedPage._positions(columns, wanted)
+        rows = []
+        for slot in range(SlottedPage.slot_count(page)):
+            offset, length = SlottedPage.SLOT.unpack_from(page, SlottedPage.HEADER_SIZE + slot * SlottedPage.SLOT_SIZE)
+            rows.append(SlottedPage._decode_fields(page, offset, offsets_struct, positions) if length else None)
+        return rows
@@ -3,10 +3,19 @@ import unittest
 # import os
 # import sys
 # sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+import os
 import shutil
 from StorageManager.classes import Statistic, StorageManager, DataWrite, DataRetrieval, DataDeletion, Condition, ConditionGroup
+from StorageManager.BlockCatalog import BlockCatalog
+from StorageManager.BloomFilter import BloomFilter
+from StorageManager.BPlusTree import BPlusTree
 from StorageManager.HashIndex import Hash
+from StorageManager.ColumnBatch import ColumnBatch
+from StorageManager.Predicate import compile_batch_conditions, compile_conditions
+from StorageManager.Schema import DuplicateKeyError
+from StorageManager.SlottedPage import SlottedPage
 from FailureRecoveryManager.Buffer import Buffer
+from QueryProcessor.JoinProcessor import JoinCondition, JoinProcessor
 
 class TestStorageManager(unittest.TestCase):
     def setUp(self):
@@ -89,6 +98,172 @@ class TestStorageManager(unittest.TestCase):
         self.assertEqual(len(retrieved), 0)
     
 
+    def test_scan(self):
+        """
+        Test streaming scan
+        1. Verify rows and batches are yielded lazily
+        2. Verify a pipelined hash join over a scan
+        """
+        for student_id in range(3, 8):
+            self.manager.write_block(DataWrite("Student", ["id", "name"], [student_id, f"Student {student_id}"], "row"))
+        retrieval = DataRetrieval("Student", ["id"], ConditionGroup([Condition("id", ">", 1)]), "sequential", "row")
+        rows = self.manager.scan(retrieval)
+        self.assertEqual(next(rows), {"id": 2})
+        self.assertEqual(next(rows), {"id": 3})
+        rows.close()
+        batches = list(self.manager.scan(retrieval, batch_size=4))
+        self.assertEqual([len(batch) for batch in batches], [4, 2])
+        self.assertEqual(self.manager.read_block(retrieval), [row for batch in batches for row in batch])
+        with self.assertRaises(ValueError):
+            next(self.manager.scan(retrieval, batch_size=0))
+
+        departments = [{"dept_name": "Mathematics", "building": "Taylor"}]
+        students = self.manager.scan(DataRetrieval("Student", ["name", "dept_name"], ConditionGroup([Condition("dept_name", "<>", "Physics")]), "sequential", "row"))
+        joined = JoinProcessor().iter_join_on_hash(students, departments, JoinCondition("dept_name", "=", "dept_name"))
+        self.assertEqual(list(joined), [{"name": "Bob", "dept_name": "Mathematics", "building": "Taylor"}])
+
+    def test_column_batch(self):
+        """
+        Test columnar batches
+        1. Verify typed columns, validity masks and the round trip to rows
+        2. Verify batch scans filter like read_block and feed a batch hash join
+        """
+        rows = [{"id": 1, "name": "Alice", "tot_cred": None}, {"id": 2, "name": None, "tot_cred": 3.5}]
+        batch = ColumnBatch.from_rows(["id", "name", "tot_cred"], rows)
+        self.assertEqual(batch.column("id").typecode, "q")
+        self.assertEqual(batch.column("tot_cred").typecode, "d")
+        self.assertIsNone(batch.get("tot_cred", 0))
+        self.assertEqual(batch.to_rows(), rows)
+        self.assertEqual(compile_batch_conditions(Condition("tot_cred", "<", 5))(batch), bytearray([0, 1]))
+        self.assertEqual(compile_batch_conditions(ConditionGroup([Condition("name", ">", "A"), Condition("id", "=", 2)], "OR"))(batch), bytearray([1, 1]))
+
+        for student_id in range(3, 8):
+            self.manager.write_block(DataWrite("Student", ["id", "name", "dept_name"], [student_id, f"Student {student_id}", "Physics"], "row"))
+        retrieval = DataRetrieval("Student", ["name", "dept_name"], ConditionGroup([Condition("id", ">=", 2), Condition("id", "<>", 5)]), "sequential", "row")
+        batches = list(self.manager.scan_batches(retrieval))
+        self.assertEqual([row for batch in batches for row in batch.to_rows()], self.manager.read_block(retrieval))
+
+        departments = ColumnBatch.from_rows(["dept_name", "building"], [{"dept_name": "Physics", "building": "Watson"}, {"dept_name": None, "building": "Taylor"}])
+        joined = JoinProcessor().iter_join_batches_on_hash(batches, [departments], JoinCondition("dept_name", "=", "dept_name"))
+        self.assertEqual([row["building"] for batch in joined for row in batch.to_rows()], ["Watson"] * 4)
+
+    def test_block_catalog(self):
+        """
+        Test block catalog persistence
+        1. Flush the buffered blocks to disk
+        2. Verify a fresh manager finds the blocks through the persisted catalog
+        """
+        for block_id in self.manager.block_catalog.get_blocks("Student"):
+            self.manager.write_block_to_disk("Student", block_id, self.manager.buffer.get_buffer("Student", block_id))
+        self.manager.flush_metadata()
+
+        fresh_manager = StorageManager(Buffer(10))
+        self.assertEqual(fresh_manager.block_catalog.get_blocks("Student"), [0])
+        self.assertEqual(fresh_manager.block_catalog.get_fill("Student", 0), 2)
+        retrieved = fresh_manager.read_block(DataRetrieval("Student", ["name"], ConditionGroup([Condition("id", ">", 0)]), "sequential", "row"))
+        self.assertEqual([row["name"] for row in retrieved], ["Alice", "Bob"])
+
+    def test_free_space_map(self):
+        """
+        Test free space map maintenance
+        1. Verify inserts and deletes update the free space of the block
+        2. Verify the insert after a delete reuses the freed block
+        """
+        free_space_map = self.manager.free_space_map
+        columns = self.manager.get_all_attributes("Student")
+        block = self.manager.buffer.get_buffer("Student", 0)
+        self.assertEqual(free_space_map.get_free("Student", 0), SlottedPage.CAPACITY - SlottedPage.used_space(columns, block))
+        self.manager.delete_block(DataDeletion("Student", ConditionGroup([Condition("id", "=", 1)]), "row"))
+        block = self.manager.buffer.get_buffer("Student", 0)
+        self.assertEqual(free_space_map.get_free("Student", 0), SlottedPage.CAPACITY - SlottedPage.used_space(columns, block))
+        self.assertEqual(free_space_map.find_block("Student"), 0)
+        self.assertIsNone(free_space_map.find_block("Course"))
+
+        self.manager.write_block(DataWrite("Student", ["id", "name"], [3, "Yusuf"], "row"))
+        self.assertEqual(self.manager.block_catalog.get_blocks("Student"), [0])
+        self.assertEqual(len(self.manager.buffer.get_buffer("Student", 0)), 2)
+
+    def test_projection_pushdown(self):
+        """
+        Test projection pushdown on blocks read from disk
+        1. Verify only the wanted columns are decoded
+        2. Verify read_block still filters on columns it does not return
+        """
+        self.manager.write_block_to_disk("Student", 0, self.manager.buffer.get_buffer("Student", 0))
+        fresh_manager = StorageManager(Buffer(10))
+        self.assertEqual(fresh_manager._load_block("Student", 0, {"name"}), [{"name": "Alice"}, {"name": "Bob"}])
+        retrieved = fresh_manager.read_block(DataRetrieval("Student", ["name"], ConditionGroup([Condition("dept_name", "=", "Mathematics")]), "sequential", "row"))
+        self.assertEqual(retrieved, [{"name": "Bob"}])
+
+    def test_segment_storage(self):
+        """
+        Test segment storage mode
+        1. Write blocks through a segment mode manager
+        2. Verify the blocks live in a segment file and can be read back, even without the catalog
+        """
+        shutil.rmtree(self.test_data_dir)
+        manager = StorageManager(Buffer(10), storage_mode="segment")
+        for student_id in range(1, 4):
+            manager.write_block(DataWrite("Student", ["id", "name"], [student_id, f"Student {student_id}"], "row"))
+        manager.write_block_to_disk("Student", 0, manager.buffer.get_buffer("Student", 0))
+        manager.close()
+
+        self.assertTrue(os.path.exists(os.path.join(self.test_data_dir, "Student__segment__0.seg")))
+        self.assertFalse(os.path.exists(os.path.join(self.test_data_dir, "Student__block__0.blk")))
+        os.remove(os.path.join(self.test_data_dir, BlockCatalog.CATALOG_FILE))
+
+        fresh_manager = StorageManager(Buffer(10), storage_mode="segment")
+        retrieved = fresh_manager.read_block(DataRetrieval("Student", ["id"], ConditionGroup([Condition("id", ">=", 2)]), "sequential", "row"))
+        self.assertEqual([row["id"] for row in retrieved], [2, 3])
+        fresh_manager.delete_block_to_disk("Student", 0)
+        self.assertEqual(fresh_manager.block_catalog.get_blocks("Student"), [])
+        fresh_manager.close()
+
+    def test_slotted_page(self):
+        """
+        Test slotted page format
+        1. Pack a block into a page and verify its size and round trip
+        2. Verify a single slot and a single column can be decoded
+        """
+        columns = self.manager.get_all_attributes("Student")
+        rows = [
+            {"id": 1, "name": "Alice", "dept_name": "Computer Science", "tot_cred": None},
+            {"id": 2**70, "name": "Bob", "dept_name": None, "tot_cred": 3.5},
+        ]
+        page = SlottedPage.pack(columns, rows)
+        self.assertEqual(len(page), self.manager.BLOCK_SIZE)
+        self.assertEqual(SlottedPage.unpack(columns, page), rows)
+        self.assertEqual(SlottedPage.read_slot(columns, page, 1), rows[1])
+        self.assertEqual(SlottedPage.read_slot(columns, page, 0, ["name"]), {"name": "Alice"})
+        self.assertIsNone(SlottedPage.read_slot(columns, page, 2))
+        self.assertEqual(SlottedPage.free_space(page), SlottedPage.CAPACITY - SlottedPage.used_space(columns, rows))
+        with self.assertRaises(ValueError):
+            SlottedPage.pack(columns, [{"id": 1, "name": "x" * self.manager.BLOCK_SIZE}])
+
+    def test_compiled_conditions(self):
+        """
+        Test predicate compilation
+        1. Verify AND/OR nesting and implicit AND lists
+        2. Verify NULL and mixed type comparisons are false instead of raising
+        """
+        alice = {"id": 1, "name": "Alice", "dept_name": None, "tot_cred": 10}
+        predicate = compile_conditions(ConditionGroup([
+            Condition("id", ">", 0),
+            ConditionGroup([Condition("name", "=", "Bob"), Condition("tot_cred", ">=", 10)], "OR"),
+        ]))
+        self.assertTrue(predicate(alice))
+        self.assertFalse(predicate({**alice, "tot_cred": 9}))
+        self.assertTrue(compile_conditions([Condition("id", "=", 1), Condition("name", "<>", "Bob")])(alice))
+        self.assertFalse(compile_conditions(Condition("dept_name", "<>", "Physics"))(alice))
+        self.assertFalse(compile_conditions(Condition("name", ">", 5))(alice))
+        self.assertTrue(compile_conditions(ConditionGroup([]))(alice))
+        with self.assertRaises(ValueError):
+            compile_conditions(ConditionGroup([Condition("id", "=", 1)], "XOR"))
+
+        # recovery passes plain lists of conditions
+        removed = self.manager.delete_block(DataDeletion("Student", [Condition("id", "=", 2), Condition("name", "=", "Bob")], "row"))
+        self.assertEqual(removed, 1)
+
     def test_schema(self):
         all_relation = self.manager.get_all_relations()
         self.assertEqual(['Advisor', 'Classroom', 'Course', 'Department', 'Instructor', 'Prerequisite', 'Section', 'Student', 'Takes', 'Teaches', 'TimeSlot'], all_relation)
@@ -109,17 +284,214 @@ class TestStorageManager(unittest.TestCase):
             with self.subTest(relation=relation):
                 self.assertEqual(attributes, self.manager.get_all_attributes(relation))
 
+    def test_create_table(self):
+        """
+        Test schema registry
+        1. Verify the types and primary key derived from a model class
+        2. Create a table without a model class, verify it persists and stores rows
+        """
+        student = self.manager.get_schema("Student")
+        self.assertEqual(student.types, {"id": "int", "name": "str", "dept_name": "str", "tot_cred": "int"})
+        self.assertEqual(self.manager.get_schema("Takes").primary_key, ["id", "course_id", "sec_id", "semester", "year"])
+
+        self.manager.create_table("Club", ["club_id", "name", "budget"], {"club_id": "int", "budget": "float"}, ["club_id"])
+        with self.assertRaises(ValueError):
+            self.manager.create_table("Club", ["club_id"])
+        with self.assertRaises(ValueError):
+            self.manager.create_table("Member", ["id", "id"])
+        self.manager.write_block(DataWrite("Club", ["club_id", "name"], [1, "Chess"], "row"))
+
+        fresh_manager = StorageManager(Buffer(10))
+        self.assertIn("Club", fresh_manager.get_all_relations())
+        self.assertEqual(fresh_manager.get_all_attributes("Club"), ["club_id", "name", "budget"])
+        self.assertTrue(fresh_manager.has_attribute("budget", "Club"))
+        self.assertFalse(fresh_manager.has_attribute("budget", "Student"))
+        self.assertEqual(self.manager.read_block(DataRetrieval("Club", ["name", "budget"], ConditionGroup([]), "sequential", "row")), [{"name": "Chess", "budget": None}])
+
     def test_index(self):
         # Contoh set_index dan get_index
         self.manager.set_index("Student", "name", 'hash')
         self.manager.set_index("Department", "building", 'hash')
         self.assertEqual(self.manager.get_index("Student", "name"), 'hash')
         self.assertEqual(self.manager.get_index("Department", "building"), 'hash')
+        self.assertIsNone(self.manager.get_index("Student", "dept_name"))
+
+    def test_drop_index(self):
+        """
+        Test index catalog
+        1. Verify a fresh manager knows the indexes without scanning the hash files
+        2. Drop an index, verify its files are gone and writes no longer maintain it
+        """
+        self.manager.set_index("Student", "name", "hash")
+        self.assertTrue(StorageManager(Buffer(10)).has_index("name", "Student"))
+        hash_dir = os.path.join(self.test_data_dir, self.test_hash_dir)
+        for key, block in self.manager.buffer.get_buffer_values().items():
+            if key[0] == "hash":
+                self.manager.write_hash_block_to_disk(key[2], key[4], key[1], key[3], block)
+        self.assertTrue(any(file.startswith("Student__name__hash") for file in os.listdir(hash_dir)))
+
+        self.assertTrue(self.manager.drop_index("Student", "name"))
+        self.assertFalse(self.manager.drop_index("Student", "name"))
+        self.assertFalse(self.manager.has_index("name", "Student"))
+        self.assertFalse(StorageManager(Buffer(10)).has_index("name", "Student"))
+        self.assertFalse(any(file.startswith("Student__name__hash") for file in os.listdir(hash_dir)))
+        self.assertFalse(any(key[0] == "hash" and key[4] == "name" for key in self.manager.buffer.get_buffer_values()))
+        self.manager.write_block(DataWrite("Student", ["id", "name"], [3, "Yusuf"], "row"))
+        self.assertFalse(any(key[0] == "hash" and key[4] == "name" for key in self.manager.buffer.get_buffer_values()))
+        # the primary key index stays
+        self.assertRaises(ValueError, self.manager.drop_index, "Student", "id")
+
+    def test_drop_index_pending_pages(self):
+        """
+        Test dropping an index whose dirty pages were evicted and wait for their write back
+        1. Update indexed rows, then evict the index pages with inserts into another table
+        2. Drop the index, update the rows again and re-create it, verify no stale page is read
+        """
+        manager = StorageManager(Buffer(20))
+        for student_id in range(3, 601):
+            manager.write_block(DataWrite("Student", ["id", "name", "dept_name"], [student_id, f"Student {student_id}", f"d{student_id % 10}"], "row"))
+        manager.set_index("Student", "dept_name", "hash")
+        manager.write_block(DataWrite("Student", ["dept_name"], ["X"], "row", conditions=ConditionGroup([Condition("id", "<=", 60)])))
+        for course_id in range(1, 2001):
+            manager.write_block(DataWrite("Course", ["course_id", "title"], [f"c{course_id}", "x" * 40], "row"))
+        is_index_page = lambda key: key[0] == "hash" and key[4] == "dept_name"
+        self.assertTrue(any(is_index_page(key) for shard in manager.buffer._shards for key in shard.pending))
+
+        manager.drop_index("Student", "dept_name")
+        self.assertFalse(any(is_index_page(key) for shard in manager.buffer._shards for key in shard.pending))
+        manager.write_block(DataWrite("Student", ["dept_name"], ["Y"], "row", conditions=ConditionGroup([Condition("dept_name", "=", "X")])))
+        manager.set_index("Student", "dept_name", "hash")
+        self.assertEqual(manager.read_block_with_hash("Student", "dept_name", "X"), [])
+        for dept in ("Y", "d1"):
+            scanned = manager.read_block(DataRetrieval("Student", ["id", "name", "dept_name", "tot_cred"], ConditionGroup([Condition("dept_name", "=", dept)]), "sequential", "row"))
+            self.assertEqual(sorted(row["id"] for row in manager.read_block_with_hash("Student", "dept_name", dept)), sorted(row["id"] for row in scanned))
+
+    def test_primary_key(self):
+        """
+        Test primary key uniqueness
+        1. Insert and update rows to an existing key, verify they are rejected without changing anything
+        2. Write the buffer to disk, verify a fresh manager still rejects duplicates and accepts freed keys
+        """
+        self.assertEqual(self.manager.get_index("Student", "id"), "hash")
+        self.assertEqual(self.manager.get_index("Takes", ["id", "course_id", "sec_id", "semester", "year"]), "hash")
+        with self.assertRaises(DuplicateKeyError):
+            self.manager.write_block(DataWrite("Student", ["id", "name"], [1, "Alicia"], "row"))
+        with self.assertRaises(DuplicateKeyError):
+            self.manager.write_block(DataWrite("Student", ["id"], [2], "row", conditions=ConditionGroup([Condition("id", "=", 1)])))
+        with self.assertRaises(DuplicateKeyError):
+            self.manager.write_block(DataWrite("Student", ["id"], [5], "row", conditions=ConditionGroup([])))
+        all_students = DataRetrieval("Student", ["id", "name"], ConditionGroup([]), "sequential", "row")
+        self.assertEqual(self.manager.read_block(all_students), [{"id": 1, "name": "Alice"}, {"id": 2, "name": "Bob"}])
+        self.assertEqual(self.manager.write_block(DataWrite("Student", ["id"], [3], "row", conditions=ConditionGroup([Condition("id", "=", 2)]))), 1)
+
+        takes = ["id", "course_id", "sec_id", "semester", "year"]
+        self.manager.write_block(DataWrite("Takes", takes, [1, 101, "1", 1, 2024], "row"))
+        self.manager.write_block(DataWrite("Takes", takes, [1, 101, "1", 2, 2024], "row"))
+        with self.assertRaises(DuplicateKeyError):
+            self.manager.write_block(DataWrite("Takes", takes, [1, 101, "1", 1, 2024], "row"))
+
+        for key, block in self.manager.buffer.get_buffer_values().items():
+            if key[0] == "hash":
+                self.manager.write_hash_block_to_disk(key[2], key[4], key[1], key[3], block)
+            elif len(key) == 2:
+                self.manager.write_block_to_disk(key[0], key[1], block)
+        self.manager.flush_metadata()
+        fresh_manager = StorageManager(Buffer(10))
+        with self.assertRaises(DuplicateKeyError):
+            fresh_manager.write_block(DataWrite("Student", ["id", "name"], [3, "Bobby"], "row"))
+        fresh_manager.write_block(DataWrite("Student", ["id", "name"], [2, "Bobby"], "row"))
+        fresh_manager.delete_block(DataDeletion("Student", ConditionGroup([Condition("id", "=", 1)]), "row"))
+        fresh_manager.write_block(DataWrite("Student", ["id", "name"], [1, "Alicia"], "row"))
+        self.assertEqual(sorted(row["id"] for row in fresh_manager.read_block(all_students)), [1, 2, 3])
+
+    def test_write_unknown_column(self):
+        """
+        Test writes naming a column that is not in the schema
+        1. Insert and update with an unknown column, verify they are rejected
+        2. Verify the buffered rows are unchanged and the block can still be written to disk
+        """
+        with self.assertRaises(ValueError):
+            self.manager.write_block(DataWrite("Student", ["id", "foo"], [3, 5], "row"))
+        with self.assertRaises(ValueError):
+            self.manager.write_block(DataWrite("Student", ["foo"], [5], "row", conditions=ConditionGroup([Condition("id", "=", 1)])))
+        block = self.manager.buffer.get_buffer("Student", 0)
+        self.assertEqual(block[0], {"id": 1, "name": "Alice", "dept_name": "Computer Science", "tot_cred": None})
+        self.manager.write_block_to_disk("Student", 0, block)
+        self.assertEqual(len(self.manager.read_block(DataRetrieval("Student", ["id"], ConditionGroup([]), "sequential", "row"))), 2)
+
+    def test_update_too_large(self):
+        """
+        Test an update making a row larger than a block
+        1. Update a row past the block size, verify it is rejected
+        2. Verify the row and its index entries are unchanged
+        """
+        with self.assertRaises(ValueError):
+            self.manager.write_block(DataWrite("Student", ["name"], ["x" * 5000], "row", conditions=ConditionGroup([Condition("id", "=", 1)])))
+        by_id = DataRetrieval("Student", ["id", "name"], ConditionGroup([Condition("id", "=", 1)]), "hash", "row")
+        self.assertEqual(self.manager.read_block(by_id), [{"id": 1, "name": "Alice"}])
+        all_students = DataRetrieval("Student", ["id", "name"], ConditionGroup([]), "sequential", "row")
+        self.assertEqual(self.manager.read_block(all_students), [{"id": 1, "name": "Alice"}, {"id": 2, "name": "Bob"}])
+        self.assertEqual(self.manager.read_block_with_hash("Student", "id", 1), [{"id": 1, "name": "Alice", "dept_name": "Computer Science", "tot_cred": None}])
+
+    def test_write_back_stale_empty_block(self):
+        """
+        Test writing an emptied version of a block that the buffer holds rows of again
+        1. Write an empty version of the buffered block to disk, as a late write back would
+        2. Verify the block catalog, free space map and rows are unchanged
+        """
+        fill = self.manager.block_catalog.get_fill("Student", 0)
+        free = self.manager.free_space_map.get_free("Student", 0)
+        self.manager.write_block_to_disk("Student", 0, None)
+        self.assertEqual(self.manager.block_catalog.get_blocks("Student"), [0])
+        self.assertEqual(self.manager.block_catalog.get_fill("Student", 0), fill)
+        self.assertEqual(self.manager.free_space_map.get_free("Student", 0), free)
+        all_students = DataRetrieval("Student", ["id"], ConditionGroup([]), "sequential", "row")
+        self.assertEqual(self.manager.read_block(all_students), [{"id": 1}, {"id": 2}])
+
+    def test_bloom_filter(self):
+        """
+        Test per-block Bloom filters
+        1. Verify equality lookups and deletes on a filtered column read fewer blocks and return the same rows
+        2. Update rows and write the blocks to disk, verify a fresh manager (with or without the filter file) still finds them
+        """
+        for student_id in range(3, 1003):
+            self.manager.write_block(DataWrite("Student", ["id", "name", "dept_name"], [student_id, f"Student {student_id}", f"Dept {student_id // 100}"], "row"))
+        by_dept = lambda dept: DataRetrieval("Student", ["id"], ConditionGroup([Condition("dept_name", "=", dept)]), "sequential", "row")
+        expected = self.manager.read_block(by_dept("Dept 4"))
+        self.manager.set_bloom_filter("Student", "dept_name")
+        self.assertEqual(self.manager.get_schema("Student").bloom_filters, ["dept_name"])
+
+        reads = []
+        read_block = self.manager._read_block
+        self.manager._read_block = lambda table, block_id, wanted=None: reads.append(block_id) or read_block(table, block_id, wanted)
+        self.assertEqual(self.manager.read_block(by_dept("Dept 4")), expected)
+        self.assertLess(len(reads), len(self.manager.block_catalog.get_blocks("Student")) // 2)
+        del self.manager._read_block
+        self.assertEqual(self.manager.delete_block(DataDeletion("Student", ConditionGroup([Condition("dept_name", "=", "Dept 5")]), "row")), 100)
+        self.assertEqual(self.manager.read_block(by_dept("Dept 5")), [])
+
+        self.manager.write_block(DataWrite("Student", ["dept_name"], ["Physics"], "row", conditions=ConditionGroup([Condition("id", "<", 20)])))
+        self.assertEqual(len(self.manager.read_block(by_dept("Physics"))), 19)
+        for key, block in self.manager.buffer.get_buffer_values().items():
+            if key[0] == "hash":
+                self.manager.write_hash_block_to_disk(key[2], key[4], key[1], key[3], block)
+            elif len(key) == 2:
+                self.manager.write_block_to_disk(key[0], key[1], block)
+        self.manager.flush_metadata()
+        self.assertEqual(len(StorageManager(Buffer(10)).read_block(by_dept("Physics"))), 19)
+        os.remove(os.path.join(self.test_data_dir, BloomFilter.BLOOM_FILE))
+        self.assertEqual(len(StorageManager(Buffer(10)).read_block(by_dept("Physics"))), 19)
+
+        self.assertTrue(self.manager.drop_bloom_filter("Student", "dept_name"))
+        self.assertFalse(self.manager.drop_bloom_filter("Student", "dept_name"))
+        self.assertEqual(self.manager.read_block(by_dept("Dept 4")), expected)
 
     def test_stats(self):
         statistic = self.manager.get_stats()
         self.assertEqual(statistic["Student"].n_r, 2)
         self.assertEqual(statistic["Student"].b_r, 1)
+        self.assertGreater(statistic["Student"].l_r, 0)
+        self.assertEqual(statistic["Student"].f_r, SlottedPage.CAPACITY // statistic["Student"].l_r)
 
     def tearDown(self):
             shutil.rmtree(self.test_data_dir)
@@ -204,12 +576,322 @@ class TestHashIndex(unittest.TestCase):
         retrieved_records = self.manager.read_block_with_hash("Student", "id", 2)
         self.assertEqual(len(retrieved_records), 0)
 
+    def test_hash_overflow_chain(self):
+        """
+        Test hash bucket overflow chains
+        1. Insert more duplicates than a bucket page holds, verify the chain and the lookup
+        2. Delete rows, verify the chain shrinks and stays readable
+        """
+        self.manager.set_index("Student", "dept_name", "hash")
+        for student_id in range(3, 3 + 2 * Hash.BUCKET_CAPACITY):
+            self.manager.write_block(DataWrite("Student", ["id", "name", "dept_name"], [student_id, f"Student {student_id}", "Physics"], "row"))
+        bucket = Hash._get_bucket(Hash._get_meta("Student", "dept_name"), Hash._hash_function("Physics"))
+        head = self.manager.buffer.get_buffer_hash(bucket, "Student", 0, "dept_name")
+        # other departments may share the bucket
+        self.assertEqual(head["pages"], -(-len(Hash._read_chain("Student", "dept_name", bucket)) // Hash.BUCKET_CAPACITY))
+        self.assertGreaterEqual(head["pages"], 2)
+        self.assertEqual(len(head["entries"]), Hash.BUCKET_CAPACITY)
+        self.assertEqual(len(self.manager.read_block_with_hash("Student", "dept_name", "Physics")), 2 * Hash.BUCKET_CAPACITY)
+
+        deleted = self.manager.delete_block(DataDeletion("Student", ConditionGroup([Condition("id", "<", 3 + Hash.BUCKET_CAPACITY)]), "row"))
+        self.assertEqual(deleted, Hash.BUCKET_CAPACITY + 2)
+        head = self.manager.buffer.get_buffer_hash(bucket, "Student", 0, "dept_name")
+        self.assertEqual(head["pages"], -(-len(Hash._read_chain("Student", "dept_name", bucket)) // Hash.BUCKET_CAPACITY))
+        self.assertEqual(len(self.manager.read_block_with_hash("Student", "dept_name", "Physics")), Hash.BUCKET_CAPACITY)
+        self.assertEqual(len(self.manager.read_block_with_hash("Student", "dept_name", "Mathematics")), 0)
+
+    def test_hash_row_slots(self):
+        """
+        Test hash entries pointing to row slots
+        1. Delete a row, verify the other rows keep their slot and stay reachable through the index
+        2. Verify a lookup on a block read from disk only needs the row slot
+        """
+        self.manager.write_block(DataWrite("Student", ["id", "name"], [3, "Charlie"], "row"))
+        self.manager.delete_block(DataDeletion("Student", ConditionGroup([Condition("id", "=", 2)]), "row"))
+        block = self.manager.buffer.get_buffer("Student", 0)
+        self.assertIsNone(block[1])
+        self.assertEqual(block[2]["id"], 3)
+        meta = Hash._get_meta("Student", "id")
+        entries = Hash._read_chain("Student", "id", Hash._get_bucket(meta, Hash._hash_function(3)))
+        self.assertIn({"key": 3, "id": 0, "slot": 2, "hash": Hash._hash_function(3)}, entries)
+        self.assertEqual(self.manager.read_block_with_hash("Student", "id", 3)[0]["name"], "Charlie")
+
+        self.manager.write_block_to_disk("Student", 0, block)
+        self.manager.buffer.delete_buffer("Student", 0)
+        self.assertEqual(self.manager._load_block("Student", 0)[1], None)
+        self.assertEqual(self.manager._read_row("Student", 0, 2)["name"], "Charlie")
+        self.assertEqual(self.manager.read_block_with_hash("Student", "id", 1)[0]["name"], "Alice")
+        self.assertEqual(self.manager.read_block_with_hash("Student", "id", 2), [])
+
+    def test_hash_version(self):
+        """
+        Test typed hashing and index versioning
+        1. Verify keys that compare equal hash the same
+        2. Verify an index built with another hash version is rebuilt on startup
+        """
+        self.assertEqual(Hash._hash_function(1), Hash._hash_function(1.0))
+        self.assertEqual(Hash._hash_function(1), Hash._hash_function(True))
+        self.assertNotEqual(Hash._hash_function(1), Hash._hash_function("1"))
+
+        self.manager.write_block_to_disk("Student", 0, self.manager.buffer.get_buffer("Student", 0))
+        self.manager.flush_metadata()
+        Hash._save_hash_block_to_disk("Student", "id", Hash.META, 0, {**Hash._new_meta(), "version": 1})
+        fresh_manager = StorageManager(Buffer(100))
+        self.assertEqual(Hash._get_meta("Student", "id")["version"], Hash.HASH_VERSION)
+        self.assertEqual(Hash._get_meta("Student", "id")["size"], 2)
+        self.assertEqual(fresh_manager.read_block_with_hash("Student", "id", 2)[0]["name"], "Bob")
+
+    def test_bulk_build(self):
+        """
+        Test bulk index build
+        1. Build an index over an existing table, verify the buffer is untouched
+        2. Verify the built index is sized for its rows and keeps working on inserts
+        """
+        for student_id in range(3, 1003):
+            self.manager.write_block(DataWrite("Student", ["id", "name", "tot_cred"], [student_id, f"Student {student_id}", student_id % 7], "row"))
+        buffered = set(self.manager.buffer.get_buffer_values())
+        self.manager.set_index("Student", "tot_cred", "hash")
+        self.assertEqual(set(self.manager.buffer.get_buffer_values()), buffered)
+
+        meta = Hash._get_meta("Student", "tot_cred")
+        self.assertEqual(meta["size"], 1002)
+        self.assertLessEqual(meta["size"], Hash._bucket_count(meta) * Hash.BUCKET_CAPACITY * Hash.MAX_LOAD)
+        self.assertEqual(len(self.manager.read_block_with_hash("Student", "tot_cred", 3)), len(range(3, 1003, 7)))
+        self.manager.write_block(DataWrite("Student", ["id", "tot_cred"], [1003, 3], "row"))
+        self.assertEqual(len(self.manager.read_block_with_hash("Student", "tot_cred", 3)), len(range(3, 1003, 7)) + 1)
+
+    def test_linear_hashing(self):
+        """
+        Test linear hashing
+        1. Insert enough keys to split buckets, verify every key is still found
+        2. Delete most keys, verify buckets are merged back
+        """
+        for student_id in range(3, 1003):
+            self.manager.write_block(DataWrite("Student", ["id", "name"], [student_id, f"Student {student_id}"], "row"))
+        meta = Hash._get_meta("Student", "id")
+        self.assertEqual(meta["size"], 1002)
+        grown = Hash._bucket_count(meta)
+        self.assertGreater(grown, Hash.INITIAL_BUCKETS)
+        self.assertLessEqual(meta["size"], grown * Hash.BUCKET_CAPACITY * Hash.MAX_LOAD)
+        for student_id in (1, 2, 500, 1002):
+            with self.subTest(student_id=student_id):
+                self.assertEqual([row["id"] for row in self.manager.read_block_with_hash("Student", "id", student_id)], [student_id])
+
+        self.manager.delete_block(DataDeletion("Student", ConditionGroup([Condition("id", ">", 100)]), "row"))
+        meta = Hash._get_meta("Student", "id")
+        self.assertEqual(meta["size"], 100)
+        self.assertLess(Hash._bucket_count(meta), grown)
+        self.assertEqual(self.manager.read_block_with_hash("Student", "id", 500), [])
+        self.assertEqual([row["id"] for row in self.manager.read_block_with_hash("Student", "id", 42)], [42])
+
     def test_hash_index_exists(self):
         """
         Verify that hash index was created successfully
         """
         self.assertTrue(self.manager.has_index("id", "Student"))
 
+class TestBPlusTree(unittest.TestCase):
+    def setUp(self):
+        self.test_data_dir = "data_blocks/"
+        self.test_bplus_dir = "bplus/"
+        self.manager = StorageManager(Buffer(1000))
+        for student_id in range(1, 1001):
+            self.manager.write_block(DataWrite("Student", ["id", "name", "tot_cred"], [student_id, f"Student {student_id}", student_id], "row"))
+        self.manager.set_index("Student", "tot_cred", "B+")
+
+    def tearDown(self):
+        shutil.rmtree(self.test_data_dir)
+
+    def _read_ids(self, conditions):
+        return sorted(row["id"] for row in self.manager.read_block(DataRetrieval("Student", ["id"], conditions, "sequential", "row")))
+
+    def _expected_ids(self, conditions):
+        predicate = compile_conditions(conditions)
+        return sorted(row["id"] for row in self.manager.read_block(DataRetrieval("Student", ["id", "tot_cred"], ConditionGroup([]), "sequential", "row")) if predicate(row))
+
+    def test_bplus_range_scan(self):
+        """
+        Test B+ tree access path
+        1. Verify range and equality conditions on the indexed column only read the blocks holding matches
+        2. Verify conditions the index cannot answer still scan the whole table
+        """
+        self.assertEqual(self.manager.get_index("Student", "tot_cred"), "B+")
+        self.assertEqual(BPlusTree._get_meta("Student", "tot_cred")["size"], 1000)
+        all_blocks = self.manager.block_catalog.get_blocks("Student")
+        conditions = ConditionGroup([Condition("tot_cred", ">", 990)])
+        self.assertEqual(self._read_ids(conditions), list(range(991, 1001)))
+        self.assertLess(len(self.manager._candidate_blocks("Student", conditions)), len(all_blocks))
+
+        between = ConditionGroup([Condition("tot_cred", ">=", 100), Condition("tot_cred", "<", 110), Condition("name", "<>", "Student 105")])
+        self.assertEqual(self._read_ids(between), [student_id for student_id in range(100, 110) if student_id != 105])
+        self.assertEqual(self._read_ids(ConditionGroup([Condition("tot_cred", "=", 500)])), [500])
+        self.assertEqual(self._read_ids(ConditionGroup([Condition("tot_cred", ">", 500), Condition("tot_cred", "<=", 500)])), [])
+        self.assertEqual(self._read_ids(ConditionGroup([Condition("tot_cred", ">", "500")])), [])
+        self.assertEqual(self.manager._candidate_blocks("Student", ConditionGroup([Condition("tot_cred", ">", 990), Condition("id", "=", 3)], "OR")), all_blocks)
+
+    def test_bplus_maintenance(self):
+        """
+        Test B+ tree maintenance
+        1. Insert, update and delete rows, verify range scans match a full scan
+        2. Delete most rows, verify the tree shrinks and keeps every remaining entry in order
+        """
+        for student_id in range(1001, 1101):
+            self.manager.write_block(DataWrite("Student", ["id", "tot_cred"], [student_id, student_id % 50], "row"))
+        self.manager.write_block(DataWrite("Student", ["tot_cred"], [None], "row", conditions=ConditionGroup([Condition("id", "<=", 10)])))
+        self.manager.write_block(DataWrite("Student", ["tot_cred"], [2000], "row", conditions=ConditionGroup([Condition("tot_cred", "=", 42)])))
+        for conditions in (ConditionGroup([Condition("tot_cred", "<", 50)]), ConditionGroup([Condition("tot_cred", ">=", 1000)]),
+                           ConditionGroup([Condition("tot_cred", "=", 42)])):
+            with self.subTest(operation=conditions.conditions[0].operation):
+                self.assertEqual(self._read_ids(conditions), self._expected_ids(conditions))
+        meta = BPlusTree._get_meta("Student", "tot_cred")
+        self.assertEqual(meta["size"], 1100)
+        used_pages = meta["pages"] - len(meta["free"])
+
+        self.manager.delete_block(DataDeletion("Student", ConditionGroup([Condition("id", ">", 50)]), "row"))
+        meta = BPlusTree._get_meta("Student", "tot_cred")
+        self.assertEqual(meta["size"], 50)
+        self.assertLess(meta["pages"] - len(meta["free"]), used_pages)
+        entries = list(BPlusTree._range("Student", "tot_cred"))
+        self.assertEqual(entries, sorted(entries))
+        self.assertEqual(self._read_ids(ConditionGroup([Condition("tot_cred", ">", 40)])), list(range(41, 51)))
+
+    def test_bplus_ordered_scan(self):
+        """
+        Test ordered iteration
+        1. Verify range scans follow the index order in both directions
+        2. Verify a top N query only reads the rows it returns and matches a sorted scan
+        """
+        self.manager.write_block(DataWrite("Student", ["id", "tot_cred"], [1001, None], "row"))
+        self.assertEqual([row["id"] for row in self.manager.range_scan("Student", "tot_cred", 10, 15, low_inclusive=False)], [11, 12, 13, 14, 15])
+        self.assertEqual([row["id"] for row in self.manager.range_scan("Student", "tot_cred", high=3, descending=True)], [3, 2, 1])
+        self.assertEqual(next(self.manager.range_scan("Student", "tot_cred"))["id"], 1001)
+
+        reads = []
+        read_row = self.manager._read_row
+        self.manager._read_row = lambda table, block_id, slot: reads.append(slot) or read_row(table, block_id, slot)
+        top = DataRetrieval("Student", ["id", "name"], ConditionGroup([Condition("name", "<>", "Student 999")]), "sequential", "row")
+        self.assertEqual([row["id"] for row in self.manager.ordered_scan(top, "tot_cred", descending=True, limit=3)], [1000, 998, 997])
+        self.assertEqual(len(reads), 4)
+        del self.manager._read_row
+
+        self.manager.drop_index("Student", "tot_cred")
+        self.assertEqual([row["id"] for row in self.manager.ordered_scan(top, "tot_cred", descending=True, limit=3)], [1000, 998, 997])
+        self.assertEqual([row["id"] for row in self.manager.range_scan("Student", "tot_cred", 10, 15, low_inclusive=False)], [11, 12, 13, 14, 15])
+
+    def test_bplus_checkpoint(self):
+        """
+        Test B+ tree persistence
+        1. Write the buffered pages to disk, verify a fresh manager answers ranges from the files
+        2. Drop the index, verify its files are gone
+        """
+        self.manager.write_block(DataWrite("Student", ["id", "tot_cred"], [1001, 5000], "row"))
+        for key, block in self.manager.buffer.get_buffer_values().items():
+            if key[0] == "bplus":
+                self.manager.write_bplus_block_to_disk(key[1], key[2], key[3], block)
+            elif len(key) == 2:
+                self.manager.write_block_to_disk(key[0], key[1], block)
+        self.manager.flush_metadata()
+
+        fresh_manager = StorageManager(Buffer(10))
+        rows = fresh_manager.read_block(DataRetrieval("Student", ["id"], ConditionGroup([Condition("tot_cred", ">=", 999)]), "sequential", "row"))
+        self.assertEqual(sorted(row["id"] for row in rows), [999, 1000, 1001])
+        bplus_dir = os.path.join(self.test_data_dir, self.test_bplus_dir)
+        self.assertTrue(fresh_manager.drop_index("Student", "tot_cred"))
+        self.assertFalse(any(file.startswith("Student__tot_cred__bplus") for file in os.listdir(bplus_dir)))
+
+class TestCompositeIndex(unittest.TestCase):
+    def setUp(self):
+        self.test_data_dir = "data_blocks/"
+        self.manager = StorageManager(Buffer(1000))
+        for student_id in range(1, 201):
+            for course_id in range(101, 106):
+                self.manager.write_block(DataWrite("Takes", ["id", "course_id", "sec_id", "semester", "year", "grade"],
+                                                   [student_id, course_id, "1", 1, 2024, "ABCDE"[(student_id + course_id) % 5]], "row"))
+
+    def tearDown(self):
+        shutil.rmtree(self.test_data_dir)
+
+    def _read(self, columns, conditions):
+        return sorted(self.manager.read_block(DataRetrieval("Takes", columns, conditions, "sequential", "row")), key=lambda row: tuple(map(str, row.values())))
+
+    def _expected(self, columns, conditions):
+        predicate = compile_conditions(conditions)
+        rows = self.manager.read_block(DataRetrieval("Takes", self.manager.get_all_attributes("Takes"), ConditionGroup([]), "sequential", "row"))
+        return sorted(({column: row[column] for column in columns} for row in rows if predicate(row)), key=lambda row: tuple(map(str, row.values())))
+
+    def _count_block_reads(self):
+        reads = []
+        read_block = self.manager._read_block
+        self.manager._read_block = lambda table, block_id, wanted=None: reads.append(block_id) or read_block(table, block_id, wanted)
+        return reads
+
+    def test_composite_hash(self):
+        """
+        Test a hash index on (id, course_id)
+        1. Verify the index answers lookups on both columns
+        2. Verify a query with an equality on both columns reads a single block
+        """
+        self.manager.set_index("Takes", ["id", "course_id"], "hash")
+        self.assertEqual(self.manager.get_index("Takes", ["id", "course_id"]), "hash")
+        self.assertIsNone(self.manager.get_index("Takes", "id"))
+        self.assertEqual([row["grade"] for row in self.manager.read_block_with_hash("Takes", ["id", "course_id"], (3, 102))], ["A"])
+
+        conditions = ConditionGroup([Condition("course_id", "=", 102), Condition("id", "=", 3)])
+        reads = self._count_block_reads()
+        self.assertEqual(self._read(["id", "course_id", "grade"], conditions), [{"id": 3, "course_id": 102, "grade": "A"}])
+        self.assertEqual(len(reads), 1)
+        del self.manager._read_block
+        # an equality on one column only cannot probe the index
+        conditions = ConditionGroup([Condition("id", "=", 3)])
+        self.assertEqual(self._read(["course_id"], conditions), self._expected(["course_id"], conditions))
+
+    def test_composite_bplus_prefix(self):
+        """
+        Test a B+ tree on (id, course_id)
+        1. Verify equalities on a prefix of the key match a full scan
+        2. Verify the entries are ordered column by column
+        """
+        self.manager.set_index("Takes", ["id", "course_id"], "B+")
+        for conditions in (ConditionGroup([Condition("id", "=", 7)]),
+                           ConditionGroup([Condition("id", "=", 7), Condition("course_id", "=", 104)]),
+                           ConditionGroup([Condition("id", "=", 7), Condition("grade", "=", "A")])):
+            with self.subTest(conditions=len(conditions.conditions)):
+                self.assertEqual(self._read(["id", "course_id", "grade"], conditions), self._expected(["id", "course_id", "grade"], conditions))
+        keys = [BPlusTree._key_value(entry[0])[0] for entry in BPlusTree._range("Takes", "id+course_id")]
+        self.assertEqual(keys, sorted((student_id, course_id) for student_id in range(1, 201) for course_id in range(101, 106)))
+
+    def test_covering_index(self):
+        """
+        Test a covering index on (id, course_id) including grade
+        1. Verify a query reading only indexed columns never reads a block
+        2. Update and delete rows, verify the included values follow
+        """
+        self.manager.set_index("Takes", ["id", "course_id"], "hash", include=["grade"])
+        conditions = ConditionGroup([Condition("id", "=", 3), Condition("course_id", "=", 102)])
+        reads = self._count_block_reads()
+        self.manager._read_row = None
+        self.assertEqual(self._read(["grade"], conditions), [{"grade": "A"}])
+        self.assertEqual(reads, [])
+        del self.manager._read_block, self.manager._read_row
+
+        self.manager.write_block(DataWrite("Takes", ["grade"], ["F"], "row", conditions=conditions))
+        self.assertEqual(self._read(["grade"], conditions), [{"grade": "F"}])
+        self.manager.write_block(DataWrite("Takes", ["course_id"], [999], "row", conditions=conditions))
+        self.assertEqual(self._read(["grade"], conditions), [])
+        moved = ConditionGroup([Condition("id", "=", 3), Condition("course_id", "=", 999)])
+        self.assertEqual(self._read(["grade"], moved), [{"grade": "F"}])
+        self.manager.delete_block(DataDeletion("Takes", moved, "row"))
+        self.assertEqual(self._read(["grade"], moved), [])
+        self.assertEqual(Hash._get_meta("Takes", "id+course_id")["size"], 999)
+
+        # a B+ tree covering its key and included columns
+        self.manager.set_index("Takes", ["id", "course_id"], "B+", include=["grade"])
+        conditions = ConditionGroup([Condition("id", "=", 10)])
+        expected = self._expected(["course_id", "grade"], conditions)
+        reads = self._count_block_reads()
+        self.assertEqual(self._read(["course_id", "grade"], conditions), expected)
+        self.assertEqual(reads, [])
+
 if __name__ == "__main__":
     unittest.main()
 
@@ -1,13 +1,20 @@
-import ast
 import inspect
 import os
 import pickle
 import math
 import sys
-import textwrap
-from typing import Any, List, Literal, Union, Dict, Tuple
+from typing import Any, Iterator, List, Literal, Set, Union, Dict, Tuple
 
+from StorageManager.BlockCatalog import BlockCatalog
+from StorageManager.BloomFilter import BloomFilter
+from StorageManager.BPlusTree import BPlusTree
+from StorageManager.ColumnBatch import ColumnBatch
+from StorageManager.FreeSpaceMap import FreeSpaceMap
 from StorageManager.HashIndex import Hash
+from StorageManager.Predicate import compile_batch_conditions, compile_conditions, condition_columns, conjunctive_conditions
+from StorageManager.Schema import DuplicateKeyError, SchemaRegistry, TableSchema, index_name
+from StorageManager.Segment import SegmentStore
+from StorageManager.SlottedPage import SlottedPage
 from ConcurrencyControlManager.utils import PrimaryKey
 from FailureRecoveryManager.Buffer import Buffer
 
@@ -148,14 +155,40 @@ class StorageManager:
     LOG_FILE = "log.dat"
     DATA_DIR = "data_blocks/"
     HASH_DIR = "hash/" # DATA_DIR/HASH_DIR/{table}_{column}_{hash}_{block_id}
-    BLOCK_SIZE = 4096  # bytes
+    BPLUS_DIR = "bplus/" # DATA_DIR/BPLUS_DIR/{table}__{column}__bplus__block__{page_id}
+    BLOCK_SIZE = SlottedPage.PAGE_SIZE  # bytes
+    # "block": one {table}__block__{id}.blk file per block
+    # "segment": blocks are pages of a few memory-mapped {table}__segment__{id}.seg files per table
+    STORAGE_MODES = ("block", "segment")
 
-    def __init__(self, buffer: Union[Buffer, None]=None):
+    def __init__(self, buffer: Union[Buffer, None]=None, storage_mode: str="block"):
+        if storage_mode not in self.STORAGE_MODES:
+            raise ValueError(f"Storage mode must be one of {self.STORAGE_MODES}.")
         os.makedirs(self.DATA_DIR, exist_ok=True)
         os.makedirs(os.path.join(self.DATA_DIR, self.HASH_DIR), exist_ok=True)
+        os.makedirs(os.path.join(self.DATA_DIR, self.BPLUS_DIR), exist_ok=True)
         self.buffer = buffer
-        Hash.change_config(buffer=buffer)
+        self.storage_mode = storage_mode
+        self.segments = SegmentStore(self.DATA_DIR, self.BLOCK_SIZE, SlottedPage.MAGIC) if storage_mode == "segment" else None
+        Hash.change_config(buffer=buffer, row_reader=self._read_row)
+        BPlusTree.change_config(buffer=buffer)
         self.indexes = {}
+        self.schema = SchemaRegistry(self.DATA_DIR, self._model_classes())
+        if not self.schema.exists():
+            self._register_stored_indexes()
+            self.schema.save()
+        self.block_catalog = BlockCatalog(self.DATA_DIR, self._list_stored_blocks, self._load_block)
+        self.free_space_map = FreeSpaceMap(self.DATA_DIR, SlottedPage.CAPACITY)
+        if not self.free_space_map.exists():
+            for table in self.block_catalog.get_tables():
+                for block_id in self.block_catalog.get_blocks(table):
+                    block = self._load_block(table, block_id)
+                    self.free_space_map.update(table, block_id, SlottedPage.CAPACITY - SlottedPage.used_space(self.get_all_attributes(table), block))
+        self.bloom_filter = BloomFilter(self.DATA_DIR)
+        if not self.bloom_filter.exists():
+            for table in self.get_all_relations():
+                self._build_bloom_filters(table, self.schema.get(table).bloom_filters)
+        self._check_indexes()
         self.logs = self._load_logs()
         self.action_logs = []
     
@@ -181,20 +214,71 @@ class StorageManager:
         """
         return os.path.join(self.DATA_DIR, f"{table}__block__{block_id}.blk")
 
-    def _load_block(self, table: str, block_id: int) -> List[Dict]:
+    def _register_stored_indexes(self) -> None:
+        """One-time migration for data directories written before the index catalog existed"""
+        for file in os.listdir(os.path.join(self.DATA_DIR, self.HASH_DIR)):
+            parts = file.split("__")
+            if len(parts) > 2 and parts[2] == "hash" and self.has_attribute(parts[1], parts[0]) and not self.has_index(parts[1], parts[0]):
+                self.schema.set_index(parts[0], parts[1], "hash")
+
+    def _check_indexes(self) -> None:
+        """Creates the missing primary key indexes and rebuilds the indexes without a meta page or written
+        in another format, e.g. hash indexes written before linear hashing or with another hash function"""
+        for table in self.get_all_relations():
+            primary_key = self.schema.get(table).primary_key
+            if primary_key and self.schema.get_index(table, primary_key) is None:
+                self.schema.set_index(table, primary_key, "hash")
+            for name, index_type in list(self.schema.get_indexes(table).items()):
+                if index_type == "hash":
+                    meta = Hash._get_meta(table, name)
+                    if meta is None or meta.get("version") != Hash.HASH_VERSION:
+                        self._build_hash_index(table, name)
+                elif index_type == "B+":
+                    meta = BPlusTree._get_meta(table, name)
+                    if meta is None or meta.get("version") != BPlusTree.BPLUS_VERSION:
+                        self._build_bplus_index(table, name)
+
+    def _list_stored_blocks(self) -> List[Tuple[str, int]]:
+        """Lists every block on disk by scanning DATA_DIR. Only used to rebuild the block catalog
+
+        Returns:
+            List[Tuple[str, int]]: Every (table, block_id) on disk
+        """
+        if self.segments is not None:
+            return self.segments.stored_blocks()
+        blocks = []
+        for file in os.listdir(self.DATA_DIR):
+            if file.endswith(".blk") and "__block__" in file:
+                table, block_id = file[: -len(".blk")].split("__block__")
+                blocks.append((table, int(block_id)))
+        return blocks
+
+    def _load_block(self, table: str, block_id: int, wanted: Union[Set[str], None]=None) -> List[Dict]:
         """Reads block from disk
 
         Args:
             table (str): Table name
             block_id (int): Block id
+            wanted (Set[str], optional): Only decode these columns. Defaults to every column.
+                Partially decoded rows must never be put in the buffer.
 
         Returns:
-            List[Dict]: _description_
+            List[Dict]: Rows of the block, None for an empty slot
         """
+        if self.segments is not None:
+            page = self.segments.read_page(table, block_id)
+            if page is None:
+                return []
+            with page:
+                return SlottedPage.unpack(self.get_all_attributes(table), page, wanted)
         block_file = self._get_block_file(table, block_id)
         if os.path.exists(block_file):
             with open(block_file, "rb") as file:
-                return pickle.load(file)
+                data = file.read()
+            if not SlottedPage.is_page(data):
+                # block written before the slotted page format
+                return pickle.loads(data)
+            return SlottedPage.unpack(self.get_all_attributes(table), data, wanted)
         return []
 
     def _save_block(self, table: str, block_id: int, block_data: List[Dict]) -> Any:
@@ -209,12 +293,233 @@ class StorageManager:
             any: The block data with id equals to block_id
         """
         block_file = self._get_block_file(table, block_id)
+        newest = self.buffer.peek_buffer(table, block_id) if self.buffer is not None else None
         if not block_data:
-            if os.path.exists(block_file):
-                os.remove(block_file)
+            if newest:
+                # an emptied version written back after the block got rows again, the newer version is saved later
+                # and its fill, free space and filters must survive
                 return
-        with open(block_file, "wb") as file:
-            pickle.dump(block_data, file)
+            if self.segments is not None:
+                self.segments.delete_page(table, block_id)
+            elif os.path.exists(block_file):
+                os.remove(block_file)
+            self.free_space_map.remove_block(table, block_id)
+            self.bloom_filter.remove_block(table, block_id)
+            if self.block_catalog.remove_block(table, block_id):
+                self.block_catalog.flush()
+            return
+        page = SlottedPage.pack(self.get_all_attributes(table), block_data)
+        filtered = self.schema.get(table).bloom_filters
+        if filtered:
+            # rebuilt from the newest version of the block, the buffer may already hold more rows than block_data
+            self.bloom_filter.set_block(table, block_id, lambda: (self.buffer.peek_buffer(table, block_id) if self.buffer is not None else None) or block_data, filtered)
+        if self.segments is not None:
+            is_new_file = not self.segments.has_page(table, block_id)
+            self.segments.write_page(table, block_id, page)
+        else:
+            is_new_file = not os.path.exists(block_file)
+            with open(block_file, "wb") as file:
+                file.write(page)
+        if newest is None:
+            # the fill of a buffered block is kept exact by the writes that buffered it,
+            # block_data may be an older version written back after an eviction
+            self._set_fill(table, block_id, self._count_rows(block_data), SlottedPage.free_space(page))
+        if is_new_file:
+            self.block_catalog.flush()
+
+    def _set_fill(self, table: str, block_id: int, fill: int, free: int) -> None:
+        """Records the fill level of a block in the block catalog and free space map
+
+        Args:
+            table (str): Table name
+            block_id (int): Block id
+            fill (int): Number of rows in the block
+            free (int): Number of free bytes left in the block
+        """
+        self.block_catalog.set_fill(table, block_id, fill)
+        self.free_space_map.update(table, block_id, free)
+
+    def _find_block_with_room(self, table: str, needed: int) -> Tuple[int, List[Dict], int]:
+        """Names a block of the table with at least `needed` free bytes,
+        allocating a new block when none has room. The block is pinned in the buffer, the caller unpins it
+
+        Args:
+            table (str): Table name
+            needed (int): Bytes the new row takes in a page
+
+        Returns:
+            Tuple[int, List[Dict], int]: The block id, the block and its free bytes
+        """
+        block_id = self.free_space_map.find_block(table, needed)
+        while block_id is not None:
+            # pinned so the block is not evicted and written back while the row is placed in it
+            block = self.buffer.pin_buffer(table, block_id)
+            if block:
+                # buffered blocks are only changed through this class, their free space is exact
+                return block_id, block, self.free_space_map.get_free(table, block_id)
+            block = self._read_block(table, block_id)
+            free = SlottedPage.CAPACITY - SlottedPage.used_space(self.get_all_attributes(table), block)
+            if free >= needed:
+                return block_id, block, free
+            # stale entry, e.g. the map was not flushed before a crash
+            self.buffer.unpin_buffer(table, block_id)
+            self._set_fill(table, block_id, self._count_rows(block), free)
+            block_id = self.free_space_map.find_block(table, needed)
+        block_id = self.block_catalog.next_block_id(table)
+        self.buffer.pin_buffer(table, block_id)
+        return block_id, [], SlottedPage.CAPACITY
+
+    def _insert_row(self, table: str, row: Dict) -> Tuple[int, int]:
+        """Places a full row in a block with room. Automatically syncs index
+
+        Args:
+            table (str): Table name
+            row (Dict): Row with every column of the table
+
+        Raises:
+            ValueError: If the row is larger than a block
+
+        Returns:
+            Tuple[int, int]: The block id and the slot the row was placed in
+        """
+        columns = self.get_all_attributes(table)
+        needed = SlottedPage.record_size(columns, row)
+        if needed > SlottedPage.CAPACITY:
+            raise ValueError(f"Row does not fit in a {self.BLOCK_SIZE} bytes block")
+        block_id, block, free = self._find_block_with_room(table, needed)
+        try:
+            fill = self._count_rows(block)
+            if fill < len(block):
+                # reuse an empty slot, its slot entry is already counted in the used space
+                slot = block.index(None)
+                block[slot] = row
+                free += SlottedPage.SLOT_SIZE
+            else:
+                slot = len(block)
+                block.append(row)
+            self.buffer.put_buffer(table, block_id, block)
+        finally:
+            self.buffer.unpin_buffer(table, block_id)
+        filtered = self.schema.get(table).bloom_filters
+        if filtered:
+            self.bloom_filter.add(table, block_id, row, filtered)
+        # the catalog is the clue that a new block exists until it is flushed
+        self._set_fill(table, block_id, fill + 1, free - needed)
+        self.update_all_column_with_hash(table, columns, row, block_id, slot)
+        return block_id, slot
+
+    def _check_primary_key(self, table: str, rows: List[Tuple[Dict, Union[Tuple[int, int], None]]]) -> None:
+        """Checks that writing the rows keeps the primary key unique, with one probe of the primary key index per row.
+        Rows with a NULL key column are not checked, as in a UNIQUE constraint
+
+        Args:
+            table (str): Table name
+            rows (List[Tuple[Dict, Tuple[int, int]]]): The rows to write and the (block_id, slot) they replace,
+                None for a new row
+
+        Raises:
+            DuplicateKeyError: If a row has the key of another row
+        """
+        primary_key = self.schema.get(table).primary_key
+        index_type = self.schema.get_index(table, primary_key) if primary_key else None
+        if index_type is None:
+            return
+        name = index_name(primary_key)
+        seen = set()
+        for row, position in rows:
+            if any(row[column] is None for column in primary_key):
+                continue
+            key, _ = self._index_key(row, primary_key, [])
+            if index_type == "hash":
+                positions = [(entry['id'], entry['slot']) for entry in Hash._get_entries(table, name, key)]
+            else:
+                order_key = BPlusTree._order_key(key)
+                positions = [(entry[1], entry[2]) for entry in BPlusTree._range(table, name, order_key, order_key)]
+            if key in seen or any(other != position for other in positions):
+                raise DuplicateKeyError(f"Duplicate primary key {key!r} in table {table}.")
+            seen.add(key)
+
+    def _read_block(self, table: str, block_id: int, wanted: Union[Set[str], None]=None) -> List[Dict]:
+        """Reads a block from buffer, falling back to disk on a miss.
+        Blocks the catalog knows to be empty are never loaded from disk
+
+        Args:
+            table (str): Table name
+            block_id (int): Block id
+            wanted (Set[str], optional): On a miss, only decode these columns. Defaults to every column.
+
+        Returns:
+            List[Dict]: The block
+        """
+        block = self.buffer.get_buffer(table, block_id) if self.buffer is not None else None
+        if block:
+            return block
+        if not self.block_catalog.get_fill(table, block_id):
+            return []
+        return self._load_block(table, block_id, wanted)
+
+    @staticmethod
+    def _trim_empty_slots(block: List[Union[Dict, None]]) -> None:
+        """Drops the empty slots at the end of a block, nothing can point to them"""
+        while block and block[-1] is None:
+            block.pop()
+
+    @staticmethod
+    def _count_rows(block: Union[List[Dict], None]) -> int:
+        """Returns the number of rows in a block, empty (None) slots excluded"""
+        if not block:
+            return 0
+        return len(block) - block.count(None)
+
+    def _read_row(self, table: str, block_id: int, slot: int) -> Union[Dict, None]:
+        """Reads a single row from buffer, falling back to decoding only its slot from disk
+
+        Args:
+            table (str): Table name
+            block_id (int): Block id
+            slot (int): Slot of the row in the block
+
+        Returns:
+            Dict: The row
+            None: If the slot is empty or does not exist
+        """
+        block = self.buffer.get_buffer(table, block_id) if self.buffer is not None else None
+        if block:
+            return block[slot] if slot < len(block) else None
+        if not self.block_catalog.get_fill(table, block_id):
+            return None
+        columns = self.get_all_attributes(table)
+        if self.segments is not None:
+            page = self.segments.read_page(table, block_id)
+            if page is None:
+                return None
+            with page:
+                return SlottedPage.read_slot(columns, page, slot)
+        block_file = self._get_block_file(table, block_id)
+        if not os.path.exists(block_file):
+            return None
+        with open(block_file, "rb") as file:
+            data = file.read()
+        if not SlottedPage.is_page(data):
+            block = pickle.loads(data)
+            return block[slot] if slot < len(block) else None
+        return SlottedPage.read_slot(columns, data, slot)
+
+    def flush_metadata(self) -> None:
+        """Persists the in-memory storage metadata (block catalog, free space map and Bloom filters).
+        Called by the checkpoint after the buffer is written to disk
+        """
+        if self.segments is not None:
+            self.segments.flush()
+        self.block_catalog.flush()
+        self.free_space_map.flush()
+        self.bloom_filter.flush()
+
+    def close(self) -> None:
+        """Persists the metadata and releases the segment files (segment mode)"""
+        self.flush_metadata()
+        if self.segments is not None:
+            self.segments.close()
     
     def log_action(self, action, table, data, columns=None):
         log_entry = {
@@ -226,6 +531,167 @@ class StorageManager:
             log_entry["columns"] = columns
         self.action_logs.append(log_entry)
         
+    # Operations a B+ tree range can answer
+    RANGE_OPERATIONS = ("=", "<", "<=", ">", ">=")
+
+    def _index_range(self, table: str, conditions: Any, column: Union[str, None]=None) -> Union[Tuple[str, Tuple, Tuple, bool, bool], None]:
+        """Finds a B+ indexed column the conditions restrict to a range (access path selection)
+
+        Args:
+            table (str): Table name
+            conditions (Union[ConditionGroup, Condition, List]): The conditions
+            column (str, optional): Only consider this column. Defaults to any B+ indexed column.
+
+        Returns:
+            Tuple[str, Tuple, Tuple, bool, bool]: The column, the lowest and highest order key
+            and whether each bound is inclusive
+            None: If no B+ index applies
+        """
+        indexes = self.schema.get_indexes(table)
+        if "B+" not in indexes.values():
+            return None
+        ranges = {}
+        for condition in conjunctive_conditions(conditions):
+            if indexes.get(condition.column) != "B+" or condition.operation not in self.RANGE_OPERATIONS:
+                continue
+            if column is not None and condition.column != column:
+                continue
+            key = BPlusTree._order_key(condition.operand)
+            rank = key[0]
+            if rank not in (1, 2):
+                # NULL never matches, other values are not ordered like the index
+                continue
+            # (rank,) and (rank + 1,) enclose every value comparable with the operand
+            low, low_inclusive, high, high_inclusive = (rank,), True, (rank + 1,), False
+            if condition.operation in ("=", ">", ">="):
+                low, low_inclusive = key, condition.operation != ">"
+            if condition.operation in ("=", "<", "<="):
+                high, high_inclusive = key, condition.operation != "<"
+            if condition.column in ranges:
+                old_low, old_low_inclusive, old_high, old_high_inclusive = ranges[condition.column]
+                if old_low > low or (old_low == low and not old_low_inclusive):
+                    low, low_inclusive = old_low, old_low_inclusive
+                if old_high < high or (old_high == high and not old_high_inclusive):
+                    high, high_inclusive = old_high, old_high_inclusive
+            ranges[condition.column] = (low, low_inclusive, high, high_inclusive)
+        if not ranges:
+            return None
+        column, (low, low_inclusive, high, high_inclusive) = next(iter(ranges.items()))
+        return column, low, high, low_inclusive, high_inclusive
+
+    def _access_path(self, table: str, conditions: Any) -> Union[Tuple[str, str, Tuple], None]:
+        """Picks the index answering the conditions (access path selection).
+        An index with an equality on each of its columns (hash) or on a prefix of its columns (B+)
+        is read with a single probe, the one using the most columns first and a hash index on a tie.
+        Otherwise a B+ tree the conditions restrict to a range is used
+
+        Args:
+            table (str): Table name
+            conditions (Union[ConditionGroup, Condition, List]): The conditions
+
+        Returns:
+            Tuple[str, str, Tuple]: The index name, the index type and the probe:
+            (key,) for a hash index, (low, high, low_inclusive, high_inclusive) order keys for a B+ tree
+            None: If no index applies
+        """
+        indexes = self.schema.get_indexes(table)
+        if not indexes:
+            return None
+        equalities = {}
+        for condition in conjunctive_conditions(conditions):
+            # NULL never matches, other values are not ordered like the B+ tree
+            if condition.operation == "=" and BPlusTree._order_key(condition.operand)[0] in (1, 2):
+                equalities.setdefault(condition.column, condition.operand)
+        best, best_score = None, 0
+        for name, index_type in indexes.items() if equalities else ():
+            columns = TableSchema.index_columns(name)
+            if index_type == "hash":
+                if not all(column in equalities for column in columns):
+                    continue
+                key = equalities[columns[0]] if len(columns) == 1 else tuple(equalities[column] for column in columns)
+                score, probe = len(columns) + 0.5, (key,)
+            elif index_type == "B+":
+                prefix = []
+                for column in columns:
+                    if column not in equalities:
+                        break
+                    prefix.append(BPlusTree._order_key(equalities[column]))
+                if not prefix:
+                    continue
+                if len(columns) == 1:
+                    low = high = prefix[0]
+                else:
+                    # (math.inf,) sorts after the order key of any value of the next column
+                    low, high = (4, tuple(prefix)), (4, tuple(prefix) + ((math.inf,),))
+                score, probe = len(prefix), (low, high, True, True)
+            else:
+                continue
+            if score > best_score:
+                best, best_score = (name, index_type, probe), score
+        if best is not None:
+            return best
+        index_range = self._index_range(table, conditions)
+        if index_range is None:
+            return None
+        return index_range[0], "B+", index_range[1:]
+
+    def _index_entries(self, table: str, name: str, index_type: str, probe: Tuple) -> Iterator[Tuple[int, int, Union[Dict, None]]]:
+        """Yields the rows an access path points to, without reading them
+
+        Args:
+            table (str): Table name
+            name (str): Index name
+            index_type (str): "hash" or "B+"
+            probe (Tuple): Probe of the index, see _access_path
+
+        Yields:
+            Tuple[int, int, Dict]: The block id, the slot and the values of the key and included columns of the row,
+            None if they cannot be recovered from the index entry
+        """
+        columns = TableSchema.index_columns(name)
+        include = self.schema.get_include(table, name)
+        if index_type == "hash":
+            for entry in Hash._get_entries(table, name, probe[0]):
+                yield entry['id'], entry['slot'], self._entry_values(columns, include, entry['key'], entry.get('include'))
+            return
+        for entry in BPlusTree._range(table, name, *probe):
+            key, exact = BPlusTree._key_value(entry[0])
+            included = entry[3] if len(entry) > 3 else None
+            yield entry[1], entry[2], self._entry_values(columns, include, key, included) if exact else None
+
+    @staticmethod
+    def _entry_values(columns: List[str], include: List[str], key: Any, included: Union[Tuple, None]) -> Union[Dict, None]:
+        """Maps the key (a tuple for a composite index) and included values of an index entry to their columns"""
+        values = {columns[0]: key} if len(columns) == 1 else dict(zip(columns, key))
+        if include:
+            if included is None:
+                return None
+            values.update(zip(include, included))
+        return values
+
+    def _candidate_blocks(self, table: str, conditions: Any) -> List[int]:
+        """Returns the blocks that may hold rows satisfying the conditions, in block order.
+        Every block of the table unless an index applies to the conditions
+        or the Bloom filters of an equality condition rule blocks out
+
+        Args:
+            table (str): Table name
+            conditions (Union[ConditionGroup, Condition, List]): The conditions
+
+        Returns:
+            List[int]: Block ids
+        """
+        access_path = self._access_path(table, conditions)
+        if access_path is not None:
+            return sorted({block_id for block_id, _, _ in self._index_entries(table, *access_path)})
+        blocks = self.block_catalog.get_blocks(table)
+        filtered = self.schema.get(table).bloom_filters
+        for condition in conjunctive_conditions(conditions) if filtered else ():
+            # values of other types may equal a value without hashing the same
+            if condition.operation == "=" and condition.column in filtered and BPlusTree._order_key(condition.operand)[0] in (1, 2):
+                blocks = self.bloom_filter.filter_blocks(table, condition.column, condition.operand, blocks)
+        return blocks
+
     def read_block(self, data_retrieval: DataRetrieval) -> List[Any]: 
         """Reads blocks from buffer (if exist)
         If block isn't in buffer read from disk
@@ -236,22 +702,173 @@ class StorageManager:
         Returns:
             List[Any]: List of dictionaries satisfying data_retrieval 
         """
+        return list(self.scan(data_retrieval))
+
+    def scan(self, data_retrieval: DataRetrieval, batch_size: Union[int, None]=None) -> Iterator[Any]:
+        """Lazily reads the rows satisfying data_retrieval, one block at a time.
+        Blocks come from the buffer when present, otherwise from disk.
+        Stopping the iteration early (e.g. for LIMIT) skips the remaining blocks.
+
+        Args:
+            data_retrieval (DataRetrieval): Data to retrieve
+            batch_size (int, optional): Yield lists of up to batch_size rows instead of single rows. Defaults to None.
+
+        Raises:
+            ValueError: If batch_size is not positive
+
+        Yields:
+            Dict: A row satisfying data_retrieval, or a List[Dict] batch if batch_size is given
+        """
+        if batch_size is not None and batch_size <= 0:
+            raise ValueError("batch_size must be positive")
         table = data_retrieval.table
         columns = data_retrieval.columns
         conditions = data_retrieval.conditions
-        results = []
+        if conditions is None:
+            return
+        predicate = compile_conditions(conditions)
+        needed = set(columns) | condition_columns(conditions)
+        access_path = self._access_path(table, conditions)
+        if access_path is not None and needed.issubset(self._index_covered_columns(table, access_path[0])):
+            # index-only scan, the rows are built from the index entries
+            rows = self._index_only_rows(table, access_path)
+        else:
+            # projection pushdown, blocks read from disk only decode the projected and filtered columns
+            wanted = None if needed.issuperset(self.get_all_attributes(table)) else needed
+            rows = self._block_rows(table, self._candidate_blocks(table, conditions), wanted)
 
-        for file in os.listdir(self.DATA_DIR):
-            if file.startswith(table):
-                block_id = int(file.split('__')[-1].split('.')[0])
-                block = self.buffer.get_buffer(table, block_id)
-                if not block:
-                    block = self._load_block(table, block_id)
-                for row in block:
-                    if data_retrieval.conditions is not None and self._evaluate_conditions(row, conditions):
-                        results.append({col: row[col] for col in columns})
-        return results
+        batch = []
+        for row in rows:
+            if row is None or not predicate(row):
+                continue
+            if batch_size is None:
+                yield {col: row[col] for col in columns}
+                continue
+            batch.append({col: row[col] for col in columns})
+            if len(batch) == batch_size:
+                yield batch
+                batch = []
+        if batch:
+            yield batch
+
+    def _block_rows(self, table: str, blocks: List[int], wanted: Union[Set[str], None]) -> Iterator[Union[Dict, None]]:
+        """Yields the rows of the blocks in slot order, None for an empty slot"""
+        for block_id in blocks:
+            # the caller may write between two yields, iterate over a snapshot of the buffered block
+            yield from tuple(self._read_block(table, block_id, wanted))
+
+    def _index_covered_columns(self, table: str, name: str) -> Set[str]:
+        """Returns the columns an index-only scan of the index can return"""
+        return set(TableSchema.index_columns(name)).union(self.schema.get_include(table, name))
+
+    def _index_only_rows(self, table: str, access_path: Tuple[str, str, Tuple]) -> Iterator[Union[Dict, None]]:
+        """Yields the key and included columns of the rows an access path points to, in index order.
+        Only reads a row when its values cannot be recovered from the index entry"""
+        for block_id, slot, values in self._index_entries(table, *access_path):
+            yield values if values is not None else self._read_row(table, block_id, slot)
         
+    def scan_batches(self, data_retrieval: DataRetrieval) -> Iterator[ColumnBatch]:
+        """Lazily reads the rows satisfying data_retrieval as one ColumnBatch per block.
+        The conditions are evaluated over whole columns instead of row by row.
+
+        Args:
+            data_retrieval (DataRetrieval): Data to retrieve
+
+        Yields:
+            ColumnBatch: The non-empty selection of a block, holding data_retrieval.columns
+        """
+        table = data_retrieval.table
+        columns = data_retrieval.columns
+        conditions = data_retrieval.conditions
+        if conditions is None:
+            return
+        predicate = compile_batch_conditions(conditions)
+        filtered = sorted(condition_columns(conditions).difference(columns))
+        wanted = set(columns).union(filtered)
+        if wanted.issuperset(self.get_all_attributes(table)):
+            wanted = None
+
+        for block_id in self._candidate_blocks(table, conditions):
+            block = [row for row in self._read_block(table, block_id, wanted) if row is not None]
+            if not block:
+                continue
+            batch = ColumnBatch.from_rows(columns + filtered, block)
+            batch = batch.filter(predicate(batch)).project(columns)
+            if len(batch):
+                yield batch
+
+    def range_scan(self, table: str, column: str, low: Any=None, high: Any=None,
+                   low_inclusive: bool=True, high_inclusive: bool=True, descending: bool=False) -> Iterator[Dict]:
+        """Lazily reads the rows with low <= column <= high in column order.
+        Follows the leaf chain of the B+ tree on the column when there is one, otherwise sorts a scan.
+        Without bounds every row is read, rows where column is NULL first.
+
+        Args:
+            table (str): Table name
+            column (str): Column to order by
+            low (Any, optional): Lowest value. Defaults to None, no lower bound.
+            high (Any, optional): Highest value. Defaults to None, no upper bound.
+            low_inclusive (bool): Whether rows equal to low are included. Defaults to True.
+            high_inclusive (bool): Whether rows equal to high are included. Defaults to True.
+            descending (bool): Read from high to low. Defaults to False.
+
+        Yields:
+            Dict: A row
+        """
+        conditions = []
+        if low is not None:
+            conditions.append(Condition(column, ">=" if low_inclusive else ">", low))
+        if high is not None:
+            conditions.append(Condition(column, "<=" if high_inclusive else "<", high))
+        return self.ordered_scan(DataRetrieval(table, self.get_all_attributes(table), conditions, "ordered", "row"), column, descending)
+
+    def ordered_scan(self, data_retrieval: DataRetrieval, column: str, descending: bool=False,
+                     limit: Union[int, None]=None) -> Iterator[Dict]:
+        """Lazily reads the rows satisfying data_retrieval ordered by column (ORDER BY ... LIMIT).
+        With a B+ tree on the column the rows come in index order, so stopping early
+        only reads the rows returned, otherwise the matching rows are scanned and sorted.
+        Rows where column is NULL come first.
+
+        Args:
+            data_retrieval (DataRetrieval): Data to retrieve
+            column (str): Column to order by
+            descending (bool): Order from the highest value. Defaults to False.
+            limit (int, optional): Stop after this many rows. Defaults to None.
+
+        Raises:
+            ValueError: If limit is negative
+
+        Yields:
+            Dict: A row satisfying data_retrieval
+        """
+        if limit is not None and limit < 0:
+            raise ValueError("limit must not be negative")
+        table = data_retrieval.table
+        columns = data_retrieval.columns
+        conditions = data_retrieval.conditions
+        if conditions is None or limit == 0:
+            return
+        if self.get_index(table, column) != "B+":
+            wanted = columns if column in columns else columns + [column]
+            order_key = BPlusTree._order_key
+            rows = sorted(self.scan(DataRetrieval(table, wanted, conditions, "sequential", "row")),
+                          key=lambda row: order_key(row[column]), reverse=descending)
+            yield from ({col: row[col] for col in columns} for row in rows[:limit])
+            return
+
+        predicate = compile_conditions(conditions)
+        index_range = self._index_range(table, conditions, column)
+        bounds = index_range[1:] if index_range is not None else ()
+        count = 0
+        for entry in BPlusTree._range(table, column, *bounds, descending=descending):
+            row = self._read_row(table, entry[1], entry[2])
+            if row is None or not predicate(row):
+                continue
+            yield {col: row[col] for col in columns}
+            count += 1
+            if count == limit:
+                return
+
     def write_block_to_disk(self, table: str, block_id: int, block_data: List[Dict]) -> int:
         """Writes blocks straight to disk. Automatically syncs index
 
@@ -261,10 +878,11 @@ class StorageManager:
         Returns:
             int: Number of rows affected
         """
-        for column_exist in self.get_all_attributes(table):
-            for row in block_data:
-                if column_exist not in row.keys():
-                    row[column_exist] = None
+        if block_data:
+            for column_exist in self.get_all_attributes(table):
+                for row in block_data:
+                    if row is not None and column_exist not in row.keys():
+                        row[column_exist] = None
         self._save_block(table, block_id, block_data)
 
     def write_block(self, data_write: DataWrite) -> int:
@@ -273,6 +891,9 @@ class StorageManager:
         Args:
             data_write (DataWrite): Data to write
 
+        Raises:
+            ValueError: If a column does not exist in the table
+
         Returns:
             int: The number of rows affected
             (for INSERT operation this is always 1) 
@@ -281,53 +902,69 @@ class StorageManager:
         columns = data_write.columns
         new_values = data_write.new_values
         conditions = data_write.conditions
+        schema = self.schema.get(table)
+        unknown = [column for column in columns if not schema.has_column(column)]
+        if unknown:
+            # rejected before any block is read, a buffered row must never hold a column the page format cannot store
+            raise ValueError(f"Unknown column(s) {unknown} in table {table}.")
         dict_new_values = dict(zip(columns, new_values))
-        for column_exist in self.get_all_attributes(table):
-            if column_exist not in dict_new_values.keys():
-                dict_new_values[column_exist] = None
-        blocks = sorted(int(file.split('__')[-1].split('.')[0]) for file in os.listdir(self.DATA_DIR) if file.startswith(table))
         if not data_write.conditions:
             # add operation
-            for block_id in blocks:
-                block = self.buffer.get_buffer(table, block_id) 
-                if not block:
-                    block = self._load_block(table, block_id)
-                if len(block) < self.BLOCK_SIZE:
-                    block.append(dict_new_values)
-                    self.buffer.put_buffer(table, block_id, block)
-                    self.update_all_column_with_hash(table, columns, dict_new_values, block_id)
-                    return 1
-            # If no space, create a new block
-            new_block_id = max(blocks, default=-1) + 1
-            new_block = [dict_new_values]
-            
-            self.buffer.put_buffer(table, new_block_id, new_block)
-            self.update_all_column_with_hash(table, columns, dict_new_values, new_block_id)
-            # give clue it exists
-            self._save_block(table, new_block_id, [])
+            for column_exist in self.get_all_attributes(table):
+                if column_exist not in dict_new_values.keys():
+                    dict_new_values[column_exist] = None
+            self._check_primary_key(table, [(dict_new_values, None)])
+            self._insert_row(table, dict_new_values)
             return 1
         # update operation 
         num_updated = 0
-        for block_id in blocks:
-            block = self.buffer.get_buffer(table, block_id)
-            if not block:
-                block = self._load_block(table, block_id)
-            new_block = []
-            data_changed = False
-            for row in block:
-                if self._evaluate_conditions(row, conditions):
-                    data_changed = True
+        all_columns = self.get_all_attributes(table)
+        predicate = compile_conditions(conditions)
+        # checked before any row changes, so a rejected update changes nothing
+        updated_rows = [(dict(row, **dict_new_values), (block_id, slot))
+                        for block_id in self._candidate_blocks(table, conditions)
+                        for slot, row in enumerate(self._read_block(table, block_id))
+                        if row is not None and predicate(row)]
+        for new_row, _ in updated_rows:
+            if SlottedPage.record_size(all_columns, new_row) > SlottedPage.CAPACITY:
+                raise ValueError(f"Row does not fit in a {self.BLOCK_SIZE} bytes block")
+        if any(column in schema.primary_key for column in columns):
+            self._check_primary_key(table, updated_rows)
+        moved_rows = []
+        for block_id in self._candidate_blocks(table, conditions):
+            block = self._read_block(table, block_id)
+            # rows keep their slot, indexes point to it
+            new_block = list(block)
+            updated_slots = []
+            for slot, row in enumerate(block):
+                if row is not None and predicate(row):
+                    old_row = dict(row)
                     new_row = row
-                    for column, new_value in dict_new_values.items():
-                        self.delete_all_column_with_hash(table, [column], {column: row[column]}, block_id)
-                        new_row[column] = new_value
-                        self.update_all_column_with_hash(table, [column], {column: new_row[column]}, block_id)
-                    new_block.append(new_row)
+                    new_row.update(dict_new_values)
+                    self.delete_all_column_with_hash(table, columns, old_row, block_id, slot)
+                    self.update_all_column_with_hash(table, columns, new_row, block_id, slot)
+                    new_block[slot] = new_row
+                    updated_slots.append(slot)
                     num_updated += 1
-                else:
-                    new_block.append(row)
-            if data_changed:
-                self.buffer.put_buffer(table, block_id, new_block)
+            if updated_slots:
+                free = SlottedPage.CAPACITY - SlottedPage.used_space(all_columns, new_block)
+                # rows that grew past the block move to a block with room
+                while free < 0:
+                    slot = updated_slots.pop()
+                    row = new_block[slot]
+                    new_block[slot] = None
+                    free += SlottedPage.record_size(all_columns, row) - SlottedPage.SLOT_SIZE
+                    self.delete_all_column_with_hash(table, all_columns, row, block_id, slot)
+                    moved_rows.append(row)
+                self._trim_empty_slots(new_block)
+                self._set_fill(table, block_id, self._count_rows(new_block), SlottedPage.CAPACITY - SlottedPage.used_space(all_columns, new_block))
+                self.buffer.put_buffer(table, block_id, new_block or None)
+                filtered = [column for column in self.schema.get(table).bloom_filters if column in dict_new_values]
+                for slot in updated_slots if filtered else ():
+                    self.bloom_filter.add(table, block_id, new_block[slot], filtered)
+        # moved after the scan so they are not matched twice
+        for row in moved_rows:
+            self._insert_row(table, row)
         return num_updated
     
     def delete_block_to_disk(self, table: str, block_id: int) -> int:
@@ -352,29 +989,46 @@ class StorageManager:
         """
         table = data_deletion.table
         conditions = data_deletion.conditions
+        predicate = compile_conditions(conditions)
         total_deleted = 0
 
-        for file in os.listdir(self.DATA_DIR):
-            if file.startswith(table):
-                block_id = int(file.split('__')[-1].split('.')[0])
-                block = self.buffer.get_buffer(table, block_id)
-                if not block:
-                    block = self._load_block(table, block_id)
-                new_block = [row for row in block if not self._evaluate_conditions(row, conditions)]
-                total_deleted += len(block) - len(new_block)
-                deleted_block = [row for row in block if row not in new_block]
-                for row in deleted_block:
-                    self.delete_all_column_with_hash(table, self.get_all_attributes(table), row, block_id)
-                if not new_block:
-                    new_block = None
-                self.buffer.put_buffer(table, block_id, new_block)
+        all_columns = self.get_all_attributes(table)
+
+        for block_id in self._candidate_blocks(table, conditions):
+            block = self._read_block(table, block_id)
+            # deleted rows leave an empty slot, the other rows keep theirs
+            new_block = list(block)
+            deleted = 0
+            for slot, row in enumerate(block):
+                if row is not None and predicate(row):
+                    new_block[slot] = None
+                    deleted += 1
+                    self.delete_all_column_with_hash(table, all_columns, row, block_id, slot)
+            if not deleted:
+                continue
+            total_deleted += deleted
+            self._trim_empty_slots(new_block)
+            self._set_fill(table, block_id, self._count_rows(new_block),
+                           SlottedPage.CAPACITY - SlottedPage.used_space(all_columns, new_block))
+            if not new_block:
+                new_block = None
+            self.buffer.put_buffer(table, block_id, new_block)
         return total_deleted
     
     def write_hash_block_to_disk(self, table: str, column: str, hash_value: int, block_id: int, block_data: Dict):
+        if self.get_index(table, column) != "hash":
+            # the index was dropped after the block was buffered
+            return
         Hash._save_hash_block_to_disk(table, column, hash_value, block_id, block_data)
         
     def delete_hash_block_to_disk(self, table: str, column: str, hash_value: str, block_id: int):
         Hash._save_hash_block_to_disk(table, column, hash_value, block_id, None)
+
+    def write_bplus_block_to_disk(self, table: str, column: str, page_id: int, block_data: Dict):
+        if self.get_index(table, column) != "B+":
+            # the index was dropped after the page was buffered
+            return
+        BPlusTree._save_bplus_block_to_disk(table, column, page_id, block_data)
     
     def get_stats(self) -> Dict[str, Statistic]:
         """Get summary of the whole schema
@@ -383,14 +1037,11 @@ class StorageManager:
             Dict[str, Statistic]: Statistic of every table in the schema
         """
         stats = {}
-        for file in os.listdir(self.DATA_DIR):
-            if file.endswith(".blk"):
-                parts = file.split("__block__")
-                table_name = parts[0]
-                block_id = int(parts[1].split(".")[0])
-                block = self.buffer.get_buffer(table_name, block_id)
-                if not block: 
-                    block = self._load_block(table_name, block_id)
+        for table_name in self.block_catalog.get_tables():
+            for block_id in self.block_catalog.get_blocks(table_name):
+                if not self.block_catalog.get_fill(table_name, block_id):
+                    continue
+                block = self._read_block(table_name, block_id)
                 if table_name not in stats:
                     stats[table_name] = {
                         "n_r": 0, 
@@ -399,8 +1050,10 @@ class StorageManager:
                         "f_r": 0,  
                         "V_a_r": {} 
                     }
+                block = [row for row in block if row is not None]
                 stats[table_name]["n_r"] += len(block)
                 stats[table_name]["b_r"] += 1
+                stats[table_name]["l_r"] += SlottedPage.used_space(self.get_all_attributes(table_name), block)
                 if block:
                     # print(block)
                     for row in block:
@@ -411,8 +1064,11 @@ class StorageManager:
                             stats[table_name]["V_a_r"][col].update(row[col] for row in block)
                     # row_length = len(block[0])
         for table_name, table_stats in stats.items():
+            # l_r is the average number of bytes a row takes in a block (slot included)
+            if table_stats["n_r"] > 0:
+                table_stats["l_r"] = math.ceil(table_stats["l_r"] / table_stats["n_r"])
             if table_stats["l_r"] > 0:
-                table_stats["f_r"] = math.floor(self.BLOCK_SIZE / table_stats["l_r"])
+                table_stats["f_r"] = math.floor(SlottedPage.CAPACITY / table_stats["l_r"])
             table_stats["V_a_r"] = {col: len(values) for col, values in table_stats["V_a_r"].items()}
             stats[table_name] = Statistic(
                 n_r=table_stats["n_r"],
@@ -423,181 +1079,297 @@ class StorageManager:
             )
         return stats
     
-    def get_index(self, relation: str, attribute: str) -> Union[Literal["hash", "btree"], None]:
-        """Get the type of index on the given attribute in the relation."""
-        for file in os.listdir(os.path.join(self.DATA_DIR, self.HASH_DIR)):
-            # print(file)
-            if file.startswith(f"{relation}__{attribute}__hash"):
-                return "hash"
-        return None
+    def get_index(self, relation: str, attribute: Union[str, List[str]]) -> Union[Literal["hash", "B+"], None]:
+        """Get the type of index on the given attribute (or composite index on the given attributes) in the relation."""
+        return self.schema.get_index(relation, attribute)
     
-    def has_index(self, attribute: str, relation: str) -> bool:
-        """Check if the attribute in the relation has an index."""
-        for file in os.listdir(os.path.join(self.DATA_DIR, self.HASH_DIR)):
-            if file.startswith(f"{relation}__{attribute}__hash"):
-                return True
-        return False
+    def has_index(self, attribute: Union[str, List[str]], relation: str) -> bool:
+        """Check if the attribute (or the attributes, as a composite index) in the relation has an index."""
+        return self.schema.get_index(relation, attribute) is not None
     
+    @staticmethod
+    def _model_classes() -> List[type]:
+        """Returns the model classes of this module, every one of them is a built-in table"""
+        helper_classes = ['Condition', 'ConditionGroup', 'DataDeletion', 'DataRetrieval', 'DataWrite', 'Statistic', 'StorageManager']
+        return [obj for name, obj in inspect.getmembers(sys.modules[__name__], lambda member: inspect.isclass(member) and member.__module__ == __name__)
+                if name not in helper_classes]
+
+    def create_table(self, table: str, columns: List[str], types: Union[Dict[str, str], None]=None, primary_key: Union[List[str], None]=None) -> None:
+        """Creates a table without a model class (CREATE TABLE)
+
+        Args:
+            table (str): Table name
+            columns (List[str]): Column names in storage order
+            types (Dict[str, str], optional): Type of each column ("int", "float", "str" or "bool"). Defaults to None.
+            primary_key (List[str], optional): Primary key columns, kept unique by a hash index on them. Defaults to None.
+
+        Raises:
+            ValueError: If the table already exists or the definition is invalid
+        """
+        self.schema.create_table(TableSchema(table, columns, types, primary_key))
+        if primary_key:
+            self.schema.set_index(table, primary_key, "hash")
+            self._build_hash_index(table, index_name(primary_key))
+
+    def get_schema(self, relation: str) -> TableSchema:
+        """Get the schema (columns, types, primary key, indexes) of the relation."""
+        return self.schema.get(relation)
+
     def get_all_relations(self) -> List[str]:
         """Get all relations in the data."""
-        relations = []
-        helper_classes = ['Condition', 'ConditionGroup', 'DataDeletion', 'DataRetrieval', 'DataWrite', 'Statistic']
-        for name, obj in inspect.getmembers(sys.modules[__name__], lambda member: inspect.isclass(member) and member.__module__ == __name__):
-            if name != type(self).__name__ and name not in helper_classes:
-                relations.append(name)
-        return relations
+        return self.schema.get_relations()
 
     def get_all_attributes(self, relation: str) -> List[str]:
-        """Get all attributes in the relation."""
-        cls = globals()[relation]
-        init_method = getattr(cls, "__init__", None)
-        if not init_method:
-            return []
-
-        source = textwrap.dedent(inspect.getsource(init_method))
-        tree = ast.parse(source)
-        attributes = [node.attr for node in ast.walk(tree) if isinstance(node, ast.Attribute) and isinstance(node.ctx, ast.Store) and node.attr != "primary_key"]
-        return attributes
+        """Get all attributes in the relation. The returned list is shared, do not modify it."""
+        return self.schema.get(relation).columns
     
     def has_relation(self, relation: str) -> bool:
         """Check if the relation is in the data."""
-        return relation in self.get_all_relations()
+        return self.schema.has_relation(relation)
     
     def has_attribute(self, attribute: str, relation: str) -> bool:
         """Check if the attribute is in the relation."""
-        return attribute in self.get_all_attributes(relation)
+        return self.schema.has_relation(relation) and self.schema.get(relation).has_column(attribute)
+
+    def set_index(self, table: str, column: Union[str, List[str]], index_type: str, include: Union[List[str], None]=None) -> None:
+        """Creates an index and builds it from the rows of the table
+
+        Args:
+            table (str): Table name
+            column (Union[str, List[str]]): Column name, or the columns of a composite index in key order
+            index_type (str): "hash" or "B+"
+            include (List[str], optional): Columns stored in the index entries (covering index),
+                so queries reading only indexed columns never read the rows. Defaults to None.
 
-    def set_index(self, table: str, column: str, index_type: str) -> None:
+        Raises:
+            ValueError: If the index type is invalid or a column does not exist
+        """
         if index_type != "hash" and index_type != "B+":
-            raise ValueError("Index yang digunakan adalah hash index.")
-        
+            raise ValueError("Index yang digunakan adalah hash atau B+ index.")
+        name = index_name(column)
+        label = "Hash" if index_type == "hash" else "B+"
+        current = self.get_index(table, name)
+        if current == index_type and self.schema.get_include(table, name) == [included for included in include or [] if included not in TableSchema.index_columns(name)]:
+            print(f"{label} index already exists at {table}.{name}")
+            return
+        if current is not None:
+            # another type or other included columns, the old index is replaced
+            self._drop_index_pages(table, name, current)
+        self.schema.set_index(table, column, index_type, include)
         if index_type == "hash":
-            exist = False
-            for file in os.listdir(os.path.join(self.DATA_DIR, self.HASH_DIR)):
-                if file.startswith(f"{table}__{column}__hash"):
-                    exist = True
-                    break
-            if exist:
-                print(f"Hash index already exists at {table}.{column}")
-                return
-            Hash._initiate_block(table, column)
-            for file in os.listdir(self.DATA_DIR):
-                if file.startswith(f"{table}"):
-                    block_id = int(file.split('__')[-1].split('.')[0])
-                    block = self.buffer.get_buffer(table, block_id)
-                    if not block:
-                        block = self._load_block(table, block_id)
-                    for row in block:
-                        self.write_block_with_hash(table, column, row[column], block_id)
-            print(f"Hash index set on {table}.{column}")
+            self._build_hash_index(table, name)
         else:
-            raise NotImplementedError("B+ Not Implemented")
+            self._build_bplus_index(table, name)
+        print(f"{label} index set on {table}.{name}")
+
+    def _build_hash_index(self, table: str, name: str) -> None:
+        """Do NOT call from outside this module. (Re)builds a hash index from the rows of the table"""
+        Hash._drop_index(table, name, self.buffer)
+        Hash._bulk_build(table, name, self._scan_index_keys(table, name))
+
+    def _build_bplus_index(self, table: str, name: str) -> None:
+        """Do NOT call from outside this module. (Re)builds a B+ tree index from the rows of the table"""
+        BPlusTree._drop_index(table, name, self.buffer)
+        BPlusTree._bulk_build(table, name, self._scan_index_keys(table, name))
+
+    def _scan_index_keys(self, table: str, name: str) -> Iterator[Tuple[Any, int, int, Union[Tuple, None]]]:
+        """Do NOT call from outside this module. Yields (key, block_id, slot, included values) of every row,
+        blocks read from disk are not put in the buffer and only decode the indexed columns"""
+        columns = TableSchema.index_columns(name)
+        include = self.schema.get_include(table, name)
+        wanted = set(columns).union(include)
+        for block_id in self.block_catalog.get_blocks(table):
+            for slot, row in enumerate(self._read_block(table, block_id, wanted)):
+                if row is not None:
+                    key, included = self._index_key(row, columns, include)
+                    yield key, block_id, slot, included
+
+    def set_bloom_filter(self, table: str, column: str) -> None:
+        """Keeps a Bloom filter of table.column per block, so equality conditions on the column
+        skip the blocks that certainly do not hold the value. Meant for columns without an index
+
+        Args:
+            table (str): Table name
+            column (str): Column name
+
+        Raises:
+            ValueError: If the table or the column does not exist
+        """
+        if not self.schema.set_bloom_filter(table, column):
+            print(f"Bloom filter already exists at {table}.{column}")
+            return
+        self._build_bloom_filters(table, [column])
+        print(f"Bloom filter set on {table}.{column}")
+
+    def drop_bloom_filter(self, table: str, column: str) -> bool:
+        """Drops the Bloom filters of table.column
+
+        Returns:
+            bool: True if the column had Bloom filters
+        """
+        if not self.schema.drop_bloom_filter(table, column):
+            return False
+        self.bloom_filter.drop_column(table, column)
+        return True
+
+    def _build_bloom_filters(self, table: str, columns: List[str]) -> None:
+        """Do NOT call from outside this module. (Re)builds the Bloom filters of the columns for every block of the table"""
+        if not columns:
+            return
+        wanted = set(columns)
+        for block_id in self.block_catalog.get_blocks(table):
+            self.bloom_filter.set_block(table, block_id, lambda: self._read_block(table, block_id, wanted), columns)
+
+    def drop_index(self, table: str, column: Union[str, List[str]]) -> bool:
+        """Drops the index on table.column, from the buffer and from disk
+
+        Args:
+            table (str): Table name
+            column (Union[str, List[str]]): Column name, or the columns of a composite index
+
+        Raises:
+            ValueError: If the index enforces the primary key
+
+        Returns:
+            bool: True if the column was indexed
+        """
+        name = index_name(column)
+        if self.has_relation(table) and name == index_name(self.schema.get(table).primary_key):
+            raise ValueError(f"Index {table}.{name} enforces the primary key and cannot be dropped.")
+        index_type = self.schema.drop_index(table, name)
+        if index_type is None:
+            return False
+        self._drop_index_pages(table, name, index_type)
+        return True
+
+    def _drop_index_pages(self, table: str, name: str, index_type: str) -> None:
+        """Do NOT call from outside this module. Removes the pages of an index from the buffer and from disk"""
+        if index_type == "hash":
+            Hash._drop_index(table, name, self.buffer)
+        elif index_type == "B+":
+            BPlusTree._drop_index(table, name, self.buffer)
         
-    def read_block_with_hash(self, table: str, column: str, value) -> List[Dict]:
+    def read_block_with_hash(self, table: str, column: Union[str, List[str]], value) -> List[Dict]:
         """Get every row in table.column with column equals value
 
         Args:
             table (str): Table name
-            column (str): Column name
-            value (_type_): Value to search
+            column (Union[str, List[str]]): Column name, or the columns of a composite index
+            value (_type_): Value to search, one value per column for a composite index
 
         Returns:
             List[Dict]: All rows with column = value
         """
-        return Hash._get_rows(table, column, value)
+        return Hash._get_rows(table, index_name(column), value if isinstance(column, str) else tuple(value))
     
-    def delete_all_column_with_hash(self, table: str, changed_columns: List[str], old_values: Dict, old_block_id: int) -> None:
-        """Do NOT call from outside this module. Helper function to delete hash 
+    def _changed_indexes(self, table: str, changed_columns: List[str]) -> Iterator[Tuple[str, str, List[str], List[str]]]:
+        """Do NOT call from outside this module. Yields (name, type, key columns, included columns)
+        of every index of the table reading one of the changed columns"""
+        schema = self.schema.get(table)
+        for name, index_type in schema.indexes.items():
+            columns = schema.index_columns(name)
+            include = schema.include.get(name, [])
+            if any(column in changed_columns for column in columns) or any(column in changed_columns for column in include):
+                yield name, index_type, columns, include
+
+    @staticmethod
+    def _index_key(row: Dict, columns: List[str], include: List[str]) -> Tuple[Any, Union[Tuple, None]]:
+        """Returns the key of a row in an index (a tuple for a composite index) and its included values"""
+        key = row[columns[0]] if len(columns) == 1 else tuple(row[column] for column in columns)
+        return key, tuple(row[column] for column in include) if include else None
+
+    def delete_all_column_with_hash(self, table: str, changed_columns: List[str], old_values: Dict, old_block_id: int, slot: int) -> None:
+        """Do NOT call from outside this module. Helper function to delete index entries
 
         Args:
             table (str): Table name
             changed_columns (List[str]): Changed columns
-            old_values (Dict): Old values
-            old_block_id (int): Old block id to remove from hash
-        """
-        for column in changed_columns:
-            hash_exist = False
-            for file in os.listdir(os.path.join(self.DATA_DIR, self.HASH_DIR)):
-                if file.startswith(f"{table}__{column}__hash"):
-                    hash_exist = True
-                    break
-            if not hash_exist:
-                continue
-            Hash._delete_row(table, column, old_block_id, old_values[column])
+            old_values (Dict): The old row
+            old_block_id (int): Old block id to remove from the indexes
+            slot (int): Slot of the row in the block
+        """
+        if not self.schema.get_indexes(table):
+            return
+        for name, index_type, columns, include in self._changed_indexes(table, changed_columns):
+            key, _ = self._index_key(old_values, columns, include)
+            if index_type == "hash":
+                Hash._delete_row(table, name, old_block_id, key, slot)
+            elif index_type == "B+":
+                BPlusTree._delete_row(table, name, old_block_id, key, slot)
     
-    def update_all_column_with_hash(self, table: str, changed_columns: List[str], new_values: Dict, new_block_id: int) -> None:
-        """Do NOT call from outside this module. Helper function to update hash
+    def update_all_column_with_hash(self, table: str, changed_columns: List[str], new_values: Dict, new_block_id: int, slot: int) -> None:
+        """Do NOT call from outside this module. Helper function to update index entries
 
         Args:
             table (str): Table name
             changed_columns (List[str]): Changed columns
-            new_values (Dict): New values
+            new_values (Dict): The new row
             new_block_id (int): New block id to add
+            slot (int): Slot of the row in the block
         """
-        for column in changed_columns:
-            hash_exist = False
-            for file in os.listdir(os.path.join(self.DATA_DIR, self.HASH_DIR)):
-                if file.startswith(f"{table}__{column}__hash"):
-                    hash_exist = True
-                    break
-            if not hash_exist:
-                continue
-            Hash._write_row(table, column, new_block_id, new_values[column])
+        if not self.schema.get_indexes(table):
+            return
+        for name, index_type, columns, include in self._changed_indexes(table, changed_columns):
+            key, included = self._index_key(new_values, columns, include)
+            if index_type == "hash":
+                Hash._write_row(table, name, new_block_id, key, slot, included)
+            elif index_type == "B+":
+                BPlusTree._write_row(table, name, new_block_id, key, slot, included)
     
-    def delete_all_column_with_hash_to_disk(self, table: str, changed_columns: List[str], old_values: Dict, old_block_id: int) -> None:
+    def delete_all_column_with_hash_to_disk(self, table: str, changed_columns: List[str], old_values: Dict, old_block_id: int, slot: int) -> None:
         """Do NOT call from outside this module. 
-        Helper function to delete hash directly from disk
+        Helper function to delete index entries directly from disk
 
         Args:
             table (str): Table name
             changed_columns (List[str]): Changed columns
-            old_values (Dict): Old values
+            old_values (Dict): The old row
             old_block_id (int): Old block id to delete 
+            slot (int): Slot of the row in the block
         """
-        for column in changed_columns:
-            hash_exist = False
-            for file in os.listdir(os.path.join(self.DATA_DIR, self.HASH_DIR)):
-                if file.startswith(f"{table}__{column}__hash"):
-                    hash_exist = True
-                    break
-            if not hash_exist:
-                continue
-            Hash._delete_row_to_disk(table, column, old_block_id, old_values[column])
+        if not self.schema.get_indexes(table):
+            return
+        for name, index_type, columns, include in self._changed_indexes(table, changed_columns):
+            key, _ = self._index_key(old_values, columns, include)
+            if index_type == "hash":
+                Hash._delete_row_to_disk(table, name, old_block_id, key, slot)
+            elif index_type == "B+":
+                BPlusTree._delete_row_to_disk(table, name, old_block_id, key, slot)
     
-    def update_all_column_with_hash_to_disk(self, table: str, changed_columns: List[str], new_values: Dict, new_block_id: int) -> None:
+    def update_all_column_with_hash_to_disk(self, table: str, changed_columns: List[str], new_values: Dict, new_block_id: int, slot: int) -> None:
         """Do NOT call from outside this module.
-        Helper function to update hash directly from disk.
+        Helper function to update index entries directly from disk.
 
         Args:
             table (str): Table name
             changed_columns (List[str]): Changed columns
-            new_values (Dict): New values
+            new_values (Dict): The new row
             new_block_id (int): New block id to add
+            slot (int): Slot of the row in the block
         """
-        for column in changed_columns:
-            hash_exist = False
-            for file in os.listdir(os.path.join(self.DATA_DIR, self.HASH_DIR)):
-                if file.startswith(f"{table}__{column}__hash"):
-                    hash_exist = True
-                    break
-            if not hash_exist:
-                continue
-            Hash._write_row_to_disk(table, column, new_block_id, new_values[column])
+        if not self.schema.get_indexes(table):
+            return
+        for name, index_type, columns, include in self._changed_indexes(table, changed_columns):
+            key, included = self._index_key(new_values, columns, include)
+            if index_type == "hash":
+                Hash._write_row_to_disk(table, name, new_block_id, key, slot, included)
+            elif index_type == "B+":
+                BPlusTree._write_row_to_disk(table, name, new_block_id, key, slot, included)
                    
-    def read_block_with_hash(self, table: str, column: str, value) -> List[Dict]:
+    def read_block_with_hash(self, table: str, column: Union[str, List[str]], value) -> List[Dict]:
         """Get every row from table.column with column = value
 
         Args:
             table (str): Table name
-            column (str): Column name
-            value (_type_): Value to search
+            column (Union[str, List[str]]): Column name, or the columns of a composite index
+            value (_type_): Value to search, one value per column for a composite index
 
         Returns:
             List[Dict]: Every row that have column = value
         """
-        return Hash._get_rows(table, column, value)
+        return Hash._get_rows(table, index_name(column), value if isinstance(column, str) else tuple(value))
     
-    def write_block_with_hash(self, table: str, column: str, value, new_block_id: int) -> None:
+    def write_block_with_hash(self, table: str, column: str, value, new_block_id: int, slot: int) -> None:
         """Do NOT call from outside this module.
         Helper function to update hash 
 
@@ -606,36 +1378,6 @@ class StorageManager:
             column (str): Column name
             value (_type_): Value to update
             new_block_id (int): New block id to add
+            slot (int): Slot of the row in the block
         """
-        Hash._write_row(table, column, new_block_id, value)
-        
-    def _evaluate_condition(self, row: Dict, condition: Condition):
-        if condition.column not in row.keys() or row[condition.column] is None:
-            return False
-        value = row[condition.column]
-        operand = condition.operand
-        operation = condition.operation
-        return {
-            "=": value == operand,
-            "<>": value != operand,
-            ">": value > operand,
-            ">=": value >= operand,
-            "<": value < operand,
-            "<=": value <= operand,
-        }[operation]
-
-    def _evaluate_conditions(self, row: Dict, condition_group: ConditionGroup):
-        if condition_group.logic_operator == "AND":
-            return all(
-                self._evaluate_conditions(row, cond) if isinstance(cond, ConditionGroup) 
-                else self._evaluate_condition(row, cond)
-                for cond in condition_group.conditions
-            )
-        elif condition_group.logic_operator == "OR":
-            return any(
-                self._evaluate_conditions(row, cond) if isinstance(cond, ConditionGroup) 
-                else self._evaluate_condition(row, cond)
-                for cond in condition_group.conditions
-            )
-        else:
-            raise ValueError("Invalid logic_operator. Use 'AND' or 'OR'.")
+        Hash._write_row(table, column, new_block_id, value, slot)